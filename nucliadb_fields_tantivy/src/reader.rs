@@ -30,7 +30,7 @@ use nucliadb_service_interface::prelude::*;
 use tantivy::collector::{
     Count, DocSetCollector, FacetCollector, FacetCounts, MultiCollector, TopDocs,
 };
-use tantivy::query::{AllQuery, Query, QueryParser, TermQuery};
+use tantivy::query::{AllQuery, QueryParser, TermQuery};
 use tantivy::schema::*;
 use tantivy::{
     DocAddress, Index, IndexReader, IndexSettings, IndexSortByField, Order, ReloadPolicy, Searcher,
@@ -406,11 +406,7 @@ impl FieldReaderService {
             query_parser
         };
         let text = FieldReaderService::adapt_text(&query_parser, &request.body);
-        let query = if !request.body.is_empty() {
-            create_query(&query_parser, request, &self.schema, &text)
-        } else {
-            Box::new(AllQuery) as Box<dyn Query>
-        };
+        let query = create_query(&query_parser, request, &self.schema, &text);
         let results = request.result_per_page as usize;
         let offset = results * request.page_number as usize;
         let order_field = self.get_order_field(&request.order);
@@ -685,6 +681,29 @@ mod tests {
         assert_eq!(result.query, "\"enough - test\"");
         assert_eq!(result.total, 0);
 
+        // Created before the range
+        let future_timestamps = Timestamps {
+            from_created: Some(Timestamp {
+                seconds: now.as_secs() as i64 + 3600,
+                nanos: 0,
+            }),
+            ..Timestamps::default()
+        };
+        let search = DocumentSearchRequest {
+            id: "shard1".to_string(),
+            body: "enough test".to_string(),
+            fields: vec!["body".to_string()],
+            filter: Some(filter.clone()),
+            faceted: Some(faceted.clone()),
+            order: Some(order.clone()),
+            page_number: 0,
+            result_per_page: 20,
+            timestamps: Some(future_timestamps),
+            reload: false,
+        };
+        let result = field_reader_service.search(&search).unwrap();
+        assert_eq!(result.total, 0);
+
         let search = DocumentSearchRequest {
             id: "shard1".to_string(),
             body: "".to_string(),
@@ -20,13 +20,53 @@
 // use std::convert::TryFrom;
 // use std::time::SystemTime;
 
-use nucliadb_protos::DocumentSearchRequest;
+use std::ops::Bound;
+
+use nucliadb_protos::{DocumentSearchRequest, Timestamps};
 use nucliadb_service_interface::dependencies::*;
 use tantivy::query::*;
-use tantivy::schema::{Facet, IndexRecordOption};
+use tantivy::schema::{Facet, Field, IndexRecordOption, Type};
 use tantivy::Term;
 
-use crate::schema::FieldSchema;
+use crate::schema::{timestamp_to_datetime_utc, FieldSchema};
+
+fn date_bound(field: Field, timestamp: Option<&prost_types::Timestamp>) -> Bound<Term> {
+    match timestamp {
+        Some(timestamp) => {
+            let date = timestamp_to_datetime_utc(timestamp);
+            Bound::Included(Term::from_field_date(field, &date))
+        }
+        None => Bound::Unbounded,
+    }
+}
+
+fn date_range_query(
+    field: Field,
+    from: Option<&prost_types::Timestamp>,
+    to: Option<&prost_types::Timestamp>,
+) -> Option<Box<dyn Query>> {
+    if from.is_none() && to.is_none() {
+        return None;
+    }
+    let (from, to) = (date_bound(field, from), date_bound(field, to));
+    let query = RangeQuery::new_term_bounds(field, Type::Date, &from, &to);
+    Some(Box::new(query))
+}
+
+// Only resources created and modified within the requested ranges match
+fn timestamps_queries(timestamps: &Timestamps, schema: &FieldSchema) -> Vec<Box<dyn Query>> {
+    let created = date_range_query(
+        schema.created,
+        timestamps.from_created.as_ref(),
+        timestamps.to_created.as_ref(),
+    );
+    let modified = date_range_query(
+        schema.modified,
+        timestamps.from_modified.as_ref(),
+        timestamps.to_modified.as_ref(),
+    );
+    created.into_iter().chain(modified).collect()
+}
 
 pub fn create_query(
     parser: &QueryParser,
@@ -62,5 +102,12 @@ pub fn create_query(
             let facet_term_query = TermQuery::new(facet_term, IndexRecordOption::Basic);
             queries.push((Occur::Should, Box::new(facet_term_query)));
         });
+
+    // Add creation and modification date ranges
+    search
+        .timestamps
+        .iter()
+        .flat_map(|timestamps| timestamps_queries(timestamps, schema))
+        .for_each(|query| queries.push((Occur::Must, query)));
     Box::new(BooleanQuery::new(queries))
 }
@@ -17,9 +17,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-from nucliadb_ingest.orm.node import READ_CONNECTIONS, WRITE_CONNECTIONS
+from nucliadb_ingest.orm.node import (
+    READ_CONNECTIONS,
+    SIDECAR_CONNECTIONS,
+    WRITE_CONNECTIONS,
+)
 
 
 def clear_ingest_cache():
     READ_CONNECTIONS.clear()
     WRITE_CONNECTIONS.clear()
+    SIDECAR_CONNECTIONS.clear()
@@ -0,0 +1,182 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from nats.aio.client import Msg
+from nucliadb_protos.writer_pb2 import BrokerMessage
+
+from nucliadb_ingest import logger
+
+Handler = Callable[[List[Tuple[Msg, int]]], Awaitable[None]]
+
+
+class SeqidWatermark:
+    """
+    Tracks the messages of a partition that are processed out of order and
+    the last seqid that is safe to store, the highest one with every message
+    received before it already done.
+    """
+
+    def __init__(self, last: int = 0):
+        self.last = last
+        self.done = last
+        self.pending: Set[int] = set()
+        # Seqids committed together with the last one of their group
+        self.groups: Dict[int, List[int]] = {}
+
+    def seed(self, seqid: int):
+        # Everything up to the seqid stored for the partition is done
+        self.last = max(self.last, seqid)
+        self.done = max(self.done, seqid)
+
+    def start(self, seqid: int):
+        self.pending.add(seqid)
+
+    def group(self, seqids: List[int]):
+        self.groups[seqids[-1]] = seqids[:-1]
+
+    def finish(self, seqid: int):
+        self.last = self.committable(seqid)
+        self.done = max(self.done, seqid)
+        self.pending.difference_update([seqid, *self.groups.pop(seqid, [])])
+
+    def committable(self, seqid: int) -> int:
+        # Value to store along with the commit of seqid
+        group = {seqid, *self.groups.get(seqid, [])}
+        others = [pending for pending in self.pending if pending not in group]
+        if others:
+            value = min(others) - 1
+        else:
+            value = max(self.done, seqid)
+        return max(self.last, value)
+
+
+class Lanes:
+    """
+    Processes the messages of a partition in a number of lanes. Messages of
+    the same resource always go to the same lane and are handled in order,
+    different lanes run concurrently.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        handler: Handler,
+        watermark: SeqidWatermark,
+        coalesce_window: float = 0.0,
+        coalesce_max: int = 1,
+    ):
+        self.count = count
+        self.handler = handler
+        self.watermark = watermark
+        self.coalesce_window = coalesce_window
+        self.coalesce_max = coalesce_max
+        self.queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(count)]
+        self.tasks: List[asyncio.Task] = []
+        # Latest delivery of every message not done yet
+        self.messages: Dict[int, Msg] = {}
+        # Resource of the messages that can be applied along with their
+        # neighbours of the same resource
+        self.resources: Dict[int, Optional[Tuple[str, str]]] = {}
+
+    def start(self):
+        self.tasks = [
+            asyncio.create_task(self.run(queue), name=f"ingest_lane_{index}")
+            for index, queue in enumerate(self.queues)
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def lane(self, kbid: str, rid: str) -> int:
+        return hash((kbid, rid)) % self.count
+
+    def put(self, msg: Msg, seqid: int, pb: BrokerMessage, rid: Optional[str] = None):
+        """
+        `rid` is the uuid of the resource of a message carrying only its slug,
+        so it goes to the same lane as the messages carrying the uuid
+        """
+        if seqid in self.messages:
+            # Redelivered before it is done, the latest delivery gets the ack
+            self.messages[seqid] = msg
+            return
+        self.messages[seqid] = msg
+        if pb.type == BrokerMessage.MessageType.AUTOCOMMIT and pb.uuid:
+            self.resources[seqid] = (pb.kbid, pb.uuid)
+        else:
+            self.resources[seqid] = None
+        self.watermark.start(seqid)
+        self.queues[self.lane(pb.kbid, pb.uuid or rid or pb.slug)].put_nowait(seqid)
+
+    async def coalesce(
+        self, seqid: int, queue: asyncio.Queue
+    ) -> Tuple[List[int], Optional[int]]:
+        """
+        Run of queued messages for the same resource starting with seqid,
+        waiting once for the coalescing window when the lane runs dry. Returns
+        the run and the next message of the lane when it ended the run
+        """
+        batch = [seqid]
+        resource = self.resources[seqid]
+        if resource is None or self.coalesce_window <= 0:
+            return batch, None
+
+        waited = False
+        while len(batch) < self.coalesce_max:
+            try:
+                following = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                if waited:
+                    break
+                await asyncio.sleep(self.coalesce_window)
+                waited = True
+                continue
+            if self.resources[following] != resource:
+                return batch, following
+            batch.append(following)
+        return batch, None
+
+    async def run(self, queue: asyncio.Queue):
+        following: Optional[int] = None
+        while True:
+            if following is None:
+                seqid = await queue.get()
+            else:
+                seqid = following
+            batch, following = await self.coalesce(seqid, queue)
+            if len(batch) > 1:
+                self.watermark.group(batch)
+            while True:
+                try:
+                    await self.handler([(self.messages[s], s) for s in batch])
+                except Exception:
+                    # Retried in the lane, so later messages of the same
+                    # resource can not be processed before this one
+                    logger.warning(f"Retrying messages {batch} in their lane")
+                else:
+                    break
+            self.watermark.finish(batch[-1])
+            for done in batch:
+                del self.messages[done]
+                del self.resources[done]
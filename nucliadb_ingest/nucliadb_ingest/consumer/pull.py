@@ -19,7 +19,7 @@
 #
 import asyncio
 import base64
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import aiohttp
 import nats
@@ -29,10 +29,13 @@ from nats.aio.subscription import Subscription
 from nucliadb_protos.writer_pb2 import BrokerMessage
 
 from nucliadb_ingest import SERVICE_NAME, logger, logger_activity
+from nucliadb_ingest.consumer.lanes import Lanes, SeqidWatermark
 from nucliadb_ingest.maindb.driver import Driver
 from nucliadb_ingest.orm.exceptions import DeadletteredError, ReallyStopPulling
+from nucliadb_ingest.orm.knowledgebox import KnowledgeBox
 from nucliadb_ingest.orm.processor import Processor
 from nucliadb_ingest.sentry import SENTRY
+from nucliadb_ingest.settings import settings
 from nucliadb_telemetry.jetstream import JetStreamContextTelemetry
 from nucliadb_telemetry.utils import get_telemetry
 from nucliadb_utils.audit.audit import AuditStorage
@@ -69,6 +72,7 @@ class PullWorker:
         nats_servers: Optional[List[str]] = [],
         creds: Optional[str] = None,
         local_subscriber: bool = False,
+        lanes: int = 1,
     ):
         self.driver = driver
         self.partition = partition
@@ -98,7 +102,25 @@ class PullWorker:
         self.subscriptions = []
 
         self.lock = asyncio.Lock()
-        self.processor = Processor(driver, storage, audit, cache, partition)
+        # Several lanes process messages of different resources concurrently
+        self.lanes: Optional[Lanes] = None
+        self.watermark: Optional[SeqidWatermark] = None
+        self.max_ack_pending = 1
+        commit_seqid = None
+        if lanes > 1 or settings.consumer_coalesce_window > 0:
+            watermark = self.watermark = SeqidWatermark()
+            self.lanes = Lanes(
+                lanes,
+                self.handle_messages,
+                watermark,
+                coalesce_window=settings.consumer_coalesce_window,
+                coalesce_max=settings.consumer_coalesce_max,
+            )
+            self.max_ack_pending = lanes * settings.consumer_lane_ack_pending
+            commit_seqid = watermark.committable
+        self.processor = Processor(
+            driver, storage, audit, cache, partition, commit_seqid=commit_seqid
+        )
 
     async def disconnected_cb(self):
         logger.info("Got disconnected from NATS!")
@@ -151,6 +173,11 @@ class PullWorker:
                 last_seqid = await self.processor.driver.last_seqid(self.partition)
                 if last_seqid is None:
                     last_seqid = 1
+                elif self.watermark is not None:
+                    self.watermark.seed(last_seqid)
+
+                if self.lanes is not None:
+                    self.lanes.start()
 
                 res = await self.js.subscribe(
                     subject=self.target.format(partition=self.partition),
@@ -162,7 +189,7 @@ class PullWorker:
                         deliver_policy=nats.js.api.DeliverPolicy.BY_START_SEQUENCE,
                         opt_start_seq=last_seqid,
                         ack_policy=nats.js.api.AckPolicy.EXPLICIT,
-                        max_ack_pending=1,
+                        max_ack_pending=self.max_ack_pending,
                         max_deliver=10000,
                         ack_wait=self.ack_wait,
                         idle_heartbeat=5.0,
@@ -181,6 +208,8 @@ class PullWorker:
             except nats.errors.ConnectionClosedError:
                 pass
         self.subscriptions = []
+        if self.lanes is not None:
+            await self.lanes.stop()
         if self.nats_subscriber and self.nc is not None:
             try:
                 await self.nc.drain()
@@ -195,80 +224,155 @@ class PullWorker:
         logger.debug(
             f"Message received: subject:{subject}, seqid: {seqid}, reply: {reply}"
         )
-        message_source = "<msg source not set>"
+        if self.lanes is not None:
+            pb = BrokerMessage()
+            pb.ParseFromString(msg.data)
+            rid = None
+            if not pb.uuid and pb.slug:
+                rid = await self.resolve_slug(pb.kbid, pb.slug)
+            self.lanes.put(msg, seqid, pb, rid)
+            return
 
         async with self.lock:
-            try:
+            await self.handle_message(msg, seqid)
+
+    async def resolve_slug(self, kbid: str, slug: str) -> Optional[str]:
+        # Slugs of resources not created yet stay unresolved, no message of
+        # theirs can carry the uuid before the resource exists
+        txn = await self.driver.begin()
+        try:
+            kb = KnowledgeBox(txn, self.storage, self.cache, kbid)
+            return await kb.get_resource_uuid_by_slug(slug)
+        finally:
+            await txn.abort()
+
+    async def handle_messages(self, batch: List[Tuple[Msg, int]]):
+        if len(batch) == 1:
+            msg, seqid = batch[0]
+            await self.handle_message(msg, seqid)
+            return
+
+        seqids = [seqid for _, seqid in batch]
+        try:
+            pbs = []
+            for msg, _ in batch:
                 pb = BrokerMessage()
                 pb.ParseFromString(msg.data)
-                if pb.source == pb.MessageSource.PROCESSOR:
-                    message_source = "processing"
-                elif pb.source == pb.MessageSource.WRITER:
-                    message_source = "writer"
-                if pb.HasField("audit"):
-                    time = pb.audit.when.ToDatetime().isoformat()
-                else:
-                    time = ""
+                pbs.append(pb)
 
-                logger.debug(
-                    f"Received {message_source} on {pb.kbid}/{pb.uuid} seq {seqid} at {time}"
+            processed = await self.processor.process_coalesced(
+                pbs, seqids, self.partition
+            )
+            if processed:
+                logger.info(
+                    f"Successfully processed {len(batch)} coalesced messages. kb: {pbs[0].kbid}, "
+                    f"resource: {pbs[0].uuid}, nucliadb seqids: {seqids}, partition: {self.partition}"
                 )
-                processed = await self.processor.process(pb, seqid, self.partition)
-
-                if processed:
-                    message_type_name = pb.MessageType.Name(pb.type)
-                    logger.info(
-                        f"Successfully processed {message_type_name} message from {message_source}. kb: {pb.kbid}, resource: {pb.uuid}, nucliadb seqid: {seqid}, partition: {self.partition} as {time}"
-                    )
-                    if self.cache is not None:
-                        await self.cache.delete(
-                            KB_COUNTER_CACHE.format(kbid=pb.kbid), invalidate=True
-                        )
-                else:
-                    logger.error(
-                        f"Old txn: DISCARD (nucliadb seqid: {seqid}, partition: {self.partition})"
+                if self.cache is not None:
+                    await self.cache.delete(
+                        KB_COUNTER_CACHE.format(kbid=pbs[0].kbid), invalidate=True
                     )
-            except DeadletteredError as e:
-                # Messages that have been sent to deadletter at some point
-                # We don't want to process it again so it's ack'd
-                if SENTRY:
-                    capture_exception(e)
-
-                logger.info(
-                    f"An error happend while processing a message from {message_source}. "
-                    f"A copy of the message has been stored on {self.processor.storage.deadletter_bucket}. "
-                    f"Check sentry for more details: {str(e)}"
+            else:
+                logger.error(
+                    f"Old txn: DISCARD (nucliadb seqids: {seqids}, partition: {self.partition})"
                 )
-                await msg.ack()
-            except (ShardsNotFound,) as e:
-                # Any messages that for some unexpected inconsistency have failed and won't be tried again
-                # as we cannot do anything about it
-                #  - ShardsNotFound: /kb/{id}/shards key or the whole /kb/{kbid} is missing
-                if SENTRY:
-                    capture_exception(e)
+        except ShardsNotFound as e:
+            # Same as for a single message, they won't be tried again
+            if SENTRY:
+                capture_exception(e)
+            logger.info(
+                f"An error happend while processing coalesced messages {seqids}. "
+                f"They won't be retried again. Check sentry for more details: {str(e)}"
+            )
+        except Exception as e:
+            # A single bad message must not take the rest of the run with it,
+            # they are processed one at a time and only the failing ones are
+            # deadlettered
+            if SENTRY:
+                capture_exception(e)
+            logger.info(
+                f"An error happend while processing coalesced messages {seqids}. "
+                f"They will be retried one at a time: {str(e)}"
+            )
+            for msg, seqid in batch:
+                await self.handle_message(msg, seqid)
+            return
+        for msg, _ in batch:
+            await msg.ack()
 
-                logger.info(
-                    f"An error happend while processing a message from {message_source}. "
-                    f"This message has been dropped, won't be retried again"
-                    f"Check sentry for more details: {str(e)}"
-                )
-                await msg.ack()
+    async def handle_message(self, msg: Msg, seqid: int):
+        message_source = "<msg source not set>"
+        try:
+            pb = BrokerMessage()
+            pb.ParseFromString(msg.data)
+            if pb.source == pb.MessageSource.PROCESSOR:
+                message_source = "processing"
+            elif pb.source == pb.MessageSource.WRITER:
+                message_source = "writer"
+            if pb.HasField("audit"):
+                time = pb.audit.when.ToDatetime().isoformat()
+            else:
+                time = ""
 
-            except Exception as e:
-                # Unhandled exceptions that need to be retried after a small delay
-                if SENTRY:
-                    capture_exception(e)
+            logger.debug(
+                f"Received {message_source} on {pb.kbid}/{pb.uuid} seq {seqid} at {time}"
+            )
+            processed = await self.processor.process(pb, seqid, self.partition)
 
+            if processed:
+                message_type_name = pb.MessageType.Name(pb.type)
                 logger.info(
-                    f"An error happend while processing a message from {message_source}. "
-                    "Message has not been ACKd and will be retried. "
-                    f"Check sentry for more details: {str(e)}"
+                    f"Successfully processed {message_type_name} message from {message_source}. kb: {pb.kbid}, resource: {pb.uuid}, nucliadb seqid: {seqid}, partition: {self.partition} as {time}"
                 )
-                await asyncio.sleep(2)
-                raise e
+                if self.cache is not None:
+                    await self.cache.delete(
+                        KB_COUNTER_CACHE.format(kbid=pb.kbid), invalidate=True
+                    )
             else:
-                # Successful processing
-                await msg.ack()
+                logger.error(
+                    f"Old txn: DISCARD (nucliadb seqid: {seqid}, partition: {self.partition})"
+                )
+        except DeadletteredError as e:
+            # Messages that have been sent to deadletter at some point
+            # We don't want to process it again so it's ack'd
+            if SENTRY:
+                capture_exception(e)
+
+            logger.info(
+                f"An error happend while processing a message from {message_source}. "
+                f"A copy of the message has been stored on {self.processor.storage.deadletter_bucket}. "
+                f"Check sentry for more details: {str(e)}"
+            )
+            await msg.ack()
+        except (ShardsNotFound,) as e:
+            # Any messages that for some unexpected inconsistency have failed and won't be tried again
+            # as we cannot do anything about it
+            #  - ShardsNotFound: /kb/{id}/shards key or the whole /kb/{kbid} is missing
+            if SENTRY:
+                capture_exception(e)
+
+            logger.info(
+                f"An error happend while processing a message from {message_source}. "
+                f"This message has been dropped, won't be retried again"
+                f"Check sentry for more details: {str(e)}"
+            )
+            await msg.ack()
+
+        except Exception as e:
+            # Unhandled exceptions that need to be retried after a small delay
+            if SENTRY:
+                capture_exception(e)
+
+            logger.info(
+                f"An error happend while processing a message from {message_source}. "
+                "Message has not been ACKd and will be retried. "
+                f"Check sentry for more details: {str(e)}"
+            )
+            await asyncio.sleep(2)
+            raise e
+        else:
+            # Successful processing
+            await msg.ack()
 
     async def loop(self):
         while self.initialized is False:
@@ -35,6 +35,7 @@ from nucliadb_protos.utils_pb2 import ExtractedText, VectorObject
 from nucliadb_protos.writer_pb2 import Error
 
 from nucliadb_ingest.fields.exceptions import InvalidFieldClass, InvalidPBClass
+from nucliadb_utils.cache import KB_FIELD_EXTRACTED_CACHE
 from nucliadb_utils.storages.storage import Storage, StorageField
 
 KB_RESOURCE_FIELD = "/kbs/{kbid}/r/{uuid}/f/{type}/{field}"
@@ -139,6 +140,7 @@ class Field:
             await self.storage.delete_upload(sf.key, sf.bucket)
         except KeyError:
             pass
+        await self.invalidate_cache(FIELD_TEXT)
 
     async def delete_vectors(self):
         # Try delete vectors
@@ -158,6 +160,22 @@ class Field:
             await self.storage.delete_upload(sf.key, sf.bucket)
         except KeyError:
             pass
+        await self.invalidate_cache(FIELD_METADATA)
+
+    async def invalidate_cache(self, kind: str):
+        # Search keeps extracted payloads on the shared memory cache
+        cache = self.resource.kb.cache
+        if cache is not None:
+            await cache.delete(
+                KB_FIELD_EXTRACTED_CACHE.format(
+                    kbid=self.kbid,
+                    rid=self.uuid,
+                    kind=kind,
+                    field_type=self.type,
+                    field=self.id,
+                ),
+                invalidate=True,
+            )
 
     async def get_error(self) -> Optional[Error]:
         payload = await self.resource.txn.get(
@@ -217,6 +235,7 @@ class Field:
                 actual_payload.text = payload.body.text
             await self.storage.upload_pb(sf, actual_payload)
             self.extracted_text = actual_payload
+        await self.invalidate_cache(FIELD_TEXT)
 
     async def get_extracted_text(self, force=False) -> Optional[ExtractedText]:
         if self.extracted_text is None or force:
@@ -375,6 +394,7 @@ class Field:
                 replace_field = [f"{x.start}-{x.end}" for x in metadata.paragraphs]
             await self.storage.upload_pb(sf, actual_payload)
             self.computed_metadata = actual_payload
+        await self.invalidate_cache(FIELD_METADATA)
 
         return self.computed_metadata, replace_field, replace_splits
 
@@ -41,7 +41,10 @@ class Transaction:
     ):
         raise NotImplementedError()
 
-    async def batch_get(self, keys: List[str]):
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        Values of the keys in the same order, None for the missing ones
+        """
         raise NotImplementedError()
 
     async def get(self, key: str) -> Optional[bytes]:
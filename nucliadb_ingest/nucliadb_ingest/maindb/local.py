@@ -110,26 +110,23 @@ class LocalTransaction(Transaction):
         self.clean()
         self.open = False
 
-    async def batch_get(self, keys: List[str]):
-        results = []
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        results: Dict[str, Optional[bytes]] = {}
+        missing: List[str] = []
         for key in keys:
             if key in self.deleted_keys:
                 raise KeyError(f"Not found {key}")
 
             if key in self.modified_keys:
-                results.append(self.modified_keys[key])
-                keys.remove(key)
-
-            if key in self.visited_keys:
-                results.append(self.visited_keys[key])
-                keys.remove(key)
-
-        if len(keys) > 0:
-            for key in keys:
-                obj = await self.get(key)
-                if obj:
-                    results.append(obj)
-        return results
+                results[key] = self.modified_keys[key]
+            elif key in self.visited_keys:
+                results[key] = self.visited_keys[key]
+            else:
+                missing.append(key)
+
+        for key in missing:
+            results[key] = await self.get(key)
+        return [results[key] for key in keys]
 
     async def get(self, key: str) -> Optional[bytes]:
         if key in self.deleted_keys:
@@ -92,25 +92,26 @@ class RedisTransaction(Transaction):
         self.clean()
         self.open = False
 
-    async def batch_get(self, keys: List[str]):
-        results = []
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        results: Dict[str, Optional[bytes]] = {}
+        missing: List[str] = []
         for key in keys:
             if key in self.deleted_keys:
                 raise KeyError(f"Not found {key}")
 
             if key in self.modified_keys:
-                results.append(self.modified_keys[key])
-                keys.remove(key)
-
-            if key in self.visited_keys:
-                results.append(self.visited_keys[key])
-                keys.remove(key)
-
-        if len(keys) > 0:
-            bytes_keys: List[bytes] = [x.encode() for x in keys]
-            objs = await self.redis.mget(bytes_keys)
-            results.extend(objs)
-        return results
+                results[key] = self.modified_keys[key]
+            elif key in self.visited_keys:
+                results[key] = self.visited_keys[key]
+            else:
+                missing.append(key)
+
+        if len(missing) > 0:
+            objs = await self.redis.mget([x.encode() for x in missing])
+            for key, obj in zip(missing, objs):
+                self.visited_keys[key] = obj
+                results[key] = obj
+        return [results[key] for key in keys]
 
     async def get(self, key: str) -> Optional[bytes]:
         if key in self.deleted_keys:
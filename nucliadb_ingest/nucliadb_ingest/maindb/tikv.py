@@ -64,9 +64,11 @@ class TiKVTransaction(Transaction):
         await self.txn.commit()
         self.open = False
 
-    async def batch_get(self, keys: List[str]):
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
         bytes_keys: List[bytes] = [x.encode() for x in keys]
-        return await self.txn.batch_get(bytes_keys)
+        # Only the keys found are returned, as (key, value) pairs
+        found = dict(await self.txn.batch_get(bytes_keys))
+        return [found.get(key) for key in bytes_keys]
 
     async def get(self, key: str) -> Optional[bytes]:
         return await self.txn.get(key.encode())
@@ -33,7 +33,11 @@ class AbstractShard:
         pass
 
     async def add_resource(
-        self, resource: PBBrainResource, txid: int, reindex_id: Optional[str] = None
+        self,
+        resource: PBBrainResource,
+        txid: int,
+        reindex_id: Optional[str] = None,
+        new_resource: bool = False,
     ) -> int:
         pass
 
@@ -0,0 +1,211 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from nucliadb_protos.resources_pb2 import FieldComputedMetadata, FieldID
+from nucliadb_protos.utils_pb2 import VectorObject
+
+from nucliadb_ingest.maindb.driver import Driver, Transaction
+
+if TYPE_CHECKING:  # pragma: no cover
+    from nucliadb_ingest.orm.knowledgebox import KnowledgeBox
+
+# Each ingest partition is consumed by a single worker, keeping a counter per
+# partition avoids conflicts between workers updating the same kb. Lanes of a
+# worker share the counter, the processor serializes their updates per kb
+KB_COUNTERS = "/kbs/{kbid}/counters/{partition}"
+KB_COUNTERS_BASE = "/kbs/{kbid}/counters/"
+# Written when the kb is created or repaired, counters are not trusted without it
+KB_COUNTERS_ORIGIN = "base"
+KB_RESOURCE_COUNTERS = "/kbs/{kbid}/r/{uuid}/counters"
+
+
+@dataclass
+class Counters:
+    resources: int = 0
+    fields: int = 0
+    paragraphs: int = 0
+    sentences: int = 0
+
+    def __add__(self, other: Counters) -> Counters:
+        return Counters(
+            resources=self.resources + other.resources,
+            fields=self.fields + other.fields,
+            paragraphs=self.paragraphs + other.paragraphs,
+            sentences=self.sentences + other.sentences,
+        )
+
+    def __sub__(self, other: Counters) -> Counters:
+        return Counters(
+            resources=self.resources - other.resources,
+            fields=self.fields - other.fields,
+            paragraphs=self.paragraphs - other.paragraphs,
+            sentences=self.sentences - other.sentences,
+        )
+
+    @classmethod
+    def parse(cls, payload: bytes) -> Counters:
+        return cls(**json.loads(payload))
+
+    def serialize(self) -> bytes:
+        return json.dumps(asdict(self)).encode()
+
+
+@dataclass
+class ResourceCounters:
+    """
+    What a resource contributes to the kb counters, by field, so a message
+    touching a single field can update the totals without loading the others
+    """
+
+    texts: List[str] = field(default_factory=list)
+    paragraphs: Dict[str, int] = field(default_factory=dict)
+    sentences: Dict[str, int] = field(default_factory=dict)
+
+    def set_text(self, field_key: str):
+        if field_key not in self.texts:
+            self.texts.append(field_key)
+
+    def set_paragraphs(self, field_key: str, metadata: FieldComputedMetadata):
+        count = len(metadata.metadata.paragraphs)
+        for split in metadata.split_metadata.values():
+            count += len(split.paragraphs)
+        self.paragraphs[field_key] = count
+
+    def set_sentences(self, field_key: str, vo: VectorObject):
+        count = len(vo.vectors.vectors)
+        for split in vo.split_vectors.values():
+            count += len(split.vectors)
+        self.sentences[field_key] = count
+
+    def delete_field(self, field_key: str):
+        if field_key in self.texts:
+            self.texts.remove(field_key)
+        self.paragraphs.pop(field_key, None)
+        self.sentences.pop(field_key, None)
+
+    def totals(self) -> Counters:
+        return Counters(
+            resources=1,
+            fields=len(self.texts),
+            paragraphs=sum(self.paragraphs.values()),
+            sentences=sum(self.sentences.values()),
+        )
+
+    @classmethod
+    def parse(cls, payload: bytes) -> ResourceCounters:
+        return cls(**json.loads(payload))
+
+    def serialize(self) -> bytes:
+        return json.dumps(asdict(self)).encode()
+
+
+async def get_resource_counters(
+    txn: Transaction, kbid: str, uuid: str
+) -> Optional[ResourceCounters]:
+    payload = await txn.get(KB_RESOURCE_COUNTERS.format(kbid=kbid, uuid=uuid))
+    if payload is None:
+        return None
+    return ResourceCounters.parse(payload)
+
+
+async def set_resource_counters(
+    txn: Transaction, kbid: str, uuid: str, counters: ResourceCounters
+):
+    await txn.set(
+        KB_RESOURCE_COUNTERS.format(kbid=kbid, uuid=uuid), counters.serialize()
+    )
+
+
+async def update_kb_counters(
+    txn: Transaction, kbid: str, partition: str, delta: Counters
+):
+    if delta == Counters():
+        return
+    key = KB_COUNTERS.format(kbid=kbid, partition=partition)
+    payload = await txn.get(key)
+    counters = Counters.parse(payload) if payload is not None else Counters()
+    await txn.set(key, (counters + delta).serialize())
+
+
+async def get_kb_counters(txn: Transaction, kbid: str) -> Optional[Counters]:
+    """
+    Sum of the counters of all the partitions, None if the kb has not been
+    repaired since it was created before counters were maintained
+    """
+    base = KB_COUNTERS_BASE.format(kbid=kbid)
+    keys = [key async for key in txn.keys(match=base, count=-1)]
+    if KB_COUNTERS.format(kbid=kbid, partition=KB_COUNTERS_ORIGIN) not in keys:
+        return None
+    total = Counters()
+    for key in keys:
+        payload = await txn.get(key)
+        if payload is not None:
+            total += Counters.parse(payload)
+    return total
+
+
+async def initialize_kb_counters(txn: Transaction, kbid: str):
+    await txn.set(
+        KB_COUNTERS.format(kbid=kbid, partition=KB_COUNTERS_ORIGIN),
+        Counters().serialize(),
+    )
+
+
+async def repair_kb_counters(driver: Driver, kb: KnowledgeBox) -> Counters:
+    """
+    Recompute the counters of a kb from its resources. Every field is loaded,
+    so this is meant to run offline, not while ingesting on the kb
+    """
+    total = Counters()
+    async for resource in kb.iterate_resources():
+        counters = ResourceCounters()
+        for field_type, field_id in await resource.get_fields_ids(force=True):
+            field_obj = await resource.get_field(field_id, field_type, load=False)
+            fieldid = FieldID(field_type=field_type, field=field_id)  # type: ignore
+            field_key = resource.generate_field_id(fieldid)
+            if await field_obj.get_extracted_text() is not None:
+                counters.set_text(field_key)
+            metadata = await field_obj.get_field_metadata()
+            if metadata is not None:
+                counters.set_paragraphs(field_key, metadata)
+            vo = await field_obj.get_vectors()
+            if vo is not None:
+                counters.set_sentences(field_key, vo)
+        total += counters.totals()
+
+        txn = await driver.begin()
+        await set_resource_counters(txn, kb.kbid, resource.uuid, counters)
+        await txn.commit(resource=False)
+
+    txn = await driver.begin()
+    base = KB_COUNTERS_BASE.format(kbid=kb.kbid)
+    async for key in txn.keys(match=base, count=-1):
+        await txn.delete(key)
+    await txn.set(
+        KB_COUNTERS.format(kbid=kb.kbid, partition=KB_COUNTERS_ORIGIN),
+        total.serialize(),
+    )
+    await txn.commit(resource=False)
+    return total
@@ -18,7 +18,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 from datetime import datetime
-from typing import AsyncGenerator, AsyncIterator, Optional, Tuple, Union
+from typing import AsyncGenerator, AsyncIterator, List, Optional, Tuple, Union
 from uuid import uuid4
 
 from grpc import StatusCode
@@ -31,6 +31,8 @@ from nucliadb_protos.knowledgebox_pb2 import (
     Widget,
 )
 from nucliadb_protos.resources_pb2 import Basic
+from nucliadb_protos.resources_pb2 import Origin as PBOrigin
+from nucliadb_protos.resources_pb2 import Relations as PBRelations
 from nucliadb_protos.writer_pb2 import (
     GetEntitiesGroupResponse,
     GetEntitiesResponse,
@@ -43,6 +45,7 @@ from nucliadb_protos.writer_pb2 import Shards as PBShards
 
 from nucliadb_ingest import SERVICE_NAME, logger
 from nucliadb_ingest.maindb.driver import Driver, Transaction
+from nucliadb_ingest.orm.counters import initialize_kb_counters
 from nucliadb_ingest.orm.exceptions import (
     KnowledgeBoxConflict,
     KnowledgeBoxNotFound,
@@ -52,17 +55,25 @@ from nucliadb_ingest.orm.exceptions import (
 from nucliadb_ingest.orm.local_node import LocalNode
 from nucliadb_ingest.orm.node import KB_SHARDS, Node
 from nucliadb_ingest.orm.resource import (
+    KB_RESOURCE_ORIGIN,
+    KB_RESOURCE_RELATIONS,
     KB_RESOURCE_SLUG,
     KB_RESOURCE_SLUG_BASE,
     Resource,
 )
 from nucliadb_ingest.orm.shard import Shard
-from nucliadb_ingest.orm.utils import get_basic, get_node_klass, set_basic
+from nucliadb_ingest.orm.utils import (
+    get_basic,
+    get_basic_key,
+    get_node_klass,
+    invalidate_shards_cache,
+    set_basic,
+)
 from nucliadb_utils.cache.utility import Cache
 from nucliadb_utils.exceptions import ShardsNotFound
 from nucliadb_utils.settings import indexing_settings
 from nucliadb_utils.storages.storage import Storage
-from nucliadb_utils.utilities import get_storage
+from nucliadb_utils.utilities import get_cache, get_storage
 
 KB_RESOURCE = "/kbs/{kbid}/r/{uuid}"
 
@@ -205,6 +216,7 @@ class KnowledgeBox:
             ),
             config.SerializeToString(),
         )
+        await initialize_kb_counters(txn, uuid)
         # Create Storage
         storage = await get_storage(service_name=SERVICE_NAME)
 
@@ -419,6 +431,7 @@ class KnowledgeBox:
 
         await txn.commit(resource=False)
         await cls.delete_all_kb_keys(driver, kbid)
+        await invalidate_shards_cache(await get_cache(), kbid)
 
     @classmethod
     async def delete_all_kb_keys(cls, driver: Driver, kbid: str):
@@ -461,6 +474,55 @@ class KnowledgeBox:
         else:
             return None
 
+    async def get_many(
+        self, uuids: List[str], origin: bool = False, relations: bool = False
+    ) -> List[Resource]:
+        """
+        Existing resources of the list, in its order, reading the basic of all of
+        them (and their origin and relations when asked) at once
+        """
+        uuids = list(dict.fromkeys(uuids))
+        keys = [get_basic_key(self.kbid, uuid) for uuid in uuids]
+        if origin:
+            keys.extend(
+                [KB_RESOURCE_ORIGIN.format(kbid=self.kbid, uuid=uuid) for uuid in uuids]
+            )
+        if relations:
+            keys.extend(
+                [
+                    KB_RESOURCE_RELATIONS.format(kbid=self.kbid, uuid=uuid)
+                    for uuid in uuids
+                ]
+            )
+        values = await self.txn.batch_get(keys)
+        raw_basics = values[: len(uuids)]
+        raw_origins = values[len(uuids) : 2 * len(uuids)] if origin else []
+        raw_relations = values[-len(uuids) :] if relations else []
+
+        config = await self.get_config()
+        resources: List[Resource] = []
+        for index, (uuid, raw_basic) in enumerate(zip(uuids, raw_basics)):
+            if not raw_basic:
+                continue
+            resource = Resource(
+                txn=self.txn,
+                storage=self.storage,
+                kb=self,
+                uuid=uuid,
+                basic=Resource.parse_basic(raw_basic),
+                disable_vectors=config.disable_vectors if config is not None else True,
+            )
+            raw_origin = raw_origins[index] if origin else None
+            if raw_origin:
+                resource.origin = PBOrigin()
+                resource.origin.ParseFromString(raw_origin)
+            raw_relation = raw_relations[index] if relations else None
+            if raw_relation:
+                resource.relations = PBRelations()
+                resource.relations.ParseFromString(raw_relation)
+            resources.append(resource)
+        return resources
+
     async def delete_resource(self, uuid: str):
         raw_basic = await get_basic(self.txn, self.kbid, uuid)
         if raw_basic:
@@ -44,7 +44,11 @@ class LocalShard(AbstractShard):
         await self.node.delete_resource(req)
 
     async def add_resource(
-        self, resource: PBBrainResource, txid: int, reindex_id: Optional[str] = None
+        self,
+        resource: PBBrainResource,
+        txid: int,
+        reindex_id: Optional[str] = None,
+        new_resource: bool = False,
     ) -> int:
         for shardreplica in self.shard.replicas:
             resource.shard_id = resource.resource.shard_id = shardreplica.shard.id
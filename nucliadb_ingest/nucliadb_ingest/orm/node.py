@@ -19,12 +19,13 @@
 #
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
+import prometheus_client  # type: ignore
 from grpc import aio  # type: ignore
-from lru import LRU  # type: ignore
 from nucliadb_protos.nodereader_pb2_grpc import NodeReaderStub
 from nucliadb_protos.noderesources_pb2 import EmptyQuery
 from nucliadb_protos.noderesources_pb2 import Shard as NodeResourcesShard
@@ -48,9 +49,121 @@ from nucliadb_telemetry.grpc import OpenTelemetryGRPC
 from nucliadb_telemetry.utils import get_telemetry
 from nucliadb_utils.keys import KB_SHARDS
 
-READ_CONNECTIONS = LRU(50)
-WRITE_CONNECTIONS = LRU(50)
-SIDECAR_CONNECTIONS = LRU(50)
+MB = 1024 * 1024
+
+NODE_CHANNELS = prometheus_client.Gauge(
+    "nucliadb_node_channels",
+    "gRPC channels open to a node",
+    labelnames=["kind", "node"],
+)
+NODE_CHANNEL_REQUESTS = prometheus_client.Counter(
+    "nucliadb_node_channel_requests",
+    "Stubs handed out by the channel pool of a node",
+    labelnames=["kind", "node"],
+)
+NODE_CHANNEL_WARMUP_ERRORS = prometheus_client.Counter(
+    "nucliadb_node_channel_warmup_errors",
+    "Channels to a node that were not ready after the warmup timeout",
+    labelnames=["kind", "node"],
+)
+
+READER = "reader"
+WRITER = "writer"
+SIDECAR = "sidecar"
+
+
+class ChannelPool:
+    """
+    Channels to one node service, every one of them its own HTTP/2 connection,
+    handing out their stubs round robin so concurrent calls are spread across
+    connections instead of queueing on the streams limit of one of them
+    """
+
+    def __init__(self, kind: str, address: str, channels: List[Any], stubs: List[Any]):
+        self.kind = kind
+        self.address = address
+        self.channels = channels
+        self.stubs = stubs
+        self.next = 0
+        NODE_CHANNELS.labels(kind=kind, node=address).set(len(channels))
+
+    @classmethod
+    def create(cls, kind: str, address: str, grpc_address: str, stub_klass):
+        channels = [
+            grpc_channel(kind, grpc_address)
+            for _ in range(max(1, settings.node_grpc_channels))
+        ]
+        return cls(
+            kind, address, channels, [stub_klass(channel) for channel in channels]
+        )
+
+    @classmethod
+    def dummy(cls, kind: str, address: str, stub: Any):
+        return cls(kind, address, [], [stub])
+
+    def get(self) -> Any:
+        stub = self.stubs[self.next]
+        self.next = (self.next + 1) % len(self.stubs)
+        NODE_CHANNEL_REQUESTS.labels(kind=self.kind, node=self.address).inc()
+        return stub
+
+    async def warmup(self):
+        for channel in self.channels:
+            try:
+                await asyncio.wait_for(
+                    channel.channel_ready(), settings.node_grpc_warmup_timeout
+                )
+            except asyncio.TimeoutError:
+                NODE_CHANNEL_WARMUP_ERRORS.labels(
+                    kind=self.kind, node=self.address
+                ).inc()
+                logger.warning(f"Channel to {self.kind} {self.address} is not ready")
+
+    async def close(self):
+        for channel in self.channels:
+            await channel.close()
+        NODE_CHANNELS.labels(kind=self.kind, node=self.address).set(0)
+
+
+def grpc_channel_options(kind: str) -> List[Tuple[str, Any]]:
+    # The sidecar is a python grpc server with the default settings, it
+    # answers pings on idle connections sent more often than every 5 minutes
+    # with a GOAWAY, so its channels only ping while a call is running
+    permit_without_calls = 0 if kind == SIDECAR else 1
+    return [
+        ("grpc.keepalive_time_ms", settings.node_grpc_keepalive_time_ms),
+        ("grpc.keepalive_timeout_ms", settings.node_grpc_keepalive_timeout_ms),
+        ("grpc.keepalive_permit_without_calls", permit_without_calls),
+        ("grpc.http2.max_pings_without_data", 0),
+        ("grpc.max_send_message_length", settings.node_grpc_max_message_size * MB),
+        # Channels with the same target and arguments share their connection
+        # unless they have their own subchannel pool
+        ("grpc.use_local_subchannel_pool", 1),
+    ]
+
+
+def grpc_channel(kind: str, grpc_address: str):
+    options = grpc_channel_options(kind)
+    tracer_provider = get_telemetry(SERVICE_NAME)
+    if tracer_provider is not None:
+        telemetry_grpc = OpenTelemetryGRPC(
+            f"{SERVICE_NAME}_grpc_{kind}", tracer_provider
+        )
+        return telemetry_grpc.init_client(
+            grpc_address,
+            max_receive_message=settings.node_grpc_max_message_size,
+            options=options,
+        )
+    options.append(
+        ("grpc.max_receive_message_length", settings.node_grpc_max_message_size * MB)
+    )
+    return aio.insecure_channel(grpc_address, options=options)
+
+
+# Channel pools by node address
+READ_CONNECTIONS: Dict[str, ChannelPool] = {}
+WRITE_CONNECTIONS: Dict[str, ChannelPool] = {}
+SIDECAR_CONNECTIONS: Dict[str, ChannelPool] = {}
 
 
 class DummyWriterStub:
@@ -108,10 +221,6 @@ class ClusterMember:
 
 
 class Node(AbstractNode):
-    _writer: Optional[NodeWriterStub] = None
-    _reader: Optional[NodeReaderStub] = None
-    _sidecar: Optional[NodeSidecarStub] = None
-
     def __init__(self, address: str, label: str, dummy: bool = False):
         self.address = address
         self.label = label
@@ -189,8 +298,17 @@ class Node(AbstractNode):
 
     @classmethod
     async def destroy(cls, ident: str):
-        del NODES[ident]
+        node = NODES.pop(ident)
         NODE_CLUSTER.compute()
+        if node.address not in [other.address for other in NODES.values()]:
+            for connections in (
+                READ_CONNECTIONS,
+                WRITE_CONNECTIONS,
+                SIDECAR_CONNECTIONS,
+            ):
+                pool = connections.pop(node.address, None)
+                if pool is not None:
+                    await pool.close()
 
     @classmethod
     async def load_active_nodes(cls):
@@ -201,111 +319,84 @@ class Node(AbstractNode):
         members = await stub.ListMembers(request)
         for member in members.members:
             NODES[member.id] = Node(member.listen_address, member.type, member.dummy)
-
-    @property
-    def sidecar(self) -> NodeSidecarStub:
-        if (
-            self._sidecar is None
-            and self.address not in SIDECAR_CONNECTIONS
-            and self.dummy is False
-        ):
-            hostname = self.address.split(":")[0]
-            if settings.node_sidecar_port is None:
-                # For testing proposes we need to be able to have a writing port
-                sidecar_port = settings.sidecar_port_map[hostname]
-                grpc_address = f"localhost:{sidecar_port}"
+        await asyncio.gather(*[node.warmup() for node in NODES.values()])
+
+    def grpc_address(self, port: Optional[int], port_map: Dict[Any, int]) -> str:
+        hostname = self.address.split(":")[0]
+        if port is None:
+            # For testing proposes we need to be able to have a writing port
+            return f"localhost:{port_map[hostname]}"
+        return f"{hostname}:{port}"
+
+    def pool(
+        self,
+        kind: str,
+        connections: Dict[str, ChannelPool],
+        port: Optional[int],
+        port_map: Dict[Any, int],
+        stub_klass,
+        dummy_klass,
+    ) -> ChannelPool:
+        pool = connections.get(self.address)
+        if pool is None:
+            if self.dummy:
+                pool = ChannelPool.dummy(kind, self.address, dummy_klass())
             else:
-                grpc_address = f"{hostname}:{settings.node_sidecar_port}"
-
-            tracer_provider = get_telemetry(SERVICE_NAME)
-            if tracer_provider is not None:
-                telemetry_grpc = OpenTelemetryGRPC(
-                    f"{SERVICE_NAME}_grpc_sidecar", tracer_provider
+                pool = ChannelPool.create(
+                    kind,
+                    self.address,
+                    self.grpc_address(port, port_map),
+                    stub_klass,
                 )
-                channel = telemetry_grpc.init_client(grpc_address)
-            else:
-                channel = aio.insecure_channel(grpc_address)
+            connections[self.address] = pool
+        return pool
 
-            SIDECAR_CONNECTIONS[self.address] = NodeSidecarStub(channel)
-        if (
-            self._sidecar is None
-            and self.address not in SIDECAR_CONNECTIONS
-            and self.dummy is True
-        ):
-            SIDECAR_CONNECTIONS[self.address] = DummySidecarStub()
-        if self._sidecar is None:
-            self._sidecar = SIDECAR_CONNECTIONS[self.address]
-        return self._sidecar
+    @property
+    def sidecar(self) -> NodeSidecarStub:
+        return self.pool(
+            SIDECAR,
+            SIDECAR_CONNECTIONS,
+            settings.node_sidecar_port,
+            settings.sidecar_port_map,
+            NodeSidecarStub,
+            DummySidecarStub,
+        ).get()
 
     @property
     def writer(self) -> NodeWriterStub:
-        if (
-            self._writer is None
-            and self.address not in WRITE_CONNECTIONS
-            and self.dummy is False
-        ):
-            hostname = self.address.split(":")[0]
-            if settings.node_writer_port is None:
-                # For testing proposes we need to be able to have a writing port
-                writer_port = settings.writer_port_map[hostname]
-                grpc_address = f"localhost:{writer_port}"
-            else:
-                grpc_address = f"{hostname}:{settings.node_writer_port}"
-
-            tracer_provider = get_telemetry(SERVICE_NAME)
-            if tracer_provider is not None:
-                telemetry_grpc = OpenTelemetryGRPC(
-                    f"{SERVICE_NAME}_grpc_writer", tracer_provider
-                )
-                channel = telemetry_grpc.init_client(grpc_address)
-            else:
-                channel = aio.insecure_channel(grpc_address)
-
-            WRITE_CONNECTIONS[self.address] = NodeWriterStub(channel)
-        if (
-            self._writer is None
-            and self.address not in WRITE_CONNECTIONS
-            and self.dummy is True
-        ):
-            WRITE_CONNECTIONS[self.address] = DummyWriterStub()
-        if self._writer is None:
-            self._writer = WRITE_CONNECTIONS[self.address]
-        return self._writer
+        return self.pool(
+            WRITER,
+            WRITE_CONNECTIONS,
+            settings.node_writer_port,
+            settings.writer_port_map,
+            NodeWriterStub,
+            DummyWriterStub,
+        ).get()
 
     @property
     def reader(self) -> NodeReaderStub:
-        if (
-            self._reader is None
-            and self.address not in READ_CONNECTIONS
-            and self.dummy is False
-        ):
-            hostname = self.address.split(":")[0]
-            if settings.node_reader_port is None:
-                # For testing proposes we need to be able to have a writing port
-                reader_port = settings.reader_port_map[hostname]
-                grpc_address = f"localhost:{reader_port}"
-            else:
-                grpc_address = f"{hostname}:{settings.node_reader_port}"
-
-            tracer_provider = get_telemetry(SERVICE_NAME)
-            if tracer_provider is not None:
-                telemetry_grpc = OpenTelemetryGRPC(
-                    f"{SERVICE_NAME}_grpc_reader", tracer_provider
-                )
-                channel = telemetry_grpc.init_client(grpc_address)
-            else:
-                channel = aio.insecure_channel(grpc_address)
-
-            READ_CONNECTIONS[self.address] = NodeReaderStub(channel)
-        if (
-            self._reader is None
-            and self.address not in READ_CONNECTIONS
-            and self.dummy is True
-        ):
-            READ_CONNECTIONS[self.address] = DummyReaderStub()
-        if self._reader is None:
-            self._reader = READ_CONNECTIONS[self.address]
-        return self._reader
+        return self.pool(
+            READER,
+            READ_CONNECTIONS,
+            settings.node_reader_port,
+            settings.reader_port_map,
+            NodeReaderStub,
+            DummyReaderStub,
+        ).get()
+
+    async def warmup(self):
+        """
+        Opens the connections to the node reader before the first search needs
+        them
+        """
+        await self.pool(
+            READER,
+            READ_CONNECTIONS,
+            settings.node_reader_port,
+            settings.reader_port_map,
+            NodeReaderStub,
+            DummyReaderStub,
+        ).warmup()
 
     async def get_shard(self, id: str) -> ShardId:
         req = ShardId(id=id)
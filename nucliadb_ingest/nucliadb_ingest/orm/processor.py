@@ -17,8 +17,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
+from contextlib import asynccontextmanager
 from enum import Enum
-from typing import AsyncIterator, Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from weakref import WeakValueDictionary
 
 from nucliadb_protos.audit_pb2 import AuditRequest
 from nucliadb_protos.knowledgebox_pb2 import KnowledgeBox as KnowledgeBoxPB
@@ -42,12 +45,17 @@ from nucliadb_protos.writer_pb2 import BrokerMessage, Notification
 from sentry_sdk import capture_exception
 
 from nucliadb_ingest import SERVICE_NAME, logger
-from nucliadb_ingest.maindb.driver import Driver, Transaction
+from nucliadb_ingest.maindb.driver import TXNID, Driver, Transaction
+from nucliadb_ingest.orm.counters import (
+    Counters,
+    get_resource_counters,
+    update_kb_counters,
+)
 from nucliadb_ingest.orm.exceptions import DeadletteredError
 from nucliadb_ingest.orm.knowledgebox import KnowledgeBox
 from nucliadb_ingest.orm.resource import KB_RESOURCE_SLUG_BASE, Resource
 from nucliadb_ingest.orm.shard import Shard
-from nucliadb_ingest.orm.utils import get_node_klass
+from nucliadb_ingest.orm.utils import get_node_klass, invalidate_shards_cache
 from nucliadb_ingest.sentry import SENTRY
 from nucliadb_ingest.settings import settings
 from nucliadb_utils.audit.audit import AuditStorage
@@ -85,6 +93,7 @@ class Processor:
         audit: Optional[AuditStorage] = None,
         cache: Optional[Cache] = None,
         partition: Optional[str] = None,
+        commit_seqid: Optional[Callable[[int], int]] = None,
     ):
         self.messages = {}
         self.driver = driver
@@ -92,6 +101,16 @@ class Processor:
         self.audit = audit
         self.partition = partition
         self.cache = cache
+        # Messages processed out of order (by lanes) can only store the seqid
+        # up to which every message of the partition is done. Their resource
+        # transactions run at once, so the seqid is not written with them but
+        # on its own, one at a time and never moving back
+        self.commit_seqid = commit_seqid
+        self.seqid_lock = asyncio.Lock()
+        self.stored_seqid: Optional[int] = None
+        # The kb keys (counters and shards) are read and written in their own
+        # transactions, begun while holding the lock of the kb
+        self.kb_locks: WeakValueDictionary[str, asyncio.Lock] = WeakValueDictionary()
 
     async def initialize(self):
         await self.driver.initialize()
@@ -148,6 +167,78 @@ class Processor:
             logger.warning(f"Audit type empty txn_result: {txn_result}")
         return True
 
+    async def process_coalesced(
+        self,
+        messages: List[BrokerMessage],
+        seqids: List[int],
+        partition: Optional[str] = None,
+    ) -> bool:
+        """
+        Applies consecutive autocommit messages of the same resource in a
+        single transaction, committed with the seqid of the last one, so the
+        resource is indexed once. Nothing is deadlettered when it fails, the
+        error is raised for the messages to be processed one at a time
+        """
+        partition = partition if self.partition is None else self.partition
+        if partition is None:
+            raise AttributeError()
+
+        last_seqid = await self.driver.last_seqid(partition)
+        if last_seqid is not None:
+            messages = [
+                message
+                for message, seqid in zip(messages, seqids)
+                if seqid > last_seqid
+            ]
+        if len(messages) == 0:
+            return False
+
+        txn_result = await self.txn(messages, seqids[-1], partition, deadletter=False)
+        audit_type = AUDIT_TYPES.get(txn_result) if txn_result is not None else None
+        if self.audit is not None and audit_type is not None:
+            for message in messages:
+                await self.audit.report(message, audit_type)
+        return True
+
+    def kb_lock(self, kbid: str) -> asyncio.Lock:
+        lock = self.kb_locks.get(kbid)
+        if lock is None:
+            lock = self.kb_locks[kbid] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def kb_txn(self, kbid: str) -> AsyncIterator[Transaction]:
+        # Committed after the transaction of the resource, a crash in between
+        # leaves the kb counters off until they are repaired
+        async with self.kb_lock(kbid):
+            txn = await self.driver.begin()
+            try:
+                yield txn
+            except Exception:
+                await txn.abort()
+                raise
+            await txn.commit(resource=False)
+
+    async def commit_txn(self, txn: Transaction, partition: str, seqid: int):
+        if self.commit_seqid is None:
+            await txn.commit(partition, seqid)
+        else:
+            await txn.commit(resource=False)
+            await self.store_seqid(partition, seqid)
+
+    async def store_seqid(self, partition: str, seqid: int):
+        assert self.commit_seqid is not None
+        async with self.seqid_lock:
+            if self.stored_seqid is None:
+                self.stored_seqid = await self.driver.last_seqid(partition)
+            value = self.commit_seqid(seqid)
+            if self.stored_seqid is not None and value <= self.stored_seqid:
+                return
+            txn = await self.driver.begin()
+            await txn.set(TXNID.format(worker=partition), str(value).encode())
+            await txn.commit(resource=False)
+            self.stored_seqid = value
+
     async def get_resource_uuid(self, kb: KnowledgeBox, message: BrokerMessage) -> str:
         if message.uuid is None:
             uuid = await kb.get_resource_uuid_by_slug(message.slug)
@@ -170,6 +261,7 @@ class Processor:
                 raise AttributeError("Shard not available")
             await shard.delete_resource(message.uuid, seqid)
             try:
+                counters = await get_resource_counters(txn, message.kbid, uuid)
                 await kb.delete_resource(message.uuid)
             except Exception as exc:
                 await txn.abort()
@@ -177,8 +269,14 @@ class Processor:
                     partition, seqid, message.multiid, message.kbid, message.uuid
                 )
                 raise exc
+            await self.commit_txn(txn, partition, seqid)
+            if counters is not None:
+                async with self.kb_txn(message.kbid) as kb_txn:
+                    await update_kb_counters(
+                        kb_txn, message.kbid, partition, Counters() - counters.totals()
+                    )
         if txn.open:
-            await txn.commit(partition, seqid)
+            await self.commit_txn(txn, partition, seqid)
         await self.notify_commit(
             partition, seqid, message.multiid, message.kbid, message.uuid
         )
@@ -187,7 +285,11 @@ class Processor:
         pass
 
     async def txn(
-        self, messages: List[BrokerMessage], seqid: int, partition: str
+        self,
+        messages: List[BrokerMessage],
+        seqid: int,
+        partition: str,
+        deadletter: bool = True,
     ) -> Optional[TxnResult]:
         if len(messages) == 0:
             return None
@@ -196,7 +298,7 @@ class Processor:
         kbid = messages[0].kbid
         if not await KnowledgeBox.exist_kb(txn, kbid):
             logger.warning(f"KB {kbid} is deleted: skiping txn")
-            await txn.commit(partition, seqid)
+            await self.commit_txn(txn, partition, seqid)
             return None
 
         multi = messages[0].multiid
@@ -221,28 +323,44 @@ class Processor:
             if resource and resource.modified:
                 shard_id = await kb.get_resource_shard_id(uuid)
                 shard: Optional[Shard] = None
+                shard_created = False
                 node_klass = get_node_klass()
 
                 if shard_id is not None:
                     shard = await kb.get_resource_shard(shard_id, node_klass)
 
+                new_resource = shard is None
                 if shard is None:
                     # Its a new resource
                     # Check if we have enough resource to create a new shard
-                    shard = await node_klass.actual_shard(txn, kbid)
-                    if shard is None:
-                        shard = await node_klass.create_shard_by_kbid(txn, kbid)
+                    async with self.kb_txn(kbid) as kb_txn:
+                        shard = await node_klass.actual_shard(kb_txn, kbid)
+                        if shard is None:
+                            shard = await node_klass.create_shard_by_kbid(kb_txn, kbid)
+                            shard_created = True
                     await kb.set_resource_shard_id(uuid, shard.sharduuid)
 
                 if shard is not None:
-                    count = await shard.add_resource(resource.indexer.brain, seqid)
+                    count = await shard.add_resource(
+                        resource.indexer.brain, seqid, new_resource=new_resource
+                    )
                     if count > settings.max_node_fields:
-                        shard = await node_klass.create_shard_by_kbid(txn, kbid)
+                        async with self.kb_txn(kbid) as kb_txn:
+                            # Another lane may have created it already
+                            actual = await node_klass.actual_shard(kb_txn, kbid)
+                            if actual is None or actual.sharduuid == shard.sharduuid:
+                                await node_klass.create_shard_by_kbid(kb_txn, kbid)
+                                shard_created = True
 
                 else:
                     raise AttributeError("Shard is not available")
 
-                await txn.commit(partition, seqid)
+                delta = await resource.update_counters()
+                await self.commit_txn(txn, partition, seqid)
+                async with self.kb_txn(kbid) as kb_txn:
+                    await update_kb_counters(kb_txn, kbid, partition, delta)
+                if shard_created:
+                    await invalidate_shards_cache(self.cache, kbid)
 
                 # Slug may have conflicts as its not partitioned properly. We make it as short as possible
                 txn = await self.driver.begin()
@@ -260,7 +378,8 @@ class Processor:
             # As we are in the middle of a transaction, we cannot let the exception raise directly
             # as we need to do some cleanup. Exception will be reraised at the end of the function
             # and then handled by the top caller, so errors can be handled in the same place.
-            await self.deadletter(messages, partition, seqid)
+            if deadletter:
+                await self.deadletter(messages, partition, seqid)
             await self.notify_abort(partition, origin_txn, multi, kbid, uuid)
             handled_exception = exc
         finally:
@@ -272,7 +391,7 @@ class Processor:
                 await txn.abort()
 
         if handled_exception is not None:
-            if seqid == -1:
+            if seqid == -1 or not deadletter:
                 raise handled_exception
             else:
                 raise DeadletteredError() from handled_exception
@@ -478,6 +597,7 @@ class Processor:
         txn = await self.driver.begin()
         uuid = await KnowledgeBox.delete_kb(txn, kbid=kbid, slug=slug)
         await txn.commit(resource=False)
+        await invalidate_shards_cache(self.cache, uuid)
         logger.info("Done")
         return uuid
 
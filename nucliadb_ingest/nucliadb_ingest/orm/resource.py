@@ -19,7 +19,21 @@
 #
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+import asyncio
+from collections import defaultdict
+from functools import partial
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
 
 from nucliadb_protos.resources_pb2 import Basic as PBBasic
 from nucliadb_protos.resources_pb2 import Conversation as PBConversation
@@ -57,7 +71,14 @@ from nucliadb_ingest.fields.link import Link
 from nucliadb_ingest.fields.text import Text
 from nucliadb_ingest.maindb.driver import Transaction
 from nucliadb_ingest.orm.brain import ResourceBrain
+from nucliadb_ingest.orm.counters import (
+    Counters,
+    ResourceCounters,
+    get_resource_counters,
+    set_resource_counters,
+)
 from nucliadb_ingest.orm.utils import get_basic, set_basic
+from nucliadb_ingest.settings import settings
 from nucliadb_models.common import CloudLink
 from nucliadb_utils.storages.storage import Storage
 
@@ -115,6 +136,8 @@ class Resource:
         self.modified: bool = False
         self._indexer: Optional[ResourceBrain] = None
         self._modified_extracted_text: List[FieldID] = []
+        self._counters: Optional[ResourceCounters] = None
+        self._previous_counters: Optional[ResourceCounters] = None
 
         self.txn = txn
         self.storage = storage
@@ -129,6 +152,32 @@ class Resource:
             self._indexer = ResourceBrain(rid=self.uuid)
         return self._indexer
 
+    async def get_counters(self) -> ResourceCounters:
+        if self._counters is None:
+            self._previous_counters = await get_resource_counters(
+                self.txn, self.kb.kbid, self.uuid
+            )
+            if self._previous_counters is not None:
+                self._counters = ResourceCounters.parse(
+                    self._previous_counters.serialize()
+                )
+            else:
+                self._counters = ResourceCounters()
+        return self._counters
+
+    async def update_counters(self) -> Counters:
+        """
+        Stores the counters of the resource and returns how much the ones of
+        the kb change with them
+        """
+        counters = await self.get_counters()
+        if self._previous_counters is not None:
+            previous = self._previous_counters.totals()
+        else:
+            previous = Counters()
+        await set_resource_counters(self.txn, self.kb.kbid, self.uuid, counters)
+        return counters.totals() - previous
+
     async def set_slug(self):
         basic = await self.get_basic()
         new_key = KB_RESOURCE_SLUG.format(kbid=self.kb.kbid, slug=basic.slug)
@@ -363,6 +412,7 @@ class Resource:
         if metadata is not None:
             self.indexer.delete_metadata(field_key=field_key, metadata=metadata)
 
+        (await self.get_counters()).delete_field(field_key)
         await field_obj.delete()
 
     async def apply_fields(self, message: BrokerMessage):
@@ -390,6 +440,35 @@ class Resource:
         for fieldid in message.delete_fields:
             await self.delete_field(fieldid.field_type, fieldid.field)
 
+    async def _run_field_operations(
+        self,
+        operations: List[List[Tuple[Tuple[str, int], Callable[[], Awaitable[Any]]]]],
+    ) -> Dict[Tuple[str, int], Any]:
+        """
+        Run the storage operations of every field, each field's operations in
+        order and up to `ingest_storage_concurrency` fields at once
+        """
+        results: Dict[Tuple[str, int], Any] = {}
+        semaphore = asyncio.Semaphore(max(settings.ingest_storage_concurrency, 1))
+
+        async def run(
+            field_operations: List[Tuple[Tuple[str, int], Callable[[], Awaitable[Any]]]]
+        ):
+            async with semaphore:
+                for key, operation in field_operations:
+                    results[key] = await operation()
+
+        outcomes = await asyncio.gather(
+            *[run(field_operations) for field_operations in operations],
+            return_exceptions=True,
+        )
+        # Let every upload finish before failing, so none is left running
+        # once the transaction is aborted
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return results
+
     async def apply_extracted(self, message: BrokerMessage):
         errors = False
         field_obj: Field
@@ -410,16 +489,31 @@ class Resource:
             self.basic.metadata.status = PBMetadata.Status.PROCESSED
             basic_modified = True
 
-        for extracted_text in message.extracted_text:
+        counters = await self.get_counters()
+        # Storage writes of a field run in message order, so its metadata is
+        # stored before its vectors. Different fields upload concurrently
+        operations: Dict[
+            Tuple[int, str], List[Tuple[Tuple[str, int], Callable[[], Awaitable[Any]]]]
+        ] = defaultdict(list)
+
+        for index, extracted_text in enumerate(message.extracted_text):
             field_obj = await self.get_field(
                 extracted_text.field.field, extracted_text.field.field_type, load=False
             )
-            await field_obj.set_extracted_text(extracted_text)
+            operations[
+                (extracted_text.field.field_type, extracted_text.field.field)
+            ].append(
+                (
+                    ("extracted_text", index),
+                    partial(field_obj.set_extracted_text, extracted_text),
+                )
+            )
             self._modified_extracted_text.append(
                 extracted_text.field,
             )
+            counters.set_text(self.generate_field_id(extracted_text.field))
 
-        for link_extracted_data in message.link_extracted_data:
+        for index, link_extracted_data in enumerate(message.link_extracted_data):
             field_link: Link = await self.get_field(
                 link_extracted_data.field,
                 FieldType.LINK,
@@ -430,7 +524,12 @@ class Resource:
                     link_extracted_data.link_thumbnail.uri
                 )
                 basic_modified = True
-            await field_link.set_link_extracted_data(link_extracted_data)
+            operations[(FieldType.LINK, link_extracted_data.field)].append(
+                (
+                    ("link_extracted_data", index),
+                    partial(field_link.set_link_extracted_data, link_extracted_data),
+                )
+            )
 
             if self.basic.icon == "":
                 self.basic.icon = "application/stf-link"
@@ -445,7 +544,7 @@ class Resource:
                 self.basic.summary = link_extracted_data.description
                 basic_modified = True
 
-        for file_extracted_data in message.file_extracted_data:
+        for index, file_extracted_data in enumerate(message.file_extracted_data):
             field_file: File = await self.get_field(
                 file_extracted_data.field,
                 FieldType.FILE,
@@ -459,24 +558,75 @@ class Resource:
                     file_extracted_data.file_thumbnail.uri
                 )
                 basic_modified = True
-            await field_file.set_file_extracted_data(file_extracted_data)
+            operations[(FieldType.FILE, file_extracted_data.field)].append(
+                (
+                    ("file_extracted_data", index),
+                    partial(field_file.set_file_extracted_data, file_extracted_data),
+                )
+            )
 
         # Metadata should go first
-        for field_metadata in message.field_metadata:
+        for index, field_metadata in enumerate(message.field_metadata):
             field_obj = await self.get_field(
                 field_metadata.field.field,
                 field_metadata.field.field_type,
                 load=False,
             )
-            (
-                metadata,
-                replace_field,
-                replace_splits,
-            ) = await field_obj.set_field_metadata(field_metadata)
+            operations[
+                (field_metadata.field.field_type, field_metadata.field.field)
+            ].append(
+                (
+                    ("field_metadata", index),
+                    partial(field_obj.set_field_metadata, field_metadata),
+                )
+            )
+
+        # Upload to binary storage
+        # Vector indexing
+        if self.disable_vectors is False:
+            for index, field_vectors in enumerate(message.field_vectors):
+                field_obj = await self.get_field(
+                    field_vectors.field.field,
+                    field_vectors.field.field_type,
+                    load=False,
+                )
+                operations[
+                    (field_vectors.field.field_type, field_vectors.field.field)
+                ].append(
+                    (
+                        ("field_vectors", index),
+                        partial(field_obj.set_vectors, field_vectors),
+                    )
+                )
+
+        # Only uploading to binary storage
+        for index, field_large_metadata in enumerate(message.field_large_metadata):
+            field_obj = await self.get_field(
+                field_large_metadata.field.field,
+                field_large_metadata.field.field_type,
+                load=False,
+            )
+            operations[
+                (
+                    field_large_metadata.field.field_type,
+                    field_large_metadata.field.field,
+                )
+            ].append(
+                (
+                    ("field_large_metadata", index),
+                    partial(field_obj.set_large_field_metadata, field_large_metadata),
+                )
+            )
+
+        results = await self._run_field_operations(list(operations.values()))
+
+        for index, field_metadata in enumerate(message.field_metadata):
+            metadata, replace_field, replace_splits = results[("field_metadata", index)]
             field_key = self.generate_field_id(field_metadata.field)
             self.indexer.apply_field_metadata(
                 field_key, metadata, replace_field, replace_splits
             )
+            counters.set_paragraphs(field_key, metadata)
 
             if (
                 field_metadata.metadata.metadata.thumbnail
@@ -487,35 +637,18 @@ class Resource:
                 )
                 basic_modified = True
 
-        # Upload to binary storage
-        # Vector indexing
         if self.disable_vectors is False:
-            for field_vectors in message.field_vectors:
-                field_obj = await self.get_field(
-                    field_vectors.field.field,
-                    field_vectors.field.field_type,
-                    load=False,
-                )
-                vo, replace_field, replace_splits = await field_obj.set_vectors(
-                    field_vectors
-                )
+            for index, field_vectors in enumerate(message.field_vectors):
+                vo, replace_field, replace_splits = results[("field_vectors", index)]
                 field_key = self.generate_field_id(field_vectors.field)
                 if vo is not None:
                     self.indexer.apply_field_vectors(
                         field_key, vo, replace_field, replace_splits
                     )
+                    counters.set_sentences(field_key, vo)
                 else:
                     raise AttributeError("VO not found on set")
 
-        # Only uploading to binary storage
-        for field_large_metadata in message.field_large_metadata:
-            field_obj = await self.get_field(
-                field_large_metadata.field.field,
-                field_large_metadata.field.field_type,
-                load=False,
-            )
-            await field_obj.set_large_field_metadata(field_large_metadata)
-
         for relation in message.relations:
             self.indexer.brain.relations.append(relation)
         await self.set_relations(message.relations)  # type: ignore
@@ -571,6 +704,8 @@ class Resource:
 
     def clean(self):
         self._indexer = None
+        self._counters = None
+        self._previous_counters = None
 
     async def iterate_sentences(
         self, enabled_metadata: EnabledMetadata
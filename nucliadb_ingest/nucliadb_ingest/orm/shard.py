@@ -19,8 +19,11 @@
 #
 from __future__ import annotations
 
-from typing import Any, Optional
+import asyncio
+import time
+from typing import Any, Dict, Optional, Tuple
 
+from grpc.aio import AioRpcError  # type: ignore
 from lru import LRU  # type: ignore
 from nucliadb_protos.noderesources_pb2 import (
     Resource as PBBrainResource,  # type: ignore
@@ -28,14 +31,88 @@ from nucliadb_protos.noderesources_pb2 import (
 from nucliadb_protos.nodewriter_pb2 import Counter, IndexMessage
 from nucliadb_protos.writer_pb2 import ShardObject as PBShard
 
-from nucliadb_ingest import SERVICE_NAME  # type: ignore
+from nucliadb_ingest import SERVICE_NAME, logger  # type: ignore
 from nucliadb_ingest.orm import NODES
 from nucliadb_ingest.orm.abc import AbstractShard
+from nucliadb_ingest.settings import settings
 from nucliadb_utils.utilities import get_indexing, get_storage
 
 SHARDS = LRU(100)
 
 
+class ShardCounts:
+    """
+    Resources of each shard as counted by the sidecar of its replicas, plus
+    the ones added and deleted by this process since. Counts older than
+    `refresh` seconds are reconciled with the sidecar in the background
+    """
+
+    def __init__(self, size: int, refresh: float):
+        self.counts: Dict[str, Tuple[int, float]] = LRU(size)
+        self.refresh = refresh
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    async def get(self, sharduuid: str, shard: PBShard) -> int:
+        cached = self.counts.get(sharduuid)
+        if cached is None:
+            return await self.reconcile(sharduuid, shard)
+
+        count, updated = cached
+        if time.monotonic() - updated > self.refresh and sharduuid not in self.tasks:
+            task = asyncio.create_task(self.reconcile_in_background(sharduuid, shard))
+            task.add_done_callback(lambda _: self.tasks.pop(sharduuid, None))
+            self.tasks[sharduuid] = task
+        return count
+
+    def update(self, sharduuid: str, delta: int):
+        cached = self.counts.get(sharduuid)
+        if cached is not None:
+            count, updated = cached
+            self.counts[sharduuid] = (max(count + delta, 0), updated)
+
+    async def reconcile_in_background(self, sharduuid: str, shard: PBShard):
+        # Nobody awaits the task, so errors are logged here and the count is
+        # reconciled again on the next get
+        try:
+            await self.reconcile(sharduuid, shard)
+        except Exception:
+            logger.exception(f"Could not reconcile the resources of {sharduuid}")
+
+    async def reconcile(self, sharduuid: str, shard: PBShard) -> int:
+        count = -1
+        for shardreplica in shard.replicas:
+            node = NODES.get(shardreplica.node)
+            if node is None:
+                logger.warning(
+                    f"Node {shardreplica.node} of shard {sharduuid} is not available"
+                )
+                continue
+            try:
+                res: Counter = await node.sidecar.GetCount(shardreplica.shard)  # type: ignore
+            except AioRpcError:
+                logger.warning(
+                    f"Could not count resources of {shardreplica.shard.id} "
+                    f"at {shardreplica.node}",
+                    exc_info=True,
+                )
+                continue
+            count = max(count, res.resources)
+
+        if count >= 0:
+            self.counts[sharduuid] = (count, time.monotonic())
+        else:
+            # Keep the last known count until a replica answers again
+            cached = self.counts.get(sharduuid)
+            if cached is not None:
+                count = cached[0]
+        return count
+
+
+SHARD_COUNTS = ShardCounts(
+    settings.shard_counts_cache_size, settings.shard_counts_refresh
+)
+
+
 class Shard(AbstractShard):
     def __init__(self, sharduuid: str, shard: PBShard, node: Optional[Any] = None):
         self.shard = shard
@@ -55,35 +132,41 @@ class Shard(AbstractShard):
             indexpb.typemessage = IndexMessage.TypeMessage.DELETION
             await indexing.index(indexpb, shardreplica.node)
 
+        SHARD_COUNTS.update(self.sharduuid, -1)
+
     async def add_resource(
-        self, resource: PBBrainResource, txid: int, reindex_id: Optional[str] = None
+        self,
+        resource: PBBrainResource,
+        txid: int,
+        reindex_id: Optional[str] = None,
+        new_resource: bool = False,
     ) -> int:
 
         storage = await get_storage(service_name=SERVICE_NAME)
         indexing = get_indexing()
 
-        count: int = -1
         indexpb: IndexMessage
 
+        # One payload for all the replicas, each index message carries the
+        # shard id of its replica
+        resource.shard_id = resource.resource.shard_id = ""
+        storage_key = await storage.shared_indexing(resource, txid, reindex_id)
+        replicas = [shardreplica.shard.id for shardreplica in self.shard.replicas]
+
         for shardreplica in self.shard.replicas:
-            resource.shard_id = (
-                resource.resource.shard_id
-            ) = shard = shardreplica.shard.id
+            indexpb = IndexMessage()
+            indexpb.node = shardreplica.node
+            indexpb.shard = shardreplica.shard.id
             if reindex_id is not None:
-                indexpb = await storage.reindexing(
-                    resource, shardreplica.node, shard, reindex_id
-                )
+                indexpb.reindex_id = reindex_id
             else:
-                indexpb = await storage.indexing(
-                    resource, shardreplica.node, shard, txid
-                )
+                indexpb.txid = max(txid, 0)
+            indexpb.resource = resource.resource.uuid
+            indexpb.typemessage = IndexMessage.TypeMessage.CREATION
+            indexpb.storage_key = storage_key
+            indexpb.replicas.extend(replicas)
             await indexing.index(indexpb, shardreplica.node)
 
-            try:
-                res: Counter = await NODES[shardreplica.node].sidecar.GetCount(shardreplica.shard)  # type: ignore
-                if count < res.resources:
-                    count = res.resources
-            except Exception:
-                pass
-
-        return count
+        if new_resource:
+            SHARD_COUNTS.update(self.sharduuid, 1)
+        return await SHARD_COUNTS.get(self.sharduuid, self.shard)
@@ -36,6 +36,8 @@ from nucliadb_ingest.orm.node import Node
 from nucliadb_ingest.processing import PushPayload
 from nucliadb_ingest.settings import settings as ingest_settings
 from nucliadb_models.text import PushTextFormat, Text
+from nucliadb_utils.cache import KB_SHARDS_CACHE
+from nucliadb_utils.cache.utility import Cache
 from nucliadb_utils.settings import indexing_settings
 
 KB_RESOURCE_BASIC_FS = "/kbs/{kbid}/r/{uuid}/basic"  # Only used on FS driver
@@ -49,6 +51,13 @@ def get_node_klass():
         return Node
 
 
+async def invalidate_shards_cache(cache: Optional[Cache], kbid: str):
+    # Search keeps the parsed shards of the kb in memory, call it once the
+    # transaction that changed them is commited
+    if cache is not None:
+        await cache.delete(KB_SHARDS_CACHE.format(kbid=kbid), invalidate=True)
+
+
 async def set_basic(txn: Transaction, kbid: str, uuid: str, basic: Basic):
     if ingest_settings.driver == "local":
         await txn.set(
@@ -62,12 +71,14 @@ async def set_basic(txn: Transaction, kbid: str, uuid: str, basic: Basic):
         )
 
 
-async def get_basic(txn: Transaction, kbid: str, uuid: str) -> Optional[bytes]:
+def get_basic_key(kbid: str, uuid: str) -> str:
     if ingest_settings.driver == "local":
-        raw_basic = await txn.get(KB_RESOURCE_BASIC_FS.format(kbid=kbid, uuid=uuid))
-    else:
-        raw_basic = await txn.get(KB_RESOURCE_BASIC.format(kbid=kbid, uuid=uuid))
-    return raw_basic
+        return KB_RESOURCE_BASIC_FS.format(kbid=kbid, uuid=uuid)
+    return KB_RESOURCE_BASIC.format(kbid=kbid, uuid=uuid)
+
+
+async def get_basic(txn: Transaction, kbid: str, uuid: str) -> Optional[bytes]:
+    return await txn.get(get_basic_key(kbid, uuid))
 
 
 def set_title(writer: BrokerMessage, toprocess: PushPayload, title: str):
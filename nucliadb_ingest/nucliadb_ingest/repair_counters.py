@@ -0,0 +1,93 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import argparse
+import asyncio
+import logging
+import sys
+from typing import List
+
+from sentry_sdk import capture_exception
+
+from nucliadb_ingest import SERVICE_NAME
+from nucliadb_ingest.orm.counters import repair_kb_counters
+from nucliadb_ingest.orm.knowledgebox import KnowledgeBox
+from nucliadb_ingest.sentry import SENTRY, set_sentry
+from nucliadb_ingest.utils import get_driver
+from nucliadb_utils.cache import KB_COUNTER_CACHE
+from nucliadb_utils.settings import running_settings
+from nucliadb_utils.utilities import get_cache, get_storage
+
+logger = logging.getLogger("nucliadb_ingest")
+
+
+async def main(kbids: List[str]):
+    logger.info("START REPAIRING KB COUNTERS")
+    driver = await get_driver()
+    storage = await get_storage(service_name=SERVICE_NAME)
+    cache = await get_cache()
+
+    if len(kbids) == 0:
+        txn = await driver.begin()
+        async for slug in KnowledgeBox.get_kbs(txn, ""):
+            kbid = await KnowledgeBox.get_kb_uuid(txn, slug)
+            if kbid is not None:
+                kbids.append(kbid)
+        await txn.abort()
+
+    for kbid in kbids:
+        txn = await driver.begin()
+        kb = KnowledgeBox(txn, storage, cache, kbid)
+        try:
+            counters = await repair_kb_counters(driver, kb)
+            logger.info(f"  √ Repaired {kbid}: {counters}")
+        except Exception as exc:
+            capture_exception(exc)
+            logger.info(
+                f"  X ERROR while repairing counters of {kbid}, skipping: {exc.__class__.__name__} {exc}"
+            )
+        finally:
+            await txn.abort()
+        if cache is not None:
+            await cache.delete(KB_COUNTER_CACHE.format(kbid=kbid), invalidate=True)
+
+    await storage.finalize()
+    logger.info("END REPAIRING KB COUNTERS")
+
+
+def run() -> int:
+    if running_settings.sentry_url and SENTRY:
+        set_sentry(
+            running_settings.sentry_url,
+            running_settings.running_environment,
+            running_settings.logging_integration,
+        )
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s.%(msecs)02d] [%(levelname)s] - %(name)s - %(message)s",
+        stream=sys.stderr,
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Recompute the resource, field, paragraph and sentence counters of the kbs"
+    )
+    parser.add_argument("kbids", nargs="*", help="kbs to repair, all if none given")
+    args = parser.parse_args()
+    return asyncio.run(main(args.kbids))
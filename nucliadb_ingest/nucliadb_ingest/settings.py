@@ -37,6 +37,20 @@ class Settings(BaseSettings):
 
     pull_time: int = 100
 
+    # Lanes processing the messages of a partition concurrently, messages of
+    # a resource always go to the same lane and keep their order
+    consumer_lanes: int = 1
+    consumer_lane_ack_pending: int = 5
+    # Seconds a lane waits for more messages of the resource it is about to
+    # apply, consecutive autocommits of a resource go in one transaction.
+    # 0 disables coalescing
+    consumer_coalesce_window: float = 0.0
+    consumer_coalesce_max: int = 10
+
+    # Fields whose extracted data is uploaded to storage at once while a
+    # message is applied
+    ingest_storage_concurrency: int = 5
+
     replica_number: int = 0
     total_replicas: int = 1
     nuclia_partitions: int = 50
@@ -62,11 +76,22 @@ class Settings(BaseSettings):
     node_reader_port: int = 10001
     node_sidecar_port: int = 100002
 
+    # Connections to every node service, and their keepalive and message limits
+    node_grpc_channels: int = 1
+    node_grpc_keepalive_time_ms: int = 30000
+    node_grpc_keepalive_timeout_ms: int = 10000
+    node_grpc_max_message_size: int = 100  # MB
+    node_grpc_warmup_timeout: float = 5.0
+
     # Only for testing proposes
     writer_port_map: Dict[int, int] = {}
     reader_port_map: Dict[int, int] = {}
     sidecar_port_map: Dict[int, int] = {}
     max_node_fields: int = 200000
+    # Shard sizes are kept in memory and reconciled with the node sidecar
+    # after this many seconds
+    shard_counts_refresh: float = 60.0
+    shard_counts_cache_size: int = 1000
 
 
 settings = Settings()
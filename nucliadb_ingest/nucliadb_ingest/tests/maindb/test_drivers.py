@@ -19,6 +19,7 @@
 #
 import pytest
 
+from nucliadb_ingest.maindb.local import LocalDriver
 from nucliadb_ingest.maindb.redis import RedisDriver
 from nucliadb_ingest.maindb.tikv import TiKVDriver
 
@@ -30,6 +31,12 @@ async def test_redis_driver(redis):
     await driver_basic(driver)
 
 
+@pytest.mark.asyncio
+async def test_local_driver(tmpdir):
+    driver = LocalDriver(url=str(tmpdir))
+    await driver_basic(driver)
+
+
 @pytest.mark.asyncio
 async def test_tikv_driver(tikvd):
     url = [f"{tikvd[0]}:{tikvd[2]}"]
@@ -56,8 +63,13 @@ async def driver_basic(driver):
     assert result == b"My title"
 
     result = await txn.batch_get(
-        ["/kbs/kb1/r/uuid1/text", "/internal/kbs/kb1/shards/shard1"]
+        [
+            "/kbs/kb1/r/uuid1/text",
+            "/kbs/kb1/r/missing",
+            "/internal/kbs/kb1/shards/shard1",
+        ]
     )
+    assert result == [b"My title", None, b"node1"]
 
     await txn.commit(resource=False)
 
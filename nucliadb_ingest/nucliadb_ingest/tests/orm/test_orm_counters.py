@@ -0,0 +1,104 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+
+import pytest
+from nucliadb_protos.resources_pb2 import FieldComputedMetadata, Paragraph
+from nucliadb_protos.utils_pb2 import Vector, VectorObject
+from nucliadb_protos.writer_pb2 import BrokerMessage
+
+from nucliadb_ingest.orm.counters import Counters, ResourceCounters, get_kb_counters
+from nucliadb_ingest.orm.knowledgebox import KnowledgeBox
+from nucliadb_ingest.tests.fixtures import broker_resource
+
+
+def test_resource_counters():
+    counters = ResourceCounters()
+    counters.set_text("a/title")
+    counters.set_text("f/file")
+    counters.set_text("f/file")
+
+    metadata = FieldComputedMetadata()
+    metadata.metadata.paragraphs.append(Paragraph(start=0, end=10))
+    metadata.split_metadata["split"].paragraphs.append(Paragraph(start=0, end=5))
+    counters.set_paragraphs("f/file", metadata)
+
+    vo = VectorObject()
+    vo.vectors.vectors.append(Vector(start=0, end=5))
+    counters.set_sentences("f/file", vo)
+
+    assert counters.totals() == Counters(
+        resources=1, fields=2, paragraphs=2, sentences=1
+    )
+    parsed = ResourceCounters.parse(counters.serialize())
+    parsed.delete_field("f/file")
+    assert parsed.totals() == Counters(resources=1, fields=1)
+
+
+@pytest.mark.asyncio
+async def test_kb_counters_follow_ingest(
+    local_files, gcs_storage, cache, fake_node, processor, knowledgebox
+):
+    txn = await processor.driver.begin()
+    assert await get_kb_counters(txn, knowledgebox) == Counters()
+    await txn.abort()
+
+    message = broker_resource(knowledgebox)
+    await processor.process(message=message, seqid=1)
+
+    txn = await processor.driver.begin()
+    assert await get_kb_counters(txn, knowledgebox) == Counters(
+        resources=1, fields=3, paragraphs=2, sentences=3
+    )
+    await txn.abort()
+
+    delete = BrokerMessage(
+        kbid=knowledgebox, uuid=message.uuid, type=BrokerMessage.DELETE
+    )
+    await processor.process(message=delete, seqid=2)
+
+    txn = await processor.driver.begin()
+    assert await get_kb_counters(txn, knowledgebox) == Counters()
+    await txn.abort()
+
+
+@pytest.mark.asyncio
+async def test_kb_counters_with_concurrent_lanes(
+    local_files, gcs_storage, cache, fake_node, processor, knowledgebox
+):
+    # Two lanes applying new resources of the same kb at once
+    messages = [broker_resource(knowledgebox) for _ in range(2)]
+    for index, message in enumerate(messages):
+        message.slug = f"slug{index}"
+    await asyncio.gather(
+        *[
+            processor.process(message=message, seqid=seqid)
+            for seqid, message in enumerate(messages, 1)
+        ]
+    )
+
+    txn = await processor.driver.begin()
+    assert await get_kb_counters(txn, knowledgebox) == Counters(
+        resources=2, fields=6, paragraphs=4, sentences=6
+    )
+    kb = KnowledgeBox(txn, processor.storage, processor.cache, knowledgebox)
+    shards = {await kb.get_resource_shard_id(message.uuid) for message in messages}
+    assert len(shards) == 1
+    await txn.abort()
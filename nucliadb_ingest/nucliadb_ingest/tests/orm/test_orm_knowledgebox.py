@@ -0,0 +1,131 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import pytest
+from nucliadb_protos.resources_pb2 import Basic, Origin, Relations
+from nucliadb_protos.utils_pb2 import Relation
+
+from nucliadb_ingest.maindb.local import LocalDriver
+from nucliadb_ingest.orm.knowledgebox import KnowledgeBox
+from nucliadb_ingest.orm.resource import KB_RESOURCE_ORIGIN, KB_RESOURCE_RELATIONS
+from nucliadb_ingest.orm.utils import set_basic
+from nucliadb_ingest.settings import settings
+
+KBID = "kbid"
+
+
+@pytest.fixture
+async def txn(tmpdir, monkeypatch):
+    monkeypatch.setattr(settings, "driver", "local")
+    driver = LocalDriver(url=str(tmpdir))
+    await driver.initialize()
+    txn = await driver.begin()
+    # r1 has everything, r2 only its basic and r3 no relations
+    for rid in ("r1", "r2", "r3"):
+        await set_basic(txn, KBID, rid, Basic(title=f"title {rid}"))
+    for rid in ("r1", "r3"):
+        await txn.set(
+            KB_RESOURCE_ORIGIN.format(kbid=KBID, uuid=rid),
+            Origin(source_id=f"origin {rid}").SerializeToString(),
+        )
+    await txn.set(
+        KB_RESOURCE_RELATIONS.format(kbid=KBID, uuid="r1"),
+        Relations(
+            relations=[Relation(relation=Relation.CHILD, resource="r2")]
+        ).SerializeToString(),
+    )
+    await txn.commit(resource=False)
+
+    txn = await driver.begin()
+    yield txn
+    await txn.abort()
+    await driver.finalize()
+
+
+def get_many(txn, rids, **kwargs):
+    kb = KnowledgeBox(txn, None, None, KBID)  # type: ignore
+    return kb.get_many(rids, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_get_many_basic_only(txn):
+    resources = await get_many(txn, ["r3", "r1", "r2"])
+    assert [resource.uuid for resource in resources] == ["r3", "r1", "r2"]
+    assert [resource.basic.title for resource in resources] == [
+        "title r3",
+        "title r1",
+        "title r2",
+    ]
+    assert all(resource.origin is None for resource in resources)
+    assert all(resource.relations is None for resource in resources)
+
+
+@pytest.mark.asyncio
+async def test_get_many_origin_only(txn):
+    resources = await get_many(txn, ["r1", "r2", "r3"], origin=True)
+    assert resources[0].origin.source_id == "origin r1"
+    assert resources[1].origin is None
+    assert resources[2].origin.source_id == "origin r3"
+    assert all(resource.relations is None for resource in resources)
+
+
+@pytest.mark.asyncio
+async def test_get_many_relations_only(txn):
+    resources = await get_many(txn, ["r2", "r1", "r3"], relations=True)
+    assert resources[0].relations is None
+    assert resources[1].relations.relations[0].resource == "r2"
+    assert resources[2].relations is None
+    assert all(resource.origin is None for resource in resources)
+
+
+@pytest.mark.asyncio
+async def test_get_many_origin_and_relations(txn):
+    resources = await get_many(txn, ["r3", "r2", "r1"], origin=True, relations=True)
+    assert [resource.uuid for resource in resources] == ["r3", "r2", "r1"]
+    assert [
+        resource.origin.source_id if resource.origin else None for resource in resources
+    ] == ["origin r3", None, "origin r1"]
+    assert [
+        len(resource.relations.relations) if resource.relations else None
+        for resource in resources
+    ] == [None, None, 1]
+
+
+@pytest.mark.asyncio
+async def test_get_many_skips_missing_resources(txn):
+    resources = await get_many(
+        txn, ["missing", "r1", "other", "r3"], origin=True, relations=True
+    )
+    assert [resource.uuid for resource in resources] == ["r1", "r3"]
+    assert resources[0].origin.source_id == "origin r1"
+    assert resources[0].relations.relations[0].resource == "r2"
+    assert resources[1].origin.source_id == "origin r3"
+    assert resources[1].relations is None
+
+
+@pytest.mark.asyncio
+async def test_get_many_dedups_resources(txn):
+    resources = await get_many(
+        txn, ["r3", "r1", "r3", "r1"], origin=True, relations=True
+    )
+    assert [resource.uuid for resource in resources] == ["r3", "r1"]
+    assert resources[0].origin.source_id == "origin r3"
+    assert resources[0].relations is None
+    assert resources[1].origin.source_id == "origin r1"
+    assert resources[1].relations.relations[0].resource == "r2"
@@ -0,0 +1,59 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import pytest
+
+from nucliadb_ingest.cache import clear_ingest_cache
+from nucliadb_ingest.orm import NODES
+from nucliadb_ingest.orm.node import (
+    READ_CONNECTIONS,
+    READER,
+    SIDECAR,
+    WRITER,
+    Node,
+    grpc_channel_options,
+)
+from nucliadb_ingest.settings import settings
+
+
+@pytest.mark.asyncio
+async def test_node_channel_pool_round_robin():
+    clear_ingest_cache()
+    channels = settings.node_grpc_channels
+    settings.node_grpc_channels = 3
+    try:
+        await Node.set("node1", address="node1:4444", label="Node")
+        node = NODES["node1"]
+        stubs = [node.reader for _ in range(4)]
+        pool = READ_CONNECTIONS["node1:4444"]
+        assert len(pool.channels) == 3
+        assert len({id(stub) for stub in stubs[:3]}) == 3
+        assert stubs[3] is stubs[0]
+
+        await Node.destroy("node1")
+        assert "node1:4444" not in READ_CONNECTIONS
+    finally:
+        settings.node_grpc_channels = channels
+        clear_ingest_cache()
+
+
+def test_sidecar_channels_do_not_ping_idle_connections():
+    for kind, permitted in ((READER, 1), (WRITER, 1), (SIDECAR, 0)):
+        options = dict(grpc_channel_options(kind))
+        assert options["grpc.keepalive_permit_without_calls"] == permitted
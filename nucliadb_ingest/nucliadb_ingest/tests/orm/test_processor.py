@@ -17,10 +17,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
+from unittest import mock
+
 import pytest
 from nucliadb_protos.knowledgebox_pb2 import KnowledgeBoxConfig
+from nucliadb_protos.writer_pb2 import BrokerMessage
 
+from nucliadb_ingest.maindb.driver import TXNID
+from nucliadb_ingest.maindb.local import LocalDriver
+from nucliadb_ingest.orm.counters import KB_COUNTERS, Counters, update_kb_counters
 from nucliadb_ingest.orm.exceptions import KnowledgeBoxConflict
+from nucliadb_ingest.orm.knowledgebox import KnowledgeBox
+from nucliadb_ingest.orm.processor import Processor
 from nucliadb_ingest.tests.fixtures import IngestFixture
 
 
@@ -59,3 +68,56 @@ async def test_create_knowledgebox(grpc_servicer: IngestFixture):
     async for key in grpc_servicer.servicer.proc.list_kb(""):
         count += 1
     assert count == 1
+
+
+@pytest.fixture
+async def local_driver(tmpdir):
+    driver = LocalDriver(url=str(tmpdir))
+    await driver.initialize()
+    yield driver
+    await driver.finalize()
+
+
+@pytest.mark.asyncio
+async def test_lanes_seqid_never_moves_back(local_driver):
+    txn = await local_driver.begin()
+    await txn.set(TXNID.format(worker="partition"), b"10")
+    await txn.commit(resource=False)
+
+    processor = Processor(local_driver, None, commit_seqid=lambda seqid: seqid)  # type: ignore
+    await processor.store_seqid("partition", 7)
+    assert await local_driver.last_seqid("partition") == 10
+    await processor.store_seqid("partition", 12)
+    await processor.store_seqid("partition", 11)
+    assert await local_driver.last_seqid("partition") == 12
+
+
+@pytest.mark.asyncio
+async def test_kb_txn_reads_after_the_previous_commit(local_driver):
+    processor = Processor(local_driver, None, commit_seqid=lambda seqid: seqid)  # type: ignore
+
+    async def add_resource():
+        async with processor.kb_txn("kbid") as txn:
+            await asyncio.sleep(0.01)
+            await update_kb_counters(txn, "kbid", "partition", Counters(resources=1))
+
+    await asyncio.gather(*[add_resource() for _ in range(3)])
+
+    txn = await local_driver.begin()
+    payload = await txn.get(KB_COUNTERS.format(kbid="kbid", partition="partition"))
+    await txn.abort()
+    assert Counters.parse(payload) == Counters(resources=3)
+
+
+@pytest.mark.asyncio
+async def test_failed_coalesced_messages_are_not_deadlettered(local_driver):
+    storage = mock.AsyncMock()
+    processor = Processor(local_driver, storage, partition="1")
+    processor.notify = mock.AsyncMock()  # type: ignore
+    processor.apply_resource = mock.AsyncMock(side_effect=ValueError())  # type: ignore
+    messages = [BrokerMessage(kbid="kbid", uuid="rid") for _ in range(2)]
+
+    with mock.patch.object(KnowledgeBox, "exist_kb", return_value=True):
+        with pytest.raises(ValueError):
+            await processor.process_coalesced(messages, [1, 2])
+    storage.deadletter.assert_not_called()
@@ -0,0 +1,79 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+
+import pytest
+
+from nucliadb_ingest.orm.resource import Resource
+from nucliadb_ingest.settings import settings
+
+
+@pytest.mark.asyncio
+async def test_field_operations_keep_order_and_limit(monkeypatch):
+    monkeypatch.setattr(settings, "ingest_storage_concurrency", 2)
+    running = 0
+    max_running = 0
+    calls = []
+
+    def operation(field, kind):
+        async def run():
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            calls.append((field, kind))
+            running -= 1
+            return f"{field}/{kind}"
+
+        return run
+
+    operations = [
+        [
+            (("field_metadata", index), operation(index, "metadata")),
+            (("field_vectors", index), operation(index, "vectors")),
+        ]
+        for index in range(4)
+    ]
+    resource = Resource.__new__(Resource)
+    results = await resource._run_field_operations(operations)
+
+    assert max_running == 2
+    assert results[("field_vectors", 3)] == "3/vectors"
+    for index in range(4):
+        assert calls.index((index, "metadata")) < calls.index((index, "vectors"))
+
+
+@pytest.mark.asyncio
+async def test_field_operations_wait_before_failing():
+    done = []
+
+    async def fail():
+        raise ValueError()
+
+    async def upload():
+        await asyncio.sleep(0.01)
+        done.append(True)
+
+    resource = Resource.__new__(Resource)
+    with pytest.raises(ValueError):
+        await resource._run_field_operations(
+            [[(("field_metadata", 0), fail)], [(("field_metadata", 1), upload)]]
+        )
+    assert done == [True]
@@ -0,0 +1,186 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+from unittest import mock
+
+import pytest
+from nucliadb_protos.writer_pb2 import BrokerMessage
+
+from nucliadb_ingest.consumer.lanes import Lanes, SeqidWatermark
+from nucliadb_ingest.consumer.pull import PullWorker
+from nucliadb_ingest.orm.exceptions import DeadletteredError
+
+
+def test_watermark_only_moves_past_contiguous_seqids():
+    watermark = SeqidWatermark(10)
+    for seqid in (12, 15, 16):
+        watermark.start(seqid)
+
+    assert watermark.committable(15) == 11
+    watermark.finish(15)
+    assert watermark.last == 11
+
+    assert watermark.committable(12) == 15
+    watermark.finish(12)
+    assert watermark.committable(16) == 16
+    watermark.finish(16)
+    assert watermark.last == 16
+    assert watermark.pending == set()
+
+
+def test_watermark_commits_groups_at_once():
+    watermark = SeqidWatermark(10)
+    for seqid in (11, 12, 13, 14):
+        watermark.start(seqid)
+    watermark.group([12, 13])
+    assert watermark.committable(13) == 10
+
+    watermark.finish(11)
+    assert watermark.committable(13) == 13
+    watermark.finish(13)
+    assert watermark.pending == {14}
+
+
+def test_watermark_seeded_with_the_stored_seqid():
+    watermark = SeqidWatermark()
+    watermark.seed(20)
+    # The redelivery of the last stored message is still pending
+    watermark.start(20)
+    watermark.start(21)
+    assert watermark.committable(21) == 20
+    watermark.finish(21)
+    watermark.finish(20)
+    assert watermark.committable(22) == 22
+
+
+@pytest.mark.asyncio
+async def test_lanes_keep_resource_order():
+    processed = []
+    failures = {3: 1}
+
+    async def handler(batch):
+        [(msg, seqid)] = batch
+        if failures.get(seqid):
+            failures[seqid] -= 1
+            raise Exception()
+        await asyncio.sleep(0.01 if seqid == 1 else 0)
+        processed.append((msg.resource, seqid))
+
+    lanes = Lanes(4, handler, SeqidWatermark())
+    lanes.start()
+    for seqid, resource in enumerate(["r1", "r2", "r1", "r1", "r3"], start=1):
+        lanes.put(mock.Mock(resource=resource), seqid, BrokerMessage(uuid=resource))
+    while lanes.messages:
+        await asyncio.sleep(0.01)
+    await lanes.stop()
+
+    assert [seqid for resource, seqid in processed if resource == "r1"] == [1, 3, 4]
+    assert len(processed) == 5
+    assert lanes.watermark.last == 5
+
+
+@pytest.mark.asyncio
+async def test_lanes_route_slug_messages_with_their_uuid():
+    processed = []
+
+    async def handler(batch):
+        [(msg, seqid)] = batch
+        await asyncio.sleep(0.01 if seqid == 1 else 0)
+        processed.append(seqid)
+
+    lanes = Lanes(16, handler, SeqidWatermark())
+    lanes.start()
+    lanes.put(mock.Mock(), 1, BrokerMessage(kbid="kb", uuid="r1"))
+    lanes.put(mock.Mock(), 2, BrokerMessage(kbid="kb", slug="slug1"), "r1")
+    while lanes.messages:
+        await asyncio.sleep(0.01)
+    await lanes.stop()
+    assert processed == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_lanes_coalesce_messages_of_a_resource():
+    batches = []
+
+    async def handler(batch):
+        batches.append([seqid for _, seqid in batch])
+
+    def message(uuid, type=BrokerMessage.MessageType.AUTOCOMMIT):
+        return BrokerMessage(kbid="kb", uuid=uuid, type=type)
+
+    lanes = Lanes(1, handler, SeqidWatermark(), coalesce_window=0.01, coalesce_max=3)
+    for seqid, pb in enumerate(
+        [
+            message("r1"),
+            message("r1"),
+            message("r2"),
+            message("r2"),
+            message("r2"),
+            message("r2"),
+            message("r2", BrokerMessage.MessageType.DELETE),
+        ],
+        start=1,
+    ):
+        lanes.put(mock.Mock(), seqid, pb)
+    lanes.start()
+    while lanes.messages:
+        await asyncio.sleep(0.01)
+    await lanes.stop()
+
+    assert batches == [[1, 2], [3, 4, 5], [6], [7]]
+    assert lanes.watermark.last == 7
+
+
+@pytest.mark.asyncio
+async def test_failed_coalesced_messages_are_retried_one_at_a_time():
+    worker = PullWorker(
+        None,  # type: ignore
+        "1",
+        None,  # type: ignore
+        1,
+        "zone",
+        "",
+        "",
+        None,
+        "target",
+        "group",
+        "stream",
+        False,
+        lanes=2,
+    )
+    processed = []
+
+    async def process(pb, seqid, partition):
+        if seqid == 2:
+            raise DeadletteredError()
+        processed.append(seqid)
+        return True
+
+    worker.processor = mock.Mock(
+        process_coalesced=mock.AsyncMock(side_effect=DeadletteredError()),
+        process=process,
+    )
+    data = BrokerMessage(kbid="kb", uuid="r1").SerializeToString()
+    batch = [(mock.Mock(data=data, ack=mock.AsyncMock()), seqid) for seqid in (1, 2, 3)]
+    await worker.handle_messages(batch)
+
+    assert processed == [1, 3]
+    for msg, _ in batch:
+        msg.ack.assert_awaited_once()
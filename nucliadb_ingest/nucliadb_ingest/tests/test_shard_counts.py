@@ -0,0 +1,94 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from nucliadb_protos.nodewriter_pb2 import Counter
+from nucliadb_protos.writer_pb2 import ShardObject
+
+from nucliadb_ingest.orm import NODES
+from nucliadb_ingest.orm.shard import ShardCounts
+
+
+@pytest.fixture
+def sidecar(monkeypatch):
+    node = MagicMock()
+    node.sidecar.GetCount = AsyncMock(return_value=Counter(resources=10))
+    monkeypatch.setitem(NODES, "node1", node)
+    return node.sidecar
+
+
+def shard_object():
+    shard = ShardObject(shard="shard")
+    replica = shard.replicas.add()
+    replica.node = "node1"
+    replica.shard.id = "replica1"
+    return shard
+
+
+@pytest.mark.asyncio
+async def test_shard_counts_are_cached(sidecar):
+    counts = ShardCounts(10, 60)
+    shard = shard_object()
+
+    assert await counts.get("shard", shard) == 10
+    counts.update("shard", 1)
+    counts.update("shard", 1)
+    counts.update("shard", -1)
+    assert await counts.get("shard", shard) == 11
+    assert sidecar.GetCount.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_shard_counts_reconcile_in_background(sidecar):
+    counts = ShardCounts(10, 0)
+    shard = shard_object()
+
+    assert await counts.get("shard", shard) == 10
+    counts.update("shard", 5)
+    sidecar.GetCount.return_value = Counter(resources=12)
+    assert await counts.get("shard", shard) == 15
+    await asyncio.gather(*counts.tasks.values())
+    assert counts.counts["shard"][0] == 12
+
+
+@pytest.mark.asyncio
+async def test_shard_counts_reconcile_errors_in_background(sidecar):
+    counts = ShardCounts(10, 0)
+    shard = shard_object()
+
+    assert await counts.get("shard", shard) == 10
+    sidecar.GetCount.side_effect = ValueError()
+    assert await counts.get("shard", shard) == 10
+    await asyncio.gather(*counts.tasks.values())
+    assert counts.tasks == {}
+
+    sidecar.GetCount.side_effect = None
+    sidecar.GetCount.return_value = Counter(resources=12)
+    assert await counts.get("shard", shard) == 10
+    await asyncio.gather(*counts.tasks.values())
+    assert counts.counts["shard"][0] == 12
+
+
+@pytest.mark.asyncio
+async def test_shard_counts_without_nodes():
+    counts = ShardCounts(10, 60)
+    assert await counts.get("shard", shard_object()) == -1
@@ -40,6 +40,7 @@ setup(
         "console_scripts": [
             "ndb_ingest = nucliadb_ingest.app:run",
             "ndb_purge = nucliadb_ingest.purge:run",
+            "ndb_repair_counters = nucliadb_ingest.repair_counters:run",
             "ndb_curator = nucliadb_ingest.curator:run",
         ]
     },
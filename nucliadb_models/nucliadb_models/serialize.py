@@ -18,8 +18,9 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import asyncio
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import nucliadb_models as models
 from nucliadb_ingest.fields.base import Field
@@ -27,6 +28,7 @@ from nucliadb_ingest.fields.conversation import Conversation
 from nucliadb_ingest.fields.file import File
 from nucliadb_ingest.fields.link import Link
 from nucliadb_ingest.orm.knowledgebox import KnowledgeBox
+from nucliadb_ingest.orm.resource import Resource as ResourceORM
 from nucliadb_ingest.utils import get_driver
 from nucliadb_models.common import FieldTypeName
 from nucliadb_models.resource import (
@@ -142,13 +144,67 @@ async def serialize(
     driver = await get_driver()
 
     txn = await driver.begin()
-    kb = KnowledgeBox(txn, storage, cache, kbid)
-    orm_resource = await kb.get(rid)
-    if orm_resource is None:
+    try:
+        kb = KnowledgeBox(txn, storage, cache, kbid)
+        orm_resource = await kb.get(rid)
+        if orm_resource is None:
+            return None
+        return await serialize_resource(
+            orm_resource, show, field_type_filter, extracted
+        )
+    finally:
         await txn.abort()
-        return None
 
-    resource = Resource(id=rid)
+
+async def serialize_many(
+    kbid: str,
+    rids: List[str],
+    show: List[ResourceProperties],
+    field_type_filter: List[FieldTypeName],
+    extracted: List[ExtractedDataTypeName],
+    service_name: Optional[str] = None,
+    concurrency: int = 10,
+) -> Dict[str, Resource]:
+    """
+    Serializes many resources of a kb sharing one read transaction, their
+    basic, origin and relations are read at once and the resources built
+    concurrently. Missing resources are not in the result
+    """
+    storage = await get_storage(service_name=service_name)
+    cache = await get_cache()
+    driver = await get_driver()
+
+    txn = await driver.begin()
+    try:
+        kb = KnowledgeBox(txn, storage, cache, kbid)
+        orm_resources = await kb.get_many(
+            rids,
+            origin=ResourceProperties.ORIGIN in show,
+            relations=ResourceProperties.RELATIONS in show,
+        )
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded_serialize(orm_resource: ResourceORM) -> Resource:
+            async with semaphore:
+                return await serialize_resource(
+                    orm_resource, show, field_type_filter, extracted
+                )
+
+        resources = await asyncio.gather(
+            *[bounded_serialize(orm_resource) for orm_resource in orm_resources]
+        )
+        return {resource.id: resource for resource in resources}
+    finally:
+        await txn.abort()
+
+
+async def serialize_resource(
+    orm_resource: ResourceORM,
+    show: List[ResourceProperties],
+    field_type_filter: List[FieldTypeName],
+    extracted: List[ExtractedDataTypeName],
+) -> Resource:
+    resource = Resource(id=orm_resource.uuid)
 
     include_values = ResourceProperties.VALUES in show
 
@@ -355,5 +411,4 @@ async def serialize(
                         field_type_name,
                         extracted,
                     )
-    await txn.abort()
     return resource
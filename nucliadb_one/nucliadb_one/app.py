@@ -36,6 +36,7 @@ from nucliadb_reader.sentry import set_sentry
 from nucliadb_search.api.v1.router import api as api_search_v1
 from nucliadb_search.utilities import get_counter
 from nucliadb_utils.authentication import STFAuthenticationBackend
+from nucliadb_utils.fastapi.responses import ORJSONResponse
 from nucliadb_utils.fastapi.versioning import VersionedFastAPI
 from nucliadb_utils.settings import http_settings, running_settings
 from nucliadb_writer.api.v1.router import api as api_writer_v1
@@ -73,6 +74,7 @@ fastapi_settings = dict(
     middleware=middleware,
     on_startup=on_startup,
     on_shutdown=on_shutdown,
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -718,4 +718,82 @@ mod tests {
         assert_eq!(result.total, 0);
         Ok(())
     }
+
+    #[tokio::test]
+    async fn test_date_range_search() -> anyhow::Result<()> {
+        let dir = TempDir::new("payload_dir").unwrap();
+        let psc = ParagraphServiceConfiguration {
+            path: dir.path().as_os_str().to_os_string().into_string().unwrap(),
+        };
+        let mut paragraph_writer_service = ParagraphWriterService::start(&psc).await.unwrap();
+        let resource1 = create_resource("shard1".to_string());
+        let _ = paragraph_writer_service.set_resource(&resource1);
+
+        let paragraph_reader_service = ParagraphReaderService::start(&psc).await.unwrap();
+
+        let now = SystemTime::now()
+            .duration_since(SystemTime::UNIX_EPOCH)
+            .unwrap();
+        let old_timestamp = Timestamp {
+            seconds: 0_i64,
+            nanos: 0,
+        };
+        let future_timestamp = Timestamp {
+            seconds: now.as_secs() as i64 + 3600,
+            nanos: 0,
+        };
+        let search = |timestamps: Timestamps| {
+            let search = ParagraphSearchRequest {
+                id: "shard1".to_string(),
+                uuid: "".to_string(),
+                body: "this is the".to_string(),
+                fields: vec![],
+                filter: None,
+                faceted: None,
+                order: None,
+                page_number: 0,
+                result_per_page: 20,
+                timestamps: Some(timestamps),
+                reload: false,
+            };
+            paragraph_reader_service.search(&search).unwrap().total
+        };
+
+        // Within both ranges
+        let timestamps = Timestamps {
+            from_created: Some(old_timestamp.clone()),
+            to_created: Some(future_timestamp.clone()),
+            from_modified: Some(old_timestamp.clone()),
+            to_modified: Some(future_timestamp.clone()),
+        };
+        assert_eq!(search(timestamps), 2);
+
+        // Open ranges
+        let timestamps = Timestamps {
+            from_created: Some(old_timestamp.clone()),
+            ..Timestamps::default()
+        };
+        assert_eq!(search(timestamps), 2);
+        let timestamps = Timestamps {
+            to_modified: Some(future_timestamp.clone()),
+            ..Timestamps::default()
+        };
+        assert_eq!(search(timestamps), 2);
+
+        // Created before the range
+        let timestamps = Timestamps {
+            from_created: Some(future_timestamp),
+            ..Timestamps::default()
+        };
+        assert_eq!(search(timestamps), 0);
+
+        // Modified after the range
+        let timestamps = Timestamps {
+            from_modified: Some(old_timestamp.clone()),
+            to_modified: Some(old_timestamp),
+            ..Timestamps::default()
+        };
+        assert_eq!(search(timestamps), 0);
+        Ok(())
+    }
 }
@@ -17,13 +17,15 @@
 // You should have received a copy of the GNU Affero General Public License
 // along with this program. If not, see <http://www.gnu.org/licenses/>.
 //
-use nucliadb_protos::ParagraphSearchRequest;
+use std::ops::Bound;
+
+use nucliadb_protos::{ParagraphSearchRequest, Timestamps};
 use nucliadb_service_interface::prelude::*;
 use tantivy::query::*;
-use tantivy::schema::{Facet, IndexRecordOption};
+use tantivy::schema::{Facet, Field, IndexRecordOption, Type};
 use tantivy::Term;
 
-use crate::schema::ParagraphSchema;
+use crate::schema::{timestamp_to_datetime_utc, ParagraphSchema};
 
 type QueryP = (Occur, Box<dyn Query>);
 type NewFuzz = fn(Term, u8, bool) -> FuzzyTermQuery;
@@ -97,6 +99,44 @@ fn parse_query(parser: &QueryParser, text: &str, distance: u8) -> Vec<QueryP> {
     }
 }
 
+fn date_bound(field: Field, timestamp: Option<&prost_types::Timestamp>) -> Bound<Term> {
+    match timestamp {
+        Some(timestamp) => {
+            let date = timestamp_to_datetime_utc(timestamp);
+            Bound::Included(Term::from_field_date(field, &date))
+        }
+        None => Bound::Unbounded,
+    }
+}
+
+fn date_range_query(
+    field: Field,
+    from: Option<&prost_types::Timestamp>,
+    to: Option<&prost_types::Timestamp>,
+) -> Option<Box<dyn Query>> {
+    if from.is_none() && to.is_none() {
+        return None;
+    }
+    let (from, to) = (date_bound(field, from), date_bound(field, to));
+    let query = RangeQuery::new_term_bounds(field, Type::Date, &from, &to);
+    Some(Box::new(query))
+}
+
+// Only resources created and modified within the requested ranges match
+fn timestamps_queries(timestamps: &Timestamps, schema: &ParagraphSchema) -> Vec<Box<dyn Query>> {
+    let created = date_range_query(
+        schema.created,
+        timestamps.from_created.as_ref(),
+        timestamps.to_created.as_ref(),
+    );
+    let modified = date_range_query(
+        schema.modified,
+        timestamps.from_modified.as_ref(),
+        timestamps.to_modified.as_ref(),
+    );
+    created.into_iter().chain(modified).collect()
+}
+
 pub fn create_query(
     parser: &QueryParser,
     text: &str,
@@ -149,6 +189,13 @@ pub fn create_query(
             let facet_term_query = TermQuery::new(facet_term, IndexRecordOption::Basic);
             queries.push((Occur::Must, Box::new(facet_term_query)));
         });
+
+    // Add creation and modification date ranges
+    search
+        .timestamps
+        .iter()
+        .flat_map(|timestamps| timestamps_queries(timestamps, schema))
+        .for_each(|query| queries.push((Occur::Must, query)));
     queries
 }
 
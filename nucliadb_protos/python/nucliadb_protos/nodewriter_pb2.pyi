@@ -4,6 +4,7 @@ isort:skip_file
 """
 import builtins
 import google.protobuf.descriptor
+import google.protobuf.internal.containers
 import google.protobuf.internal.enum_type_wrapper
 import google.protobuf.message
 import typing
@@ -87,12 +88,23 @@ class IndexMessage(google.protobuf.message.Message):
     RESOURCE_FIELD_NUMBER: builtins.int
     TYPEMESSAGE_FIELD_NUMBER: builtins.int
     REINDEX_ID_FIELD_NUMBER: builtins.int
+    STORAGE_KEY_FIELD_NUMBER: builtins.int
+    REPLICAS_FIELD_NUMBER: builtins.int
     node: typing.Text
     shard: typing.Text
     txid: builtins.int
     resource: typing.Text
     typemessage: global___IndexMessage.TypeMessage.ValueType
     reindex_id: typing.Text
+    storage_key: typing.Text
+    """Indexing payload shared by all the replicas of the shard, the resource
+    shard id is taken from this message
+    """
+
+    @property
+    def replicas(self) -> google.protobuf.internal.containers.RepeatedScalarFieldContainer[typing.Text]:
+        """Shards of every replica pointing to the payload at storage_key"""
+        pass
     def __init__(self,
         *,
         node: typing.Text = ...,
@@ -101,8 +113,10 @@ class IndexMessage(google.protobuf.message.Message):
         resource: typing.Text = ...,
         typemessage: global___IndexMessage.TypeMessage.ValueType = ...,
         reindex_id: typing.Text = ...,
+        storage_key: typing.Text = ...,
+        replicas: typing.Optional[typing.Iterable[typing.Text]] = ...,
         ) -> None: ...
-    def ClearField(self, field_name: typing_extensions.Literal["node",b"node","reindex_id",b"reindex_id","resource",b"resource","shard",b"shard","txid",b"txid","typemessage",b"typemessage"]) -> None: ...
+    def ClearField(self, field_name: typing_extensions.Literal["node",b"node","reindex_id",b"reindex_id","replicas",b"replicas","resource",b"resource","shard",b"shard","storage_key",b"storage_key","txid",b"txid","typemessage",b"typemessage"]) -> None: ...
 global___IndexMessage = IndexMessage
 
 class Counter(google.protobuf.message.Message):
@@ -35,6 +35,13 @@ pub struct IndexMessage {
     pub typemessage: i32,
     #[prost(string, tag="6")]
     pub reindex_id: ::prost::alloc::string::String,
+    /// Indexing payload shared by all the replicas of the shard, the resource
+    /// shard id is taken from this message
+    #[prost(string, tag="7")]
+    pub storage_key: ::prost::alloc::string::String,
+    /// Shards of every replica pointing to the payload at storage_key
+    #[prost(string, repeated, tag="8")]
+    pub replicas: ::prost::alloc::vec::Vec<::prost::alloc::string::String>,
 }
 /// Nested message and enum types in `IndexMessage`.
 pub mod index_message {
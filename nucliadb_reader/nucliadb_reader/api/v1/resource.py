@@ -55,6 +55,7 @@ from nucliadb_reader.api.models import (
 )
 from nucliadb_reader.api.v1.router import KB_PREFIX, api
 from nucliadb_utils.authentication import requires, requires_one
+from nucliadb_utils.fastapi.responses import ORJSONResponse
 from nucliadb_utils.utilities import get_audit, get_cache, get_storage
 
 
@@ -164,7 +165,7 @@ async def get_resource(
     ),
     x_nucliadb_user: str = Header(""),
     x_forwarded_for: str = Header(""),
-) -> Resource:
+) -> ORJSONResponse:
     audit = get_audit()
     if audit is not None:
         await audit.visited(kbid, rid, x_nucliadb_user, x_forwarded_for)
@@ -174,7 +175,7 @@ async def get_resource(
     )
     if result is None:
         raise HTTPException(status_code=404, detail="Resource does not exist")
-    return result
+    return ORJSONResponse(result)
 
 
 PageShortcuts = Literal["last", "first"]
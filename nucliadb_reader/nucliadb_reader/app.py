@@ -41,6 +41,7 @@ from nucliadb_reader.sentry import set_sentry
 from nucliadb_telemetry.utils import get_telemetry
 from nucliadb_utils.authentication import STFAuthenticationBackend
 from nucliadb_utils.fastapi.instrumentation import instrument_app
+from nucliadb_utils.fastapi.responses import ORJSONResponse
 from nucliadb_utils.fastapi.versioning import VersionedFastAPI
 from nucliadb_utils.settings import http_settings, running_settings
 
@@ -85,6 +86,7 @@ fastapi_settings = dict(
     middleware=middleware,
     on_startup=on_startup,
     on_shutdown=on_shutdown,
+    default_response_class=ORJSONResponse,
     exception_handlers={Exception: global_exception_handler},
 )
 
@@ -0,0 +1,161 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import prometheus_client  # type: ignore
+from fastapi import Header, HTTPException
+
+from nucliadb_search import logger
+from nucliadb_search.api.models import SearchClientType
+from nucliadb_search.settings import settings
+
+ADMISSION_QUEUED = prometheus_client.Gauge(
+    "nucliadb_search_admission_queued",
+    "Searches waiting for a free slot of their knowledge box",
+    labelnames=["client"],
+)
+ADMISSION_ACTIVE = prometheus_client.Gauge(
+    "nucliadb_search_admission_active",
+    "Searches running",
+    labelnames=["client"],
+)
+ADMISSION_REJECTED = prometheus_client.Counter(
+    "nucliadb_search_admission_rejected",
+    "Searches rejected because their knowledge box was overloaded",
+    labelnames=["client", "reason"],
+)
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Limiter:
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+
+
+class AdmissionController:
+    """
+    Bounds the searches running at once for every knowledge box and client
+    type, client types get `concurrency * weight` slots. Searches beyond them
+    wait in a bounded queue, up to `timeout` seconds, or are rejected
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        queue_size: int,
+        timeout: float,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.weights = weights or {}
+        self.limiters: Dict[Tuple[str, str], Limiter] = {}
+
+    def limit(self, client: str) -> int:
+        return max(1, int(self.concurrency * self.weights.get(client, 1.0)))
+
+    async def acquire(self, kbid: str, client: str):
+        key = (kbid, client)
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            limiter = self.limiters[key] = Limiter(self.limit(client))
+
+        if limiter.semaphore.locked() and limiter.waiting >= self.queue_size:
+            ADMISSION_REJECTED.labels(client=client, reason="queue").inc()
+            raise Overloaded("queue")
+
+        limiter.waiting += 1
+        ADMISSION_QUEUED.labels(client=client).inc()
+        try:
+            await asyncio.wait_for(limiter.semaphore.acquire(), self.timeout)
+            limiter.active += 1
+            ADMISSION_ACTIVE.labels(client=client).inc()
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTED.labels(client=client, reason="timeout").inc()
+            raise Overloaded("timeout")
+        finally:
+            limiter.waiting -= 1
+            ADMISSION_QUEUED.labels(client=client).dec()
+            self.cleanup(key, limiter)
+
+    def release(self, kbid: str, client: str):
+        key = (kbid, client)
+        limiter = self.limiters[key]
+        limiter.active -= 1
+        ADMISSION_ACTIVE.labels(client=client).dec()
+        limiter.semaphore.release()
+        self.cleanup(key, limiter)
+
+    def cleanup(self, key: Tuple[str, str], limiter: Limiter):
+        # Limiters only live while they have searches, so idle kbs take no memory
+        if limiter.active == 0 and limiter.waiting == 0:
+            self.limiters.pop(key, None)
+
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> Optional[AdmissionController]:
+    global _admission
+    if settings.search_kb_concurrency <= 0:
+        return None
+    if _admission is None:
+        _admission = AdmissionController(
+            settings.search_kb_concurrency,
+            settings.search_kb_queue_size,
+            settings.search_kb_queue_timeout,
+            settings.search_client_weights,
+        )
+    return _admission
+
+
+async def admit(
+    kbid: str, x_ndb_client: SearchClientType = Header(SearchClientType.API)
+) -> AsyncIterator[None]:
+    """
+    Dependency holding a slot of the knowledge box while the request is served
+    """
+    admission = get_admission()
+    if admission is None:
+        yield
+        return
+
+    try:
+        await admission.acquire(kbid, x_ndb_client.value)
+    except Overloaded as exc:
+        logger.info(f"Search on {kbid} rejected, too many requests ({exc.reason})")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many searches on this knowledge box, retry later",
+            headers={"Retry-After": str(settings.search_retry_after)},
+        )
+    try:
+        yield
+    finally:
+        admission.release(kbid, x_ndb_client.value)
@@ -17,15 +17,18 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type, TypeVar, Union
 
 from google.protobuf.json_format import MessageToDict
 from nucliadb_protos.nodereader_pb2 import OrderBy
 from nucliadb_protos.writer_pb2 import ShardObject as PBShardObject
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from nucliadb_models.common import FieldTypeName
 from nucliadb_models.resource import Resource
+from nucliadb_models.serialize import ExtractedDataTypeName, ResourceProperties
 
 if TYPE_CHECKING:
     SortValue = OrderBy.OrderType.V
@@ -143,6 +146,8 @@ class ResourceSearchResults(BaseModel):
     paragraphs: Optional[Paragraphs] = None
     relations: Optional[Relations] = None
     shards: Optional[List[Tuple[str, str, str]]]
+    nodes: Optional[Dict[str, Dict[str, Any]]]
+    timings: Optional[Dict[str, float]]
 
 
 class KnowledgeboxSearchResults(BaseModel):
@@ -152,11 +157,15 @@ class KnowledgeboxSearchResults(BaseModel):
     fulltext: Optional[Resources] = None
     relations: Optional[Relations] = None
     shards: Optional[List[Tuple[str, str, str]]]
+    nodes: Optional[Dict[str, Dict[str, Any]]]
+    timings: Optional[Dict[str, float]]
 
 
 class KnowledgeboxSuggestResults(BaseModel):
     paragraphs: Optional[Paragraphs] = None
     shards: Optional[List[Tuple[str, str, str]]]
+    nodes: Optional[Dict[str, Dict[str, Any]]]
+    timings: Optional[Dict[str, float]]
 
 
 class KnowledgeboxCounters(BaseModel):
@@ -172,6 +181,45 @@ class SortOption(str, Enum):
     CREATED = "created"
 
 
+class SearchBatchQuery(BaseModel):
+    query: str = Field(..., min_length=3)
+    fields: List[str] = []
+    filters: List[str] = []
+    faceted: List[str] = []
+    sort: SortOption = SortOption.CREATED
+    page_number: int = 0
+    page_size: int = 20
+    max_score: float = 0.73
+    range_creation_start: Optional[datetime] = None
+    range_creation_end: Optional[datetime] = None
+    range_modification_start: Optional[datetime] = None
+    range_modification_end: Optional[datetime] = None
+    features: List[SearchOptions] = [
+        SearchOptions.PARAGRAPH,
+        SearchOptions.DOCUMENT,
+        SearchOptions.VECTOR,
+        SearchOptions.RELATIONS,
+    ]
+    reload: bool = True
+    highlight: bool = False
+    split: bool = False
+    show: List[ResourceProperties] = [ResourceProperties.BASIC]
+    field_type_filter: List[FieldTypeName] = list(FieldTypeName)
+    extracted: List[ExtractedDataTypeName] = list(ExtractedDataTypeName)
+
+
+class KnowledgeboxSearchBatchRequest(BaseModel):
+    queries: List[SearchBatchQuery]
+
+
+class KnowledgeboxSearchBatchResults(BaseModel):
+    results: List[KnowledgeboxSearchResults]
+    # Error of every query that failed, by its position on the batch
+    errors: Optional[Dict[int, str]]
+    shards: Optional[List[Tuple[str, str, str]]]
+    timings: Optional[Dict[str, float]]
+
+
 class KnowledgeBoxCount(BaseModel):
     paragraphs: int
     fields: int
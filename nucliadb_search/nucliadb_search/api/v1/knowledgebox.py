@@ -30,6 +30,7 @@ from nucliadb_protos.writer_pb2 import ShardObject as PBShardObject
 from nucliadb_protos.writer_pb2 import Shards
 from sentry_sdk import capture_exception
 
+from nucliadb_ingest.orm.counters import get_kb_counters
 from nucliadb_ingest.orm.resource import KB_RESOURCE_SLUG_BASE
 from nucliadb_models.resource import NucliaDBRoles
 from nucliadb_search import logger
@@ -101,7 +102,29 @@ async def knowledgebox_counters(
             # In case shards get cached, we don't want it to be retrieved if we are not debugging
             if not debug:
                 cached_counters_obj.pop("shards", None)
-            return KnowledgeboxCounters.parse_obj(cached_counters_obj)
+            if not debug or "shards" in cached_counters_obj:
+                return KnowledgeboxCounters.parse_obj(cached_counters_obj)
+
+    # Counters maintained by ingest, the kbs created before them need to be
+    # repaired first and still go through the nodes and the slug scan. So do
+    # debug requests, to report the shards queried
+    driver = await get_driver()
+    txn = await driver.begin()
+    try:
+        kb_counters = await get_kb_counters(txn, kbid)
+    finally:
+        await txn.abort()
+
+    if kb_counters is not None and not debug:
+        counters = KnowledgeboxCounters(
+            resources=kb_counters.resources,
+            paragraphs=kb_counters.paragraphs,
+            fields=kb_counters.fields,
+            sentences=kb_counters.sentences,
+        )
+        if cache is not None:
+            await cache.set(KB_COUNTER_CACHE.format(kbid=kbid), counters.json())
+        return counters
 
     nodemanager = get_nodes()
 
@@ -173,7 +196,6 @@ async def knowledgebox_counters(
         sentence_count += shard.sentences
 
     # Get counters from maindb
-    driver = await get_driver()
     txn = await driver.begin()
 
     try:
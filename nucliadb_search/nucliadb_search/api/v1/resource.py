@@ -17,20 +17,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-import asyncio
 from datetime import datetime
+from functools import partial
 from typing import List, Optional
 
-from fastapi import Header, HTTPException, Query, Request, Response
+from fastapi import Depends, Header, HTTPException, Query, Request
 from fastapi_versioning import version
-from grpc import StatusCode as GrpcStatusCode
-from grpc.aio import AioRpcError  # type: ignore
-from nucliadb_protos.nodereader_pb2 import ParagraphSearchResponse
-from sentry_sdk import capture_exception
 
 from nucliadb_models.common import FieldTypeName
 from nucliadb_models.resource import NucliaDBRoles
 from nucliadb_models.serialize import ExtractedDataTypeName, ResourceProperties
+from nucliadb_search.admission import admit
 from nucliadb_search.api.models import (
     ResourceSearchResults,
     SearchClientType,
@@ -39,14 +36,21 @@ from nucliadb_search.api.models import (
 )
 from nucliadb_search.search.fetch import abort_transaction
 from nucliadb_search.search.merge import merge_paragraphs_results
+from nucliadb_search.search.metrics import start_timings, watch_phase
 from nucliadb_search.search.query import paragraph_query_to_pb
-from nucliadb_search.search.shards import query_paragraph_shard
+from nucliadb_search.search.shards import (
+    gather_shards,
+    hedged_query,
+    query_paragraph_shard,
+)
 from nucliadb_search.settings import settings
 from nucliadb_search.utilities import get_counter, get_nodes
 from nucliadb_utils.authentication import requires_one
 from nucliadb_utils.exceptions import ShardsNotFound
+from nucliadb_utils.fastapi.responses import ORJSONResponse
 
 from .router import KB_PREFIX, api
+from .search import raise_for_shard_error
 
 
 @api.get(
@@ -54,13 +58,14 @@ from .router import KB_PREFIX, api
     status_code=200,
     description="Search on a Resource",
     tags=["Search"],
+    response_model=ResourceSearchResults,
     response_model_exclude_unset=True,
+    dependencies=[Depends(admit)],
 )
 @requires_one([NucliaDBRoles.READER])
 @version(1)
 async def search(
     request: Request,
-    response: Response,
     kbid: str,
     rid: str,
     query: str,
@@ -89,9 +94,10 @@ async def search(
     extracted: List[ExtractedDataTypeName] = Query(list(ExtractedDataTypeName)),
     x_ndb_client: SearchClientType = Header(SearchClientType.API),
     debug: bool = Query(False),
-) -> ResourceSearchResults:
+) -> ORJSONResponse:
     # We need the nodes/shards that are connected to the KB
     nodemanager = get_nodes()
+    timings = start_timings("resource")
 
     try:
         shard_groups = await nodemanager.get_shards_by_kbid(kbid)
@@ -102,22 +108,23 @@ async def search(
         )
 
     # We need to query all nodes
-    pb_query = await paragraph_query_to_pb(
-        features,
-        rid,
-        query,
-        filters,
-        faceted,
-        sort.value,
-        page_number,
-        page_size,
-        range_creation_start,
-        range_creation_end,
-        range_modification_start,
-        range_modification_end,
-        fields,
-        reload=reload,
-    )
+    with watch_phase("query"):
+        pb_query = await paragraph_query_to_pb(
+            features,
+            rid,
+            query,
+            filters,
+            faceted,
+            sort.value,
+            page_number,
+            page_size,
+            range_creation_start,
+            range_creation_end,
+            range_modification_start,
+            range_modification_end,
+            fields,
+            reload=reload,
+        )
 
     incomplete_results = False
     ops = []
@@ -131,7 +138,16 @@ async def search(
             if shard_id is not None:
                 # At least one node is alive for this shard group
                 # let's add it ot the query list if has a valid value
-                ops.append(query_paragraph_shard(node, shard_id, pb_query))
+                ops.append(
+                    hedged_query(
+                        nodemanager,
+                        shard,
+                        node,
+                        shard_id,
+                        node_id,
+                        partial(query_paragraph_shard, query=pb_query),
+                    )
+                )
                 queried_shards.append((node.label, shard_id, node_id))
 
     if not ops:
@@ -140,51 +156,45 @@ async def search(
             status_code=500, detail=f"No node found for any of this resources shards"
         )
 
-    try:
-        results: Optional[List[ParagraphSearchResponse]] = await asyncio.wait_for(
-            asyncio.gather(*ops, return_exceptions=True),  # type: ignore
-            timeout=settings.search_timeout,  # type: ignore
+    with watch_phase("shards"):
+        results, timed_out = await gather_shards(
+            ops, timeout=settings.search_shard_timeout
         )
-    except asyncio.TimeoutError as exc:
-        capture_exception(exc)
-        await abort_transaction()
-        raise HTTPException(status_code=503, detail=f"Data query took too long")
-    except AioRpcError as exc:
-        if exc.code() is GrpcStatusCode.UNAVAILABLE:
-            raise HTTPException(status_code=503, detail=f"Search backend not available")
-        else:
-            raise exc
+    if timed_out:
+        # Shards missing the deadline are dropped and the results are partial
+        incomplete_results = True
 
-    if results is None:
+    if len(results) == 0:
         await abort_transaction()
-        raise HTTPException(
-            status_code=500, detail=f"Error while executing shard queries"
-        )
+        raise HTTPException(status_code=503, detail=f"Data query took too long")
 
     for result in results:
         if isinstance(result, Exception):
-            capture_exception(result)
             await abort_transaction()
-            raise HTTPException(
-                status_code=500, detail=f"Error while querying shard data"
-            )
+            raise_for_shard_error(result)
 
     # We need to merge
-    search_results = await merge_paragraphs_results(
-        results,
-        count=page_size,
-        page=page_number,
-        kbid=kbid,
-        show=show,
-        field_type_filter=field_type_filter,
-        extracted=extracted,
-        highlight_split=highlight,
-        split=split,
-    )
+    with watch_phase("merge"):
+        search_results = await merge_paragraphs_results(
+            results,  # type: ignore
+            count=page_size,
+            page=page_number,
+            kbid=kbid,
+            show=show,
+            field_type_filter=field_type_filter,
+            extracted=extracted,
+            highlight_split=highlight,
+            split=split,
+        )
     await abort_transaction()
 
     get_counter()[f"{kbid}_-_search_client_{x_ndb_client.value}"] += 1
-    response.status_code = 206 if incomplete_results else 200
     if debug:
         search_results.shards = queried_shards
-    return search_results
+        search_results.timings = timings.phases
+        search_results.nodes = nodemanager.nodes_stats(
+            [node_id for _, _, node_id in queried_shards]
+        )
+    return ORJSONResponse(
+        search_results, status_code=206 if incomplete_results else 200
+    )
@@ -19,23 +19,30 @@
 #
 import asyncio
 from datetime import datetime
+from functools import partial
 from time import time
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
-from fastapi import Header, HTTPException, Query, Request, Response
+from fastapi import Depends, Header, HTTPException, Query, Request
 from fastapi_versioning import version
 from grpc import StatusCode as GrpcStatusCode
 from grpc.aio import AioRpcError  # type: ignore
-from nucliadb_protos.nodereader_pb2 import SearchResponse
+from nucliadb_protos.nodereader_pb2 import SearchRequest, SearchResponse
 from nucliadb_protos.writer_pb2 import ShardObject as PBShardObject
 from sentry_sdk import capture_exception
+from starlette.responses import StreamingResponse
 
+from nucliadb_ingest.orm.node import Node
 from nucliadb_models.common import FieldTypeName
 from nucliadb_models.resource import NucliaDBRoles
 from nucliadb_models.serialize import ExtractedDataTypeName, ResourceProperties
 from nucliadb_search import logger
+from nucliadb_search.admission import admit
 from nucliadb_search.api.models import (
+    KnowledgeboxSearchBatchRequest,
+    KnowledgeboxSearchBatchResults,
     KnowledgeboxSearchResults,
+    SearchBatchQuery,
     SearchClientType,
     SearchOptions,
     SortOption,
@@ -43,28 +50,41 @@ from nucliadb_search.api.models import (
 from nucliadb_search.api.v1.router import KB_PREFIX, api
 from nucliadb_search.search.fetch import abort_transaction  # type: ignore
 from nucliadb_search.search.merge import merge_results
+from nucliadb_search.search.metrics import start_timings, watch_phase
 from nucliadb_search.search.query import global_query_to_pb
-from nucliadb_search.search.shards import query_shard
+from nucliadb_search.search.shards import (
+    gather_shards,
+    hedged_query,
+    limit_concurrency,
+    query_shard,
+)
+from nucliadb_search.search.stream import NDJSON, stream_results
 from nucliadb_search.settings import settings
-from nucliadb_search.utilities import get_counter, get_nodes
+from nucliadb_search.utilities import (
+    get_counter,
+    get_nodes,
+    get_predict,
+    get_search_cache,
+)
 from nucliadb_utils.authentication import requires
 from nucliadb_utils.exceptions import ShardsNotFound
+from nucliadb_utils.fastapi.responses import ORJSONResponse
 from nucliadb_utils.utilities import get_audit
 
 
 @api.get(
     f"/{KB_PREFIX}/{{kbid}}/search",
     status_code=200,
-    description="Search on a knowledge box",
+    description="Search on a knowledge box, streamed as shards answer when accepting application/x-ndjson",
     response_model=KnowledgeboxSearchResults,
     response_model_exclude_unset=True,
     tags=["Search"],
+    dependencies=[Depends(admit)],
 )
 @requires(NucliaDBRoles.READER)
 @version(1)
 async def search_knowledgebox(
     request: Request,
-    response: Response,
     kbid: str,
     query: str = Query(default=..., min_length=3),
     fields: List[str] = Query(default=[]),
@@ -98,9 +118,10 @@ async def search_knowledgebox(
     x_ndb_client: SearchClientType = Header(SearchClientType.API),
     x_nucliadb_user: str = Header(""),
     x_forwarded_for: str = Header(""),
-) -> KnowledgeboxSearchResults:
+) -> Union[ORJSONResponse, StreamingResponse]:
     # We need the nodes/shards that are connected to the KB
     nodemanager = get_nodes()
+    timings = start_timings("search")
     audit = get_audit()
     timeit = time()
 
@@ -119,23 +140,71 @@ async def search_knowledgebox(
             detail="The knowledgebox or its shards configuration is missing",
         )
 
+    stream = NDJSON in request.headers.get("accept", "")
+    search_cache = get_search_cache()
+    cache_key = None
+    if (
+        search_cache is not None
+        and search_cache.enabled(kbid)
+        and not stream
+        and not debug
+    ):
+        cache_key = search_cache.key(
+            kbid,
+            "search",
+            query=query,
+            fields=fields,
+            filters=filters,
+            faceted=faceted,
+            sort=sort,
+            page_number=page_number,
+            page_size=page_size,
+            max_score=max_score,
+            range_creation_start=range_creation_start,
+            range_creation_end=range_creation_end,
+            range_modification_start=range_modification_start,
+            range_modification_end=range_modification_end,
+            features=features,
+            reload=reload,
+            highlight=highlight,
+            split=split,
+            show=show,
+            field_type_filter=field_type_filter,
+            extracted=extracted,
+        )
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            cached_query, cached_results = cached
+            get_counter()[f"{kbid}_-_search_client_{x_ndb_client.value}"] += 1
+            if audit is not None:
+                await audit.search(
+                    kbid,
+                    x_nucliadb_user,
+                    x_forwarded_for,
+                    cached_query,
+                    timeit - time(),
+                    len(cached_results.resources),
+                )
+            return ORJSONResponse(cached_results)
+
     # We need to query all nodes
-    pb_query = await global_query_to_pb(
-        kbid,
-        features,
-        query,
-        filters,
-        faceted,
-        sort.value,
-        page_number,
-        page_size,
-        range_creation_start,
-        range_creation_end,
-        range_modification_start,
-        range_modification_end,
-        fields,
-        reload,
-    )
+    with watch_phase("query"):
+        pb_query = await global_query_to_pb(
+            kbid,
+            features,
+            query,
+            filters,
+            faceted,
+            sort.value,
+            page_number,
+            page_size,
+            range_creation_start,
+            range_creation_end,
+            range_modification_start,
+            range_modification_end,
+            fields,
+            reload,
+        )
 
     incomplete_results = False
     ops = []
@@ -149,7 +218,16 @@ async def search_knowledgebox(
             if shard_id is not None:
                 # At least one node is alive for this shard group
                 # let's add it ot the query list if has a valid value
-                ops.append(query_shard(node, shard_id, pb_query))
+                ops.append(
+                    hedged_query(
+                        nodemanager,
+                        shard,
+                        node,
+                        shard_id,
+                        node_id,
+                        partial(query_shard, query=pb_query),
+                    )
+                )
                 queried_shards.append((node.label, shard_id, node_id))
 
     if not ops:
@@ -160,52 +238,80 @@ async def search_knowledgebox(
             detail=f"No node found for any of this resources shards {kbid}",
         )
 
-    try:
-        results: Optional[List[SearchResponse]] = await asyncio.wait_for(  # type: ignore
-            asyncio.gather(*ops, return_exceptions=True),  # type: ignore
-            timeout=settings.search_timeout,
+    if stream:
+        get_counter()[f"{kbid}_-_search_client_{x_ndb_client.value}"] += 1
+
+        async def finish(resources: int):
+            if audit is not None:
+                await audit.search(
+                    kbid,
+                    x_nucliadb_user,
+                    x_forwarded_for,
+                    pb_query,
+                    timeit - time(),
+                    resources,
+                )
+
+        return StreamingResponse(
+            stream_results(
+                ops,
+                [shard_id for _, shard_id, _ in queried_shards],
+                timeout=settings.search_shard_timeout,
+                merge=partial(
+                    merge_results,
+                    count=page_size,
+                    page=page_number,
+                    kbid=kbid,
+                    show=show,
+                    field_type_filter=field_type_filter,
+                    extracted=extracted,
+                    max_score=max_score,
+                    highlight=highlight,
+                    split=split,
+                ),
+                debug=debug,
+                finish=finish,
+            ),
+            media_type=NDJSON,
         )
-    except asyncio.TimeoutError as exc:
-        capture_exception(exc)
-        await abort_transaction()
-        raise HTTPException(status_code=503, detail=f"Data query took too long")
-    except AioRpcError as exc:
-        if exc.code() is GrpcStatusCode.UNAVAILABLE:
-            raise HTTPException(status_code=503, detail=f"Search backend not available")
-        else:
-            raise exc
 
-    if results is None:
-        await abort_transaction()
-        raise HTTPException(
-            status_code=500, detail=f"Error while executing shard queries"
+    with watch_phase("shards"):
+        results, timed_out = await gather_shards(
+            ops, timeout=settings.search_shard_timeout
         )
+    if timed_out:
+        # Shards missing the deadline are dropped and the results are partial
+        incomplete_results = True
+
+    if len(results) == 0:
+        await abort_transaction()
+        raise HTTPException(status_code=503, detail=f"Data query took too long")
 
     for result in results:
         if isinstance(result, Exception):
-            capture_exception(result)
             await abort_transaction()
-            raise HTTPException(
-                status_code=500, detail=f"Error while querying shard data"
-            )
+            raise_for_shard_error(result)
 
     # We need to merge
-    search_results = await merge_results(
-        results,
-        count=page_size,
-        page=page_number,
-        kbid=kbid,
-        show=show,
-        field_type_filter=field_type_filter,
-        extracted=extracted,
-        max_score=max_score,
-        highlight=highlight,
-        split=split,
-    )
+    with watch_phase("merge"):
+        search_results = await merge_results(
+            results,  # type: ignore
+            count=page_size,
+            page=page_number,
+            kbid=kbid,
+            show=show,
+            field_type_filter=field_type_filter,
+            extracted=extracted,
+            max_score=max_score,
+            highlight=highlight,
+            split=split,
+        )
     await abort_transaction()
+    if search_cache is not None and cache_key is not None and not incomplete_results:
+        # The node query is kept to audit the searches served from the cache
+        search_cache.set(cache_key, (pb_query, search_results))
 
     get_counter()[f"{kbid}_-_search_client_{x_ndb_client.value}"] += 1
-    response.status_code = 206 if incomplete_results else 200
     if audit is not None:
         await audit.search(
             kbid,
@@ -217,4 +323,209 @@ async def search_knowledgebox(
         )
     if debug:
         search_results.shards = queried_shards
-    return search_results
+        search_results.timings = timings.phases
+        search_results.nodes = nodemanager.nodes_stats(
+            [node_id for _, _, node_id in queried_shards]
+        )
+    return ORJSONResponse(
+        search_results, status_code=206 if incomplete_results else 200
+    )
+
+
+def raise_for_shard_error(error: Exception):
+    capture_exception(error)
+    if isinstance(error, AioRpcError) and error.code() is GrpcStatusCode.UNAVAILABLE:
+        raise HTTPException(status_code=503, detail=f"Search backend not available")
+    raise HTTPException(status_code=500, detail=f"Error while querying shard data")
+
+
+@api.post(
+    f"/{KB_PREFIX}/{{kbid}}/search/batch",
+    status_code=200,
+    description="Run many searches on a knowledge box, results are in the order of the queries",
+    response_model=KnowledgeboxSearchBatchResults,
+    response_model_exclude_unset=True,
+    tags=["Search"],
+    dependencies=[Depends(admit)],
+)
+@requires(NucliaDBRoles.READER)
+@version(1)
+async def search_knowledgebox_batch(
+    request: Request,
+    kbid: str,
+    item: KnowledgeboxSearchBatchRequest,
+    debug: bool = Query(default=False),
+    x_ndb_client: SearchClientType = Header(SearchClientType.API),
+    x_nucliadb_user: str = Header(""),
+    x_forwarded_for: str = Header(""),
+) -> ORJSONResponse:
+    nodemanager = get_nodes()
+    audit = get_audit()
+    timeit = time()
+    timings = start_timings("batch")
+
+    if len(item.queries) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Batches are limited to {settings.search_batch_max_queries} queries",
+        )
+
+    try:
+        shard_groups: List[PBShardObject] = await nodemanager.get_shards_by_kbid(kbid)
+    except ShardsNotFound:
+        raise HTTPException(
+            status_code=404,
+            detail="The knowledgebox or its shards configuration is missing",
+        )
+
+    # All the queries go to the same replica of every shard, with a bounded
+    # number of them in flight on each node
+    incomplete_results = False
+    replicas: List[Tuple[PBShardObject, Node, str, str]] = []
+    semaphores: Dict[str, asyncio.Semaphore] = {}
+    for shard in shard_groups:
+        try:
+            node, shard_id, node_id = nodemanager.choose_node(shard)
+        except KeyError:
+            incomplete_results = True
+        else:
+            if shard_id is not None:
+                replicas.append((shard, node, shard_id, node_id))
+
+    if not replicas:
+        logger.info(f"No node found for any of this resources shards {kbid}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"No node found for any of this resources shards {kbid}",
+        )
+
+    # Embeddings of all the queries are asked together
+    sentences = [
+        query.query for query in item.queries if SearchOptions.VECTOR in query.features
+    ]
+    vectors: List[List[float]] = []
+    if len(sentences) > 0:
+        with watch_phase("predict"):
+            vectors = await get_predict().convert_sentences_to_vectors(kbid, sentences)
+    query_vectors = iter(vectors)
+
+    searches = await asyncio.gather(
+        *[
+            search_batch_query(
+                kbid,
+                query,
+                next(query_vectors) if SearchOptions.VECTOR in query.features else None,
+                replicas,
+                semaphores,
+            )
+            for query in item.queries
+        ]
+    )
+
+    batch_results = KnowledgeboxSearchBatchResults(results=[])
+    for index, (pb_query, search_results, timed_out, error) in enumerate(searches):
+        incomplete_results = incomplete_results or timed_out
+        batch_results.results.append(search_results)
+        if error is not None:
+            # A failed query gets empty results, the others are kept
+            incomplete_results = True
+            if batch_results.errors is None:
+                batch_results.errors = {}
+            batch_results.errors[index] = error
+        if audit is not None and pb_query is not None:
+            await audit.search(
+                kbid,
+                x_nucliadb_user,
+                x_forwarded_for,
+                pb_query,
+                timeit - time(),
+                len(search_results.resources),
+            )
+
+    get_counter()[f"{kbid}_-_search_client_{x_ndb_client.value}"] += len(item.queries)
+    if debug:
+        batch_results.shards = [
+            (node.label, shard_id, node_id) for _, node, shard_id, node_id in replicas
+        ]
+        batch_results.timings = timings.phases
+    return ORJSONResponse(batch_results, status_code=206 if incomplete_results else 200)
+
+
+async def search_batch_query(
+    kbid: str,
+    query: SearchBatchQuery,
+    vector: Optional[List[float]],
+    replicas: List[Tuple[PBShardObject, Node, str, str]],
+    semaphores: Dict[str, asyncio.Semaphore],
+) -> Tuple[Optional[SearchRequest], KnowledgeboxSearchResults, bool, Optional[str]]:
+    # Every query runs on its own task, so it has its own hydration state
+    nodemanager = get_nodes()
+    pb_query: Optional[SearchRequest] = None
+    try:
+        with watch_phase("query"):
+            pb_query = await global_query_to_pb(
+                kbid,
+                query.features,
+                query.query,
+                query.filters,
+                query.faceted,
+                query.sort.value,
+                query.page_number,
+                query.page_size,
+                query.range_creation_start,
+                query.range_creation_end,
+                query.range_modification_start,
+                query.range_modification_end,
+                fields=query.fields,
+                reload=query.reload,
+                vector=vector,
+            )
+
+        async def query_node(node: Node, shard_id: str) -> SearchResponse:
+            # Hedged queries take a slot on the node they are sent to, and the
+            # ones waiting for a slot are not timed out
+            if node.address not in semaphores:
+                semaphores[node.address] = asyncio.Semaphore(
+                    settings.search_batch_node_concurrency
+                )
+            return await limit_concurrency(
+                semaphores[node.address],
+                query_shard(node, shard_id, query=pb_query),  # type: ignore
+                timeout=settings.search_shard_timeout,
+            )
+
+        ops = [
+            hedged_query(nodemanager, shard, node, shard_id, node_id, query_node)
+            for shard, node, shard_id, node_id in replicas
+        ]
+        with watch_phase("shards"):
+            answers, _ = await gather_shards(ops, timeout=None)
+        results = [
+            answer for answer in answers if not isinstance(answer, asyncio.TimeoutError)
+        ]
+        timed_out = len(results) < len(answers)
+        if len(results) == 0:
+            raise HTTPException(status_code=503, detail=f"Data query took too long")
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise_for_shard_error(result)
+
+        with watch_phase("merge"):
+            search_results = await merge_results(
+                results,  # type: ignore
+                count=query.page_size,
+                page=query.page_number,
+                kbid=kbid,
+                show=query.show,
+                field_type_filter=query.field_type_filter,
+                extracted=query.extracted,
+                max_score=query.max_score,
+                highlight=query.highlight,
+                split=query.split,
+            )
+        return pb_query, search_results, timed_out, None
+    except HTTPException as exc:
+        return pb_query, KnowledgeboxSearchResults(), False, exc.detail
+    finally:
+        await abort_transaction()
@@ -17,36 +17,36 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-import asyncio
 from datetime import datetime
+from functools import partial
 from typing import List, Optional
 
-from fastapi import Header, HTTPException, Query, Request, Response
+from fastapi import Depends, Header, HTTPException, Query, Request
 from fastapi_versioning import version
-from grpc import StatusCode as GrpcStatusCode
-from grpc.aio import AioRpcError  # type: ignore
-from nucliadb_protos.nodereader_pb2 import SuggestResponse
 from nucliadb_protos.writer_pb2 import ShardObject
-from sentry_sdk import capture_exception
 
 from nucliadb_models.common import FieldTypeName
 from nucliadb_models.resource import NucliaDBRoles
 from nucliadb_models.serialize import ResourceProperties
 from nucliadb_search import logger
+from nucliadb_search.admission import admit
 from nucliadb_search.api.models import (
     KnowledgeboxSuggestResults,
     SearchClientType,
     SuggestOptions,
 )
 from nucliadb_search.api.v1.router import KB_PREFIX, api
+from nucliadb_search.api.v1.search import raise_for_shard_error
 from nucliadb_search.search.fetch import abort_transaction  # type: ignore
 from nucliadb_search.search.merge import merge_suggest_results
+from nucliadb_search.search.metrics import start_timings, watch_phase
 from nucliadb_search.search.query import suggest_query_to_pb
-from nucliadb_search.search.shards import suggest_shard
+from nucliadb_search.search.shards import gather_shards, hedged_query, suggest_shard
 from nucliadb_search.settings import settings
-from nucliadb_search.utilities import get_counter, get_nodes
+from nucliadb_search.utilities import get_counter, get_nodes, get_search_cache
 from nucliadb_utils.authentication import requires
 from nucliadb_utils.exceptions import ShardsNotFound
+from nucliadb_utils.fastapi.responses import ORJSONResponse
 
 
 @api.get(
@@ -56,12 +56,12 @@ from nucliadb_utils.exceptions import ShardsNotFound
     response_model=KnowledgeboxSuggestResults,
     response_model_exclude_unset=True,
     tags=["Search"],
+    dependencies=[Depends(admit)],
 )
 @requires(NucliaDBRoles.READER)
 @version(1)
 async def suggest_knowledgebox(
     request: Request,
-    response: Response,
     kbid: str,
     query: str,
     fields: List[str] = [],
@@ -86,9 +86,10 @@ async def suggest_knowledgebox(
     debug: bool = Query(False),
     highlight: bool = Query(False),
     split: bool = Query(False),
-) -> KnowledgeboxSuggestResults:
+) -> ORJSONResponse:
     # We need the nodes/shards that are connected to the KB
     nodemanager = get_nodes()
+    timings = start_timings("suggest")
 
     try:
         shard_groups: List[ShardObject] = await nodemanager.get_shards_by_kbid(kbid)
@@ -98,18 +99,44 @@ async def suggest_knowledgebox(
             detail="The knowledgebox or its shards configuration is missing",
         )
 
+    search_cache = get_search_cache()
+    cache_key = None
+    if search_cache is not None and search_cache.enabled(kbid) and not debug:
+        cache_key = search_cache.key(
+            kbid,
+            "suggest",
+            query=query,
+            fields=fields,
+            filters=filters,
+            faceted=faceted,
+            range_creation_start=range_creation_start,
+            range_creation_end=range_creation_end,
+            range_modification_start=range_modification_start,
+            range_modification_end=range_modification_end,
+            features=features,
+            show=show,
+            field_type_filter=field_type_filter,
+            highlight=highlight,
+            split=split,
+        )
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            get_counter()[f"{kbid}_-_suggest_client_{x_ndb_client.value}"] += 1
+            return ORJSONResponse(cached)
+
     # We need to query all nodes
-    pb_query = await suggest_query_to_pb(
-        features,
-        query,
-        filters,
-        faceted,
-        range_creation_start,
-        range_creation_end,
-        range_modification_start,
-        range_modification_end,
-        fields,
-    )
+    with watch_phase("query"):
+        pb_query = await suggest_query_to_pb(
+            features,
+            query,
+            filters,
+            faceted,
+            range_creation_start,
+            range_creation_end,
+            range_modification_start,
+            range_modification_end,
+            fields,
+        )
 
     incomplete_results = False
     ops = []
@@ -123,7 +150,16 @@ async def suggest_knowledgebox(
             if shard_id is not None:
                 # At least one node is alive for this shard group
                 # let's add it ot the query list if has a valid value
-                ops.append(suggest_shard(node, shard_id, pb_query))
+                ops.append(
+                    hedged_query(
+                        nodemanager,
+                        shard,
+                        node,
+                        shard_id,
+                        node_id,
+                        partial(suggest_shard, query=pb_query),
+                    )
+                )
                 queried_shards.append((node.label, shard_id, node_id))
 
     if not ops:
@@ -134,48 +170,44 @@ async def suggest_knowledgebox(
             detail=f"No node found for any of this resources shards {kbid}",
         )
 
-    try:
-        results: Optional[List[SuggestResponse]] = await asyncio.wait_for(  # type: ignore
-            asyncio.gather(*ops, return_exceptions=True),  # type: ignore
-            timeout=settings.search_timeout,
+    with watch_phase("shards"):
+        results, timed_out = await gather_shards(
+            ops, timeout=settings.search_shard_timeout
         )
-    except asyncio.TimeoutError as exc:
-        capture_exception(exc)
-        await abort_transaction()
-        raise HTTPException(status_code=503, detail=f"Data query took too long")
-    except AioRpcError as exc:
-        if exc.code() is GrpcStatusCode.UNAVAILABLE:
-            raise HTTPException(status_code=503, detail=f"Search backend not available")
-        else:
-            raise exc
+    if timed_out:
+        # Shards missing the deadline are dropped and the results are partial
+        incomplete_results = True
 
-    if results is None:
+    if len(results) == 0:
         await abort_transaction()
-        raise HTTPException(
-            status_code=500, detail=f"Error while executing shard queries"
-        )
+        raise HTTPException(status_code=503, detail=f"Data query took too long")
 
     for result in results:
         if isinstance(result, Exception):
-            capture_exception(result)
             await abort_transaction()
-            raise HTTPException(
-                status_code=500, detail=f"Error while querying shard data"
-            )
+            raise_for_shard_error(result)
 
     # We need to merge
-    search_results = await merge_suggest_results(
-        results,
-        kbid=kbid,
-        show=show,
-        field_type_filter=field_type_filter,
-        highlight_split=highlight,
-        split=split,
-    )
+    with watch_phase("merge"):
+        search_results = await merge_suggest_results(
+            results,  # type: ignore
+            kbid=kbid,
+            show=show,
+            field_type_filter=field_type_filter,
+            highlight_split=highlight,
+            split=split,
+        )
     await abort_transaction()
+    if search_cache is not None and cache_key is not None and not incomplete_results:
+        search_cache.set(cache_key, search_results)
 
     get_counter()[f"{kbid}_-_suggest_client_{x_ndb_client.value}"] += 1
-    response.status_code = 206 if incomplete_results else 200
     if debug:
         search_results.shards = queried_shards
-    return search_results
+        search_results.timings = timings.phases
+        search_results.nodes = nodemanager.nodes_stats(
+            [node_id for _, _, node_id in queried_shards]
+        )
+    return ORJSONResponse(
+        search_results, status_code=206 if incomplete_results else 200
+    )
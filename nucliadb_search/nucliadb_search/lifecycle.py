@@ -27,6 +27,9 @@ from nucliadb_search import SERVICE_NAME, logger
 from nucliadb_search.chitchat import start_chitchat
 from nucliadb_search.nodes import NodesManager
 from nucliadb_search.predict import PredictEngine
+from nucliadb_search.search.cache import SearchResultsCache
+from nucliadb_search.settings import settings
+from nucliadb_search.utilities import get_search_cache
 from nucliadb_telemetry.utils import clean_telemetry, get_telemetry, init_telemetry
 from nucliadb_utils.settings import nuclia_settings, running_settings
 from nucliadb_utils.utilities import (
@@ -34,6 +37,7 @@ from nucliadb_utils.utilities import (
     clean_utility,
     finalize_utilities,
     get_cache,
+    get_pubsub,
     get_utility,
     set_utility,
     start_audit_utility,
@@ -55,12 +59,25 @@ async def initialize() -> None:
         nuclia_settings.nuclia_zone,
         nuclia_settings.onprem,
         nuclia_settings.dummy_processing,
+        cache_size=settings.search_predict_cache_size,
+        cache_ttl=settings.search_predict_cache_ttl,
+        batch_size=settings.search_predict_batch_size,
+        batch_wait=settings.search_predict_batch_wait,
     )
     await predict_util.initialize()
     set_utility(Utility.PREDICT, predict_util)
     driver = await get_driver()
     cache = await get_cache()
     set_utility(Utility.NODES, NodesManager(driver=driver, cache=cache))
+    if len(settings.search_cache_kbids) > 0:
+        search_cache = SearchResultsCache(
+            await get_pubsub(),
+            settings.search_cache_kbids,
+            size=settings.search_cache_size,
+            ttl=settings.search_cache_ttl,
+        )
+        await search_cache.initialize()
+        set_utility(Utility.SEARCH_CACHE, search_cache)
 
     existing_chitchat_utility = get_utility(Utility.CHITCHAT)
     if existing_chitchat_utility is None:
@@ -91,6 +108,10 @@ async def finalize() -> None:
         clean_utility(Utility.NODES)
     if get_utility(Utility.COUNTER):
         clean_utility(Utility.COUNTER)
+    search_cache = get_search_cache()
+    if search_cache is not None:
+        await search_cache.finalize()
+        clean_utility(Utility.SEARCH_CACHE)
     if get_utility(Utility.CHITCHAT):
         util = get_chitchat()
         await util.close()
@@ -17,8 +17,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
 import random
-from typing import List, Optional, Tuple
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
 
 from nucliadb_protos.writer_pb2 import ShardObject
 from nucliadb_protos.writer_pb2 import Shards as PBShards
@@ -26,16 +29,124 @@ from nucliadb_protos.writer_pb2 import Shards as PBShards
 from nucliadb_ingest.maindb.driver import Driver
 from nucliadb_ingest.orm import NODE_CLUSTER, NODES
 from nucliadb_ingest.orm.node import Node
+from nucliadb_search.settings import settings
+from nucliadb_utils.cache import KB_SHARDS_CACHE
+from nucliadb_utils.cache.utility import Cache
 from nucliadb_utils.exceptions import ShardsNotFound
 from nucliadb_utils.keys import KB_SHARDS
 
+# Weight of the last observed latency on the moving average
+LATENCY_DECAY = 0.3
+# After this many seconds without answers the latency of a node is forgotten,
+# so a node penalized once gets probed again instead of starving
+LATENCY_STALE_AFTER = 10.0
+# Recent node latencies, used to compute the hedging delay
+LATENCY_WINDOW: deque = deque(maxlen=1000)
+LATENCY_WINDOW_MIN_SAMPLES = 20
+
+
+class NodeStats:
+    """
+    Client side view of how loaded a node is: an exponentially weighted
+    moving average of the request latency and the requests in flight.
+    """
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_seen = 0.0
+
+    def observe(self, elapsed: float, failed: bool = False):
+        if failed:
+            # A failing node answers fast, do not make it look attractive
+            self.errors += 1
+            elapsed = max(elapsed, settings.search_timeout)
+        else:
+            LATENCY_WINDOW.append(elapsed)
+        self.requests += 1
+        if self.latency is None or self.stale():
+            self.latency = elapsed
+        else:
+            self.latency = LATENCY_DECAY * elapsed + (1 - LATENCY_DECAY) * self.latency
+        self.last_seen = time.monotonic()
+
+    def stale(self) -> bool:
+        return time.monotonic() - self.last_seen > LATENCY_STALE_AFTER
+
+    def cost(self) -> float:
+        if self.latency is None or self.stale():
+            # Unknown nodes are the cheapest ones so they get explored
+            return 0.0
+        return self.latency * (self.inflight + 1)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+NODE_STATS: Dict[str, NodeStats] = {}
+
+
+def latency_percentile(percentile: float) -> Optional[float]:
+    if len(LATENCY_WINDOW) < LATENCY_WINDOW_MIN_SAMPLES:
+        return None
+    latencies = sorted(LATENCY_WINDOW)
+    index = round(percentile / 100 * (len(latencies) - 1))
+    return latencies[min(max(index, 0), len(latencies) - 1)]
+
+
+def get_node_stats(address: str) -> NodeStats:
+    stats = NODE_STATS.get(address)
+    if stats is None:
+        stats = NODE_STATS[address] = NodeStats()
+    return stats
+
+
+class track_node:
+    """
+    Accounts a request to a node on its stats, use around every node call
+    """
+
+    start: float
+
+    def __init__(self, node: Node):
+        self.stats = get_node_stats(node.address)
+
+    def __enter__(self):
+        self.stats.inflight += 1
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stats.inflight -= 1
+        self.stats.observe(
+            time.monotonic() - self.start,
+            failed=exc_value is not None
+            and not isinstance(exc_value, asyncio.CancelledError),
+        )
+
 
 class NodesManager:
-    def __init__(self, driver: Driver, cache):
+    def __init__(self, driver: Driver, cache: Optional[Cache]):
         self.driver = driver
         self.cache = cache
 
     async def get_shards_by_kbid_inner(self, kbid: str) -> PBShards:
+        # Shards are only appended by ingest, which invalidates this cache key
+        # once the new shard is commited, and removed when the kb is purged.
+        # The ttl bounds the staleness of a read racing with an invalidation
+        cache_key = KB_SHARDS_CACHE.format(kbid=kbid)
+        if self.cache is not None:
+            cached = await self.cache.get(cache_key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
         key = KB_SHARDS.format(kbid=kbid)
         txn = await self.driver.begin()
         payload = await txn.get(key)
@@ -47,31 +158,54 @@ class NodesManager:
 
         pb = PBShards()
         pb.ParseFromString(payload)
+        if self.cache is not None:
+            expires = time.monotonic() + settings.search_shards_cache_ttl
+            await self.cache.set(cache_key, (expires, pb))
         return pb
 
     async def get_shards_by_kbid(self, kbid: str) -> List[ShardObject]:
         shards = await self.get_shards_by_kbid_inner(kbid)
         return [x for x in shards.shards]
 
-    def choose_node(self, shard: ShardObject) -> Tuple[Node, Optional[str], str]:
+    def choose_node(
+        self, shard: ShardObject, exclude: Optional[List[str]] = None
+    ) -> Tuple[Node, Optional[str], str]:
         if NODE_CLUSTER.local_node:
+            if exclude:
+                raise KeyError("There is no other node to query")
             return (
                 NODE_CLUSTER.get_local_node(),
                 shard.replicas[0].shard.id,
                 shard.replicas[0].node,
             )
-        nodes = [x for x in range(len(shard.replicas))]
-        random.shuffle(nodes)
-        node_obj = None
-        shard_id = None
-        for node in nodes:
-            node_id = shard.replicas[node].node
-            if node_id in NODES:
-                node_obj = NODES[node_id]
-                shard_id = shard.replicas[node].shard.id
-                break
-
-        if node_obj is None or node_id is None:
+        candidates = [
+            (replica.node, replica.shard.id)
+            for replica in shard.replicas
+            if replica.node in NODES
+            and (exclude is None or replica.node not in exclude)
+        ]
+        if len(candidates) == 0:
             raise KeyError("Could not find a node to query")
 
-        return node_obj, shard_id, node_id
+        # Power of two choices: pick two replicas at random and query the
+        # least loaded one, which avoids herding on a single fast node
+        if len(candidates) > 1:
+            first, second = random.sample(candidates, 2)
+            if self.node_cost(second[0]) < self.node_cost(first[0]):
+                first = second
+        else:
+            first = candidates[0]
+
+        node_id, shard_id = first
+        return NODES[node_id], shard_id, node_id
+
+    def node_cost(self, node_id: str) -> float:
+        return get_node_stats(NODES[node_id].address).cost()
+
+    def nodes_stats(self, node_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for node_id in node_ids:
+            node = NODES.get(node_id)
+            if node is not None:
+                result[node_id] = get_node_stats(node.address).as_dict()
+        return result
@@ -17,12 +17,27 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-from typing import List, Optional
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 import aiohttp
+import prometheus_client  # type: ignore
+from lru import LRU  # type: ignore
 
 from nucliadb_ingest.tests.vectors import Q
 from nucliadb_search import logger
+from nucliadb_utils import metrics
+
+PREDICT_CACHE = prometheus_client.Counter(
+    "nucliadb_search_predict_cache",
+    "Query embeddings served from the cache",
+    labelnames=["result"],
+)
+PREDICT_TIME = prometheus_client.Histogram(
+    "nucliadb_search_predict_time_seconds",
+    "Time to convert a query sentence to a vector on the predict api",
+)
 
 
 class SendToPredictError(Exception):
@@ -32,6 +47,70 @@ class SendToPredictError(Exception):
 PUBLIC_PREDICT = "/api/v1/predict"
 PRIVATE_PREDICT = "/api/internal/predict"
 SENTENCE = "/sentence"
+SENTENCES = "/sentences"
+
+
+class SentenceBatcher:
+    """
+    Groups the sentences of a kb asked within `max_wait` seconds, or up to
+    `max_size` of them, in a single call to the predict api
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str, List[str]], Awaitable[List[List[float]]]],
+        max_size: int,
+        max_wait: float,
+    ):
+        self.fetch = fetch
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self.timers: Dict[str, asyncio.TimerHandle] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def convert(self, kbid: str, sentence: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self.pending.setdefault(kbid, [])
+        batch.append((sentence, future))
+        if len(batch) >= self.max_size:
+            self.flush(kbid)
+        elif len(batch) == 1:
+            self.timers[kbid] = loop.call_later(self.max_wait, self.flush, kbid)
+        return await future
+
+    def flush(self, kbid: str):
+        timer = self.timers.pop(kbid, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(kbid, None)
+        if batch:
+            task = asyncio.ensure_future(self.send(kbid, batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def send(self, kbid: str, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            vectors = await self.fetch(kbid, [sentence for sentence, _ in batch])
+            if len(vectors) != len(batch):
+                raise SendToPredictError(
+                    f"Expected {len(batch)} vectors, got {len(vectors)}"
+                )
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def finalize(self):
+        for kbid in list(self.pending.keys()):
+            self.flush(kbid)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
 
 
 class PredictEngine:
@@ -43,6 +122,10 @@ class PredictEngine:
         zone: Optional[str] = None,
         onprem: bool = False,
         dummy: bool = False,
+        cache_size: int = 1000,
+        cache_ttl: float = 300.0,
+        batch_size: int = 0,
+        batch_wait: float = 0.005,
     ):
         self.nuclia_service_account = nuclia_service_account
         self.cluster_url = cluster_url
@@ -54,14 +137,96 @@ class PredictEngine:
         self.onprem = onprem
         self.dummy = dummy
         self.calls: List[str] = []
+        self.batch_calls: List[List[str]] = []
+        # (kbid, sentence) -> (expiration, vector)
+        self.cache_ttl = cache_ttl
+        self.cache = LRU(cache_size) if cache_size > 0 else None
+        self.inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.batcher: Optional[SentenceBatcher] = None
+        if batch_size > 1:
+            self.batcher = SentenceBatcher(
+                self._fetch_sentences_vectors, batch_size, batch_wait
+            )
 
     async def initialize(self):
         self.session = aiohttp.ClientSession()
 
     async def finalize(self):
+        if self.batcher is not None:
+            await self.batcher.finalize()
         await self.session.close()
 
     async def convert_sentence_to_vector(self, kbid: str, sentence: str) -> List[float]:
+        # Only whitespace is normalized, the model is case sensitive
+        sentence = " ".join(sentence.split())
+        key = (kbid, sentence)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                PREDICT_CACHE.labels(result="hit").inc()
+                return cached[1]
+
+        inflight = self.inflight.get(key)
+        if inflight is not None:
+            # Same query already asked by another search, share its answer
+            PREDICT_CACHE.labels(result="coalesced").inc()
+            return await asyncio.shield(inflight)
+
+        PREDICT_CACHE.labels(result="miss").inc()
+        task = asyncio.ensure_future(self.fetch_sentence_vector(kbid, sentence))
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        vector = await asyncio.shield(task)
+        if self.cache is not None and len(vector) > 0:
+            self.cache[key] = (time.monotonic() + self.cache_ttl, vector)
+        return vector
+
+    async def convert_sentences_to_vectors(
+        self, kbid: str, sentences: List[str]
+    ) -> List[List[float]]:
+        """
+        Converts many sentences with a single call to the predict api for the
+        ones not cached, vectors are returned in the order of the sentences
+        """
+        sentences = [" ".join(sentence.split()) for sentence in sentences]
+        vectors: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        for sentence in sentences:
+            if sentence in vectors or sentence in missing:
+                continue
+            cached = None
+            if self.cache is not None:
+                cached = self.cache.get((kbid, sentence))
+            if cached is not None and cached[0] > time.monotonic():
+                PREDICT_CACHE.labels(result="hit").inc()
+                vectors[sentence] = cached[1]
+            else:
+                PREDICT_CACHE.labels(result="miss").inc()
+                missing.append(sentence)
+
+        if len(missing) > 0:
+            with metrics.watch(histogram=PREDICT_TIME):
+                fetched = await self._fetch_sentences_vectors(kbid, missing)
+            if len(fetched) != len(missing):
+                raise SendToPredictError(
+                    f"Expected {len(missing)} vectors, got {len(fetched)}"
+                )
+            for sentence, vector in zip(missing, fetched):
+                vectors[sentence] = vector
+                if self.cache is not None and len(vector) > 0:
+                    self.cache[(kbid, sentence)] = (
+                        time.monotonic() + self.cache_ttl,
+                        vector,
+                    )
+        return [vectors[sentence] for sentence in sentences]
+
+    async def fetch_sentence_vector(self, kbid: str, sentence: str) -> List[float]:
+        with metrics.watch(histogram=PREDICT_TIME):
+            if self.batcher is not None:
+                return await self.batcher.convert(kbid, sentence)
+            return await self._fetch_sentence_vector(kbid, sentence)
+
+    async def _fetch_sentence_vector(self, kbid: str, sentence: str) -> List[float]:
         # If token is offered
         if self.dummy:
             self.calls.append(sentence)
@@ -94,3 +259,31 @@ class PredictEngine:
             else:
                 raise SendToPredictError(f"{resp.status}: {await resp.read()}")
         return data["data"]
+
+    async def _fetch_sentences_vectors(
+        self, kbid: str, sentences: List[str]
+    ) -> List[List[float]]:
+        if self.dummy:
+            self.calls.extend(sentences)
+            self.batch_calls.append(sentences)
+            return [Q for _ in sentences]
+
+        if self.onprem is False:
+            url = f"{self.cluster_url}{PRIVATE_PREDICT}{SENTENCES}"
+            headers = {"X-STF-KBID": kbid}
+        else:
+            if self.nuclia_service_account is None:
+                logger.warning(
+                    "Nuclia Service account is not defined so could not retrieve vectors for the query"
+                )
+                return [[] for _ in sentences]
+            url = f"{self.public_url}{PUBLIC_PREDICT}{SENTENCES}"
+            headers = {"X-STF-NUAKEY": f"Bearer {self.nuclia_service_account}"}
+        resp = await self.session.post(
+            url=url, json={"texts": sentences}, headers=headers
+        )
+        if resp.status == 200:
+            data = await resp.json()
+        else:
+            raise SendToPredictError(f"{resp.status}: {await resp.read()}")
+        return data["data"]
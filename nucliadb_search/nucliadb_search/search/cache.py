@@ -0,0 +1,137 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import prometheus_client  # type: ignore
+from lru import LRU  # type: ignore
+
+from nucliadb_search import logger
+from nucliadb_utils.cache.pubsub import PubSubDriver
+
+SEARCH_CACHE = prometheus_client.Counter(
+    "nucliadb_search_results_cache",
+    "Search results served from the cache",
+    labelnames=["result"],
+)
+SEARCH_CACHE_INVALIDATIONS = prometheus_client.Counter(
+    "nucliadb_search_results_cache_invalidations",
+    "Search results cache invalidations by ingest notifications",
+)
+
+NOTIFY_CHANNEL = "notify.{kbid}"
+
+CacheKey = Tuple[str, int, str, str]
+
+
+class SearchResultsCache:
+    """
+    Results of identical searches on the knowledge boxes that opted in. Entries
+    of a kb are dropped every time ingest notifies a change on it, by bumping
+    its generation, which is part of the key, so stale entries are never served
+    and age out of the LRU
+    """
+
+    def __init__(
+        self,
+        pubsub: PubSubDriver,
+        kbids: List[str],
+        size: int = 1000,
+        ttl: float = 60.0,
+    ):
+        self.pubsub = pubsub
+        self.kbids = set(kbids)
+        self.ttl = ttl
+        self.entries = LRU(size)
+        self.generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def initialize(self):
+        for kbid in self.kbids:
+            handler = self.make_handler(kbid)
+            await self.pubsub.subscribe(handler, NOTIFY_CHANNEL.format(kbid=kbid))
+
+    async def finalize(self):
+        for kbid in self.kbids:
+            try:
+                await self.pubsub.unsubscribe(NOTIFY_CHANNEL.format(kbid=kbid))
+            except KeyError:
+                pass
+
+    def make_handler(self, kbid: str):
+        # Commits and aborts are both notified; dropping the entries on an abort
+        # too is cheaper than parsing every notification
+        if self.pubsub.async_callback:
+
+            async def async_handler(data):
+                self.invalidate(kbid)
+
+            return async_handler
+
+        def handler(data):
+            self.invalidate(kbid)
+
+        return handler
+
+    def enabled(self, kbid: str) -> bool:
+        return kbid in self.kbids
+
+    def invalidate(self, kbid: str):
+        self.generations[kbid] = self.generations.get(kbid, 0) + 1
+        self.invalidations += 1
+        SEARCH_CACHE_INVALIDATIONS.inc()
+        logger.debug(f"Search results cache invalidated for {kbid}")
+
+    def key(self, kbid: str, endpoint: str, **params: Any) -> CacheKey:
+        # Built from the request parameters so a hit skips building the node
+        # query, and its predict calls, altogether
+        return (
+            kbid,
+            self.generations.get(kbid, 0),
+            endpoint,
+            repr(sorted(params.items())),
+        )
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        cached = self.entries.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.hits += 1
+            SEARCH_CACHE.labels(result="hit").inc()
+            return cached[1]
+        self.misses += 1
+        SEARCH_CACHE.labels(result="miss").inc()
+        return None
+
+    def set(self, key: CacheKey, value: Any):
+        kbid, generation = key[0], key[1]
+        if self.generations.get(kbid, 0) != generation:
+            # The kb changed while the search was running
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
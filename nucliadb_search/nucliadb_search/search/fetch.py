@@ -17,12 +17,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
 import re
 from contextvars import ContextVar
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from nucliadb_protos.nodereader_pb2 import DocumentResult, ParagraphResult
+from nucliadb_protos.resources_pb2 import FieldComputedMetadata
+from nucliadb_protos.utils_pb2 import ExtractedText
 
+from nucliadb_ingest.fields.base import FIELD_METADATA, FIELD_TEXT
 from nucliadb_ingest.maindb.driver import Transaction
 from nucliadb_ingest.orm.knowledgebox import KnowledgeBox as KnowledgeBoxORM
 from nucliadb_ingest.orm.resource import KB_REVERSE
@@ -33,26 +38,44 @@ from nucliadb_models.resource import Resource
 from nucliadb_models.serialize import (
     ExtractedDataTypeName,
     ResourceProperties,
-    serialize,
+    serialize_many,
 )
 from nucliadb_search import SERVICE_NAME, logger
 from nucliadb_search.api.models import EXTRACTED_POSITIONS, POSITIONS
+from nucliadb_search.search.metrics import watch_phase
+from nucliadb_search.settings import settings
+from nucliadb_utils.cache import KB_FIELD_EXTRACTED_CACHE
 from nucliadb_utils.utilities import get_cache, get_storage
 
-rcache: ContextVar[Optional[Dict[str, ResourceORM]]] = ContextVar(
+_T = TypeVar("_T")
+
+# Per request cache of fetches, keyed by (kind, rid, ...). Values are futures so
+# concurrent hydration of the same resource or field waits for a single fetch
+rcache: ContextVar[Optional[Dict[Tuple[str, ...], asyncio.Future]]] = ContextVar(
     "rcache", default=None
 )
+rsemaphore: ContextVar[Optional[asyncio.Semaphore]] = ContextVar(
+    "rsemaphore", default=None
+)
 txn: ContextVar[Optional[Transaction]] = ContextVar("txn", default=None)
 
 
-def get_resource_cache(clear: bool = False) -> Dict[str, ResourceORM]:
-    value: Optional[Dict[str, ResourceORM]] = rcache.get()
+def get_resource_cache(clear: bool = False) -> Dict[Tuple[str, ...], asyncio.Future]:
+    value: Optional[Dict[Tuple[str, ...], asyncio.Future]] = rcache.get()
     if value is None or clear:
         value = {}
         rcache.set(value)
     return value
 
 
+def get_hydration_semaphore() -> asyncio.Semaphore:
+    value: Optional[asyncio.Semaphore] = rsemaphore.get()
+    if value is None:
+        value = asyncio.Semaphore(settings.search_hydration_concurrency)
+        rsemaphore.set(value)
+    return value
+
+
 async def get_transaction() -> Transaction:
     transaction: Optional[Transaction] = txn.get()
     if transaction is None:
@@ -68,6 +91,102 @@ async def abort_transaction():
         await transaction.abort()
 
 
+async def initialize_hydration():
+    # Context variables set from inside a task are not visible to its caller, so
+    # the request state needs to exist before hydration fans out to tasks
+    get_resource_cache(clear=True)
+    get_hydration_semaphore()
+    await get_transaction()
+
+
+def cached_fetch(key: Tuple[str, ...], fetch: Callable[[], Awaitable[_T]]):
+    resource_cache = get_resource_cache()
+    future = resource_cache.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_bounded_fetch(fetch))
+        resource_cache[key] = future
+    return future
+
+
+async def _bounded_fetch(fetch: Callable[[], Awaitable[_T]]) -> _T:
+    async with get_hydration_semaphore():
+        return await fetch()
+
+
+async def get_resource_from_cache(kbid: str, uuid: str) -> Optional[ResourceORM]:
+    async def fetch() -> Optional[ResourceORM]:
+        transaction = await get_transaction()
+        storage = await get_storage(service_name=SERVICE_NAME)
+        cache = await get_cache()
+        kb = KnowledgeBoxORM(transaction, storage, cache, kbid)
+        with watch_phase("hydration_maindb"):
+            return await kb.get(uuid)
+
+    return await cached_fetch(("resource", uuid), fetch)
+
+
+async def get_extracted_text_from_cache(
+    orm_resource: ResourceORM, field_type: str, field: str
+) -> Optional[ExtractedText]:
+    async def fetch() -> Optional[ExtractedText]:
+        field_obj = await orm_resource.get_field(
+            field, KB_REVERSE[field_type], load=False
+        )
+        with watch_phase("hydration_storage"):
+            return await field_obj.get_extracted_text()
+
+    return await cached_fetch(
+        (FIELD_TEXT, orm_resource.uuid, field_type, field),
+        lambda: fetch_shared(orm_resource, field_type, field, FIELD_TEXT, fetch),
+    )
+
+
+async def get_field_metadata_from_cache(
+    orm_resource: ResourceORM, field_type: str, field: str
+) -> Optional[FieldComputedMetadata]:
+    async def fetch() -> Optional[FieldComputedMetadata]:
+        field_obj = await orm_resource.get_field(
+            field, KB_REVERSE[field_type], load=False
+        )
+        with watch_phase("hydration_storage"):
+            return await field_obj.get_field_metadata()
+
+    return await cached_fetch(
+        (FIELD_METADATA, orm_resource.uuid, field_type, field),
+        lambda: fetch_shared(orm_resource, field_type, field, FIELD_METADATA, fetch),
+    )
+
+
+async def fetch_shared(
+    orm_resource: ResourceORM,
+    field_type: str,
+    field: str,
+    kind: str,
+    fetch: Callable[[], Awaitable[Optional[_T]]],
+) -> Optional[_T]:
+    # Extracted payloads are kept on the process memory cache, sized by their
+    # ByteSize, and invalidated by ingest when a new version is stored. A
+    # payload fetched while its key was invalidated is not stored
+    cache = await get_cache()
+    if cache is None:
+        return await fetch()
+
+    key = KB_FIELD_EXTRACTED_CACHE.format(
+        kbid=orm_resource.kb.kbid,
+        rid=orm_resource.uuid,
+        kind=kind,
+        field_type=field_type,
+        field=field,
+    )
+    payload = await cache.get(key)
+    if payload is None:
+        generation = cache.generation(key)
+        payload = await fetch()
+        if payload is not None:
+            await cache.set(key, payload, generation=generation)
+    return payload
+
+
 async def fetch_resources(
     resources: List[str],
     kbid: str,
@@ -75,19 +194,16 @@ async def fetch_resources(
     field_type_filter: List[FieldTypeName],
     extracted: List[ExtractedDataTypeName],
 ) -> Dict[str, Resource]:
-    result = {}
-    for resource in resources:
-        serialization = await serialize(
+    with watch_phase("serialize"):
+        return await serialize_many(
             kbid,
-            resource,
+            resources,
             show,
             field_type_filter=field_type_filter,
             extracted=extracted,
             service_name=SERVICE_NAME,
+            concurrency=settings.search_hydration_concurrency,
         )
-        if serialization is not None:
-            result[resource] = serialization
-    return result
 
 
 async def get_text_sentence(
@@ -100,29 +216,17 @@ async def get_text_sentence(
     end: int,
     split: Optional[str] = None,
 ) -> str:
-    resouce_cache = get_resource_cache()
-    if rid not in resouce_cache:
-        transaction = await get_transaction()
-        storage = await get_storage(service_name=SERVICE_NAME)
-        cache = await get_cache()
-        kb = KnowledgeBoxORM(transaction, storage, cache, kbid)
-        orm_resource: Optional[ResourceORM] = await kb.get(rid)
-        if orm_resource is not None:
-            resouce_cache[rid] = orm_resource
-    else:
-        orm_resource = resouce_cache.get(rid)
+    orm_resource = await get_resource_from_cache(kbid, rid)
 
     if orm_resource is None:
         logger.warn(f"{rid} does not exist on DB")
         return ""
 
-    field_type_int = KB_REVERSE[field_type]
-    field_obj = await orm_resource.get_field(field, field_type_int, load=False)
-    extracted_text = await field_obj.get_extracted_text()
+    extracted_text = await get_extracted_text_from_cache(
+        orm_resource, field_type, field
+    )
     if extracted_text is None:
-        logger.warn(
-            f"{rid} {field} {field_type_int} extracted_text does not exist on DB"
-        )
+        logger.warn(f"{rid} {field} {field_type} extracted_text does not exist on DB")
         return ""
     start = start - 1
     if start < 0:
@@ -145,31 +249,17 @@ async def get_labels_sentence(
     end: int,
     split: Optional[str] = None,
 ) -> List[str]:
-    resouce_cache = get_resource_cache()
-    if rid not in resouce_cache:
-        transaction = await get_transaction()
-        storage = await get_storage(service_name=SERVICE_NAME)
-        cache = await get_cache()
-        kb = KnowledgeBoxORM(transaction, storage, cache, kbid)
-        orm_resource: Optional[ResourceORM] = await kb.get(rid)
-        if orm_resource is not None:
-            resouce_cache[rid] = orm_resource
-    else:
-        orm_resource = resouce_cache.get(rid)
+    orm_resource = await get_resource_from_cache(kbid, rid)
 
     if orm_resource is None:
         logger.warn(f"{rid} does not exist on DB")
         return []
 
-    labels: List[str] = []
-    basic = await orm_resource.get_basic()
-    if basic is not None:
-        for classification in basic.usermetadata.classifications:
-            labels.append(f"{classification.labelset}/{classification.label}")
+    labels = await get_basic_labels(orm_resource)
 
-    field_type_int = KB_REVERSE[field_type]
-    field_obj = await orm_resource.get_field(field, field_type_int, load=False)
-    field_metadata = await field_obj.get_field_metadata()
+    field_metadata = await get_field_metadata_from_cache(
+        orm_resource, field_type, field
+    )
     if field_metadata:
         paragraph = None
         if split not in (None, ""):
@@ -185,6 +275,37 @@ async def get_labels_sentence(
     return labels
 
 
+async def get_paragraph_sentence(
+    rid: str,
+    field_type: str,
+    field: str,
+    kbid: str,
+    start: int,
+    end: int,
+    split: Optional[str] = None,
+) -> Optional[Tuple[int, int]]:
+    orm_resource = await get_resource_from_cache(kbid, rid)
+    if orm_resource is None:
+        return None
+
+    field_metadata = await get_field_metadata_from_cache(
+        orm_resource, field_type, field
+    )
+    if field_metadata is None:
+        return None
+
+    if split:
+        if split not in field_metadata.split_metadata:
+            return None
+        metadata = field_metadata.split_metadata[split]
+    else:
+        metadata = field_metadata.metadata
+    for paragraph in metadata.paragraphs:
+        if paragraph.start <= start and end <= paragraph.end:
+            return paragraph.start, paragraph.end
+    return None
+
+
 async def get_text_resource(
     result: DocumentResult,
     kbid: str,
@@ -199,29 +320,19 @@ async def get_text_resource(
     if split is False:
         return "", {}
 
-    resouce_cache = get_resource_cache()
-    if result.uuid not in resouce_cache:
-        transaction = await get_transaction()
-        storage = await get_storage(service_name=SERVICE_NAME)
-        cache = await get_cache()
-        kb = KnowledgeBoxORM(transaction, storage, cache, kbid)
-        orm_resource: Optional[ResourceORM] = await kb.get(result.uuid)
-        if orm_resource is not None:
-            resouce_cache[result.uuid] = orm_resource
-    else:
-        orm_resource = resouce_cache.get(result.uuid)
+    orm_resource = await get_resource_from_cache(kbid, result.uuid)
 
     if orm_resource is None:
         logger.error(f"{result.uuid} does not exist on DB")
         return "", {}
 
     _, field_type, field = result.field.split("/")
-    field_type_int = KB_REVERSE[field_type]
-    field_obj = await orm_resource.get_field(field, field_type_int, load=False)
-    extracted_text = await field_obj.get_extracted_text()
+    extracted_text = await get_extracted_text_from_cache(
+        orm_resource, field_type, field
+    )
     if extracted_text is None:
         logger.warn(
-            f"{result.uuid} {field} {field_type_int} extracted_text does not exist on DB"
+            f"{result.uuid} {field} {field_type} extracted_text does not exist on DB"
         )
         return "", {}
 
@@ -239,29 +350,19 @@ async def get_text_paragraph(
     highlight_split: bool = False,
     split: bool = False,
 ) -> EXTRACTED_POSITIONS:
-    resouce_cache = get_resource_cache()
-    if result.uuid not in resouce_cache:
-        transaction = await get_transaction()
-        storage = await get_storage(service_name=SERVICE_NAME)
-        cache = await get_cache()
-        kb = KnowledgeBoxORM(transaction, storage, cache, kbid)
-        orm_resource: Optional[ResourceORM] = await kb.get(result.uuid)
-        if orm_resource is not None:
-            resouce_cache[result.uuid] = orm_resource
-    else:
-        orm_resource = resouce_cache.get(result.uuid)
+    orm_resource = await get_resource_from_cache(kbid, result.uuid)
 
     if orm_resource is None:
         logger.error(f"{result.uuid} does not exist on DB")
         return "", {}
 
     _, field_type, field = result.field.split("/")
-    field_type_int = KB_REVERSE[field_type]
-    field_obj = await orm_resource.get_field(field, field_type_int, load=False)
-    extracted_text = await field_obj.get_extracted_text()
+    extracted_text = await get_extracted_text_from_cache(
+        orm_resource, field_type, field
+    )
     if extracted_text is None:
         logger.warn(
-            f"{result.uuid} {field} {field_type_int} extracted_text does not exist on DB"
+            f"{result.uuid} {field} {field_type} extracted_text does not exist on DB"
         )
         return "", {}
 
@@ -280,144 +381,138 @@ async def get_text_paragraph(
     return splitted_text, positions
 
 
-def split_text(text: str, query: str, highlight: bool = False, margin: int = 20):
-    quoted: List[str] = re.findall('"([^"]*)"', query)
-    text_lower = text.lower()
-    cleaned = query
-    positions: POSITIONS = {}
-    for quote in quoted:
-        cleaned = cleaned.replace(f'"{quote}"', "")
-        found = [x.span() for x in re.finditer(quote.lower(), text_lower)]
-        if len(found):
-            positions.setdefault(quote, []).extend(found)
-
-    query_words = "".join([x for x in cleaned if x.isalnum() or x.isspace()]).split()
-    for word in query_words:
-        if len(word) > 2:
-            found = [x.span() for x in re.finditer(word.lower(), text_lower)]
-            if len(found):
-                positions.setdefault(word, []).extend(found)
-
-    new_text = ""
-    ordered = [x for xs in positions.values() for x in xs]
-    ordered.sort()
-    last = 0
-    for order in ordered:
-        if order[0] < last:
-            continue
-        if order[0] - margin > last and last > 0:
-            new_text += text[last : last + margin]
-            new_text += "…"
-            last += margin
-
-        if last > order[0] - margin:
-            new_text += text[last : order[0]]
-        else:
-            new_text += " …"
-            new_text += text[order[0] - margin : order[0]]
-
-        if highlight:
-            new_text += "<mark>"
-        new_text += text[order[0] : order[1]]
-        if highlight:
-            new_text += "</mark>"
-        last = order[1]
-    if len(new_text) > 0:
-        new_text += text[last : min(len(text), last + margin)]
-        new_text += "…"
-
-    return new_text, positions
+class Highlighter:
+    """
+    Finds the terms of a query on texts with a single case insensitive pattern,
+    compiled once per query and shared by all the results of a request
+    """
+
+    def __init__(self, query: str):
+        quoted: List[str] = re.findall('"([^"]*)"', query)
+        terms: List[str] = []
+        cleaned = query
+        for quote in quoted:
+            cleaned = cleaned.replace(f'"{quote}"', "")
+            terms.append(quote)
+
+        query_words = "".join([x for x in cleaned if x.isalnum() or x.isspace()])
+        terms.extend([word for word in query_words.split() if len(word) > 2])
+
+        unique: Dict[str, str] = {}
+        for term in terms:
+            if term != "":
+                unique.setdefault(term.lower(), term)
+        # When several terms match at the same offset the shortest one is used
+        self.terms: List[str] = sorted(unique.values(), key=len)
+        self.pattern: Optional[re.Pattern] = None
+        if len(self.terms):
+            self.pattern = re.compile(
+                "|".join([f"({re.escape(term)})" for term in self.terms]),
+                re.IGNORECASE,
+            )
+
+    def find(self, text: str) -> Tuple[List[Tuple[int, int]], POSITIONS]:
+        spans: List[Tuple[int, int]] = []
+        positions: POSITIONS = {}
+        if self.pattern is None:
+            return spans, positions
+
+        for match in self.pattern.finditer(text):
+            # Every term is a group of the pattern, in the same order as terms
+            term = self.terms[match.lastindex - 1]  # type: ignore
+            span = match.span()
+            spans.append(span)
+            positions.setdefault(term, []).append(span)
+        return spans, positions
+
+    def split(self, text: str, highlight: bool = False, margin: int = 20):
+        spans, positions = self.find(text)
+        parts: List[str] = []
+        last = 0
+        for start, end in spans:
+            if start - margin > last and last > 0:
+                parts.append(text[last : last + margin])
+                parts.append("…")
+                last += margin
+
+            if last > start - margin:
+                parts.append(text[last:start])
+            else:
+                parts.append(" …")
+                parts.append(text[start - margin : start])
+
+            parts.append(mark(text[start:end]) if highlight else text[start:end])
+            last = end
+        if len(parts) > 0:
+            parts.append(text[last : last + margin])
+            parts.append("…")
+
+        return "".join(parts), positions
+
+    def highlight(self, text: str, highlight: bool = False):
+        spans, positions = self.find(text)
+        if not highlight:
+            return text, positions
+
+        parts: List[str] = []
+        last = 0
+        for start, end in spans:
+            parts.append(text[last:start])
+            parts.append(mark(text[start:end]))
+            last = end
+        parts.append(text[last:])
+        return "".join(parts), positions
 
 
-def highlight(text: str, query: str, highlight: bool = False):
-    quoted: List[str] = re.findall('"([^"]*)"', query)
-    text_lower = text.lower()
-    cleaned = query
-    positions: POSITIONS = {}
-    for quote in quoted:
-        cleaned = cleaned.replace(f'"{quote}"', "")
-        found = [x.span() for x in re.finditer(quote.lower(), text_lower)]
-        if len(found):
-            positions.setdefault(quote, []).extend(found)
-
-    query_words = "".join([x for x in cleaned if x.isalnum() or x.isspace()]).split()
-    for word in query_words:
-        if len(word) > 2:
-            found = [x.span() for x in re.finditer(word.lower(), text_lower)]
-            if len(found):
-                positions.setdefault(word, []).extend(found)
-
-    if highlight:
-        new_text = ""
-        ordered = [x for xs in positions.values() for x in xs]
-        ordered.sort()
-        last = 0
-        for order in ordered:
-            if order[0] < last:
-                continue
-            new_text += text[last : order[0]]
-            new_text += "<mark>"
-            new_text += text[order[0] : order[1]]
-            new_text += "</mark>"
-            last = order[1]
-        new_text += text[last:]
-        return new_text, positions
-    return text, positions
+def mark(text: str) -> str:
+    return f"<mark>{text}</mark>"
 
 
-async def get_labels_resource(result: DocumentResult, kbid: str) -> List[str]:
-    resouce_cache = get_resource_cache()
-    if result.uuid not in resouce_cache:
-        transaction = await get_transaction()
-        storage = await get_storage(service_name=SERVICE_NAME)
-        cache = await get_cache()
-        kb = KnowledgeBoxORM(transaction, storage, cache, kbid)
-        orm_resource: Optional[ResourceORM] = await kb.get(result.uuid)
-        if orm_resource is not None:
-            resouce_cache[result.uuid] = orm_resource
-    else:
-        orm_resource = resouce_cache.get(result.uuid)
+@lru_cache(maxsize=128)
+def get_highlighter(query: str) -> Highlighter:
+    return Highlighter(query)
 
-    if orm_resource is None:
-        logger.error(f"{result.uuid} does not exist on DB")
-        return []
 
+def split_text(text: str, query: str, highlight: bool = False, margin: int = 20):
+    return get_highlighter(query).split(text, highlight=highlight, margin=margin)
+
+
+def highlight(text: str, query: str, highlight: bool = False):
+    return get_highlighter(query).highlight(text, highlight=highlight)
+
+
+async def get_basic_labels(orm_resource: ResourceORM) -> List[str]:
     labels: List[str] = []
     basic = await orm_resource.get_basic()
     if basic is not None:
         for classification in basic.usermetadata.classifications:
             labels.append(f"{classification.labelset}/{classification.label}")
-
     return labels
 
 
+async def get_labels_resource(result: DocumentResult, kbid: str) -> List[str]:
+    orm_resource = await get_resource_from_cache(kbid, result.uuid)
+
+    if orm_resource is None:
+        logger.error(f"{result.uuid} does not exist on DB")
+        return []
+
+    return await get_basic_labels(orm_resource)
+
+
 async def get_labels_paragraph(result: ParagraphResult, kbid: str) -> List[str]:
-    resouce_cache = get_resource_cache()
-    if result.uuid not in resouce_cache:
-        transaction = await get_transaction()
-        storage = await get_storage(service_name=SERVICE_NAME)
-        cache = await get_cache()
-        kb = KnowledgeBoxORM(transaction, storage, cache, kbid)
-        orm_resource: Optional[ResourceORM] = await kb.get(result.uuid)
-        if orm_resource is not None:
-            resouce_cache[result.uuid] = orm_resource
-    else:
-        orm_resource = resouce_cache.get(result.uuid)
+    orm_resource = await get_resource_from_cache(kbid, result.uuid)
 
     if orm_resource is None:
         logger.error(f"{result.uuid} does not exist on DB")
         return []
 
-    labels: List[str] = []
-    basic = await orm_resource.get_basic()
-    if basic is not None:
-        for classification in basic.usermetadata.classifications:
-            labels.append(f"{classification.labelset}/{classification.label}")
+    labels = await get_basic_labels(orm_resource)
 
     _, field_type, field = result.field.split("/")
-    field_type_int = KB_REVERSE[field_type]
-    field_obj = await orm_resource.get_field(field, field_type_int, load=False)
-    field_metadata = await field_obj.get_field_metadata()
+    field_metadata = await get_field_metadata_from_cache(
+        orm_resource, field_type, field
+    )
     if field_metadata:
         paragraph = None
         if result.split not in (None, ""):
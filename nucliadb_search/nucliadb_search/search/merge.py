@@ -17,12 +17,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
+import heapq
 import math
-from typing import Any, Dict, List
+from itertools import islice
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
 
-from google.protobuf.json_format import MessageToDict
 from nucliadb_protos.nodereader_pb2 import (
+    DocumentResult,
+    DocumentScored,
     DocumentSearchResponse,
+    FacetResult,
+    FacetResults,
+    ParagraphResult,
     ParagraphSearchResponse,
     SearchResponse,
     SuggestResponse,
@@ -31,6 +38,7 @@ from nucliadb_protos.nodereader_pb2 import (
 
 from nucliadb_models.common import FieldTypeName
 from nucliadb_models.serialize import ExtractedDataTypeName, ResourceProperties
+from nucliadb_search import logger
 from nucliadb_search.api.models import (
     KnowledgeboxSearchResults,
     KnowledgeboxSuggestResults,
@@ -47,11 +55,137 @@ from nucliadb_search.search.fetch import (
     get_labels_paragraph,
     get_labels_resource,
     get_labels_sentence,
-    get_resource_cache,
+    get_paragraph_sentence,
     get_text_paragraph,
     get_text_resource,
     get_text_sentence,
+    initialize_hydration,
 )
+from nucliadb_search.search.metrics import watch_phase
+
+_T = TypeVar("_T")
+
+
+def merge_shards_page(
+    shard_results: List[List[_T]],
+    score: Callable[[_T], float],
+    count: int,
+    page: int,
+) -> List[_T]:
+    # Nodes return their results sorted by descending score, so a k-way merge of
+    # the shard lists is enough to rank them globally and stop at the last
+    # result of the requested page
+    merged = heapq.merge(*shard_results, key=lambda result: -score(result))
+    return list(islice(merged, count * page, count * (page + 1)))
+
+
+def facet_results_to_dict(facet: FacetResults) -> Dict[str, Any]:
+    # Built by hand, json_format walks the message descriptors on every call.
+    # Like MessageToDict, fields with their default value are left out
+    value: Dict[str, Any] = {}
+    if facet.facetresults:
+        value["facetresults"] = [
+            facet_result_to_dict(result) for result in facet.facetresults
+        ]
+    return value
+
+
+def facet_result_to_dict(result: FacetResult) -> Dict[str, Any]:
+    value: Dict[str, Any] = {}
+    if result.tag:
+        value["tag"] = result.tag
+    if result.total:
+        value["total"] = result.total
+    return value
+
+
+def document_score(result: DocumentResult) -> float:
+    if result.score == 0:
+        return result.score_bm25
+    else:
+        return result.score
+
+
+async def hydrate_document(
+    result: DocumentResult,
+    kbid: str,
+    query: str,
+    highlight_split: bool,
+    split: bool,
+) -> ResourceResult:
+    # /f/file
+    text, positions = await get_text_resource(
+        result,
+        kbid,
+        query,
+        highlight_split=highlight_split,
+        split=split,
+    )
+    labels = await get_labels_resource(result, kbid)
+    _, field_type, field = result.field.split("/")
+    return ResourceResult(
+        score=document_score(result),
+        rid=result.uuid,
+        field=field,
+        field_type=field_type,
+        text=text,
+        positions=positions,
+        labels=labels,
+    )
+
+
+async def hydrate_paragraph(
+    result: ParagraphResult,
+    kbid: str,
+    query: str,
+    highlight_split: bool,
+    split: bool,
+) -> Paragraph:
+    _, field_type, field = result.field.split("/")
+    text, positions = await get_text_paragraph(
+        result,
+        kbid,
+        query,
+        highlight_split=highlight_split,
+        split=split,
+    )
+    labels = await get_labels_paragraph(result, kbid)
+    return Paragraph(
+        score=result.score,
+        rid=result.uuid,
+        field_type=field_type,
+        field=field,
+        text=text,
+        positions=positions,
+        labels=labels,
+    )
+
+
+async def hydrate_sentence(
+    score: float,
+    kbid: str,
+    rid: str,
+    field_type: str,
+    field: str,
+    index: int,
+    start: int,
+    end: int,
+    subfield: Optional[str],
+) -> Sentence:
+    text = await get_text_sentence(
+        rid, field_type, field, kbid, index, start, end, subfield
+    )
+    labels = await get_labels_sentence(
+        rid, field_type, field, kbid, index, start, end, subfield
+    )
+    return Sentence(
+        score=score,
+        rid=rid,
+        field_type=field_type,
+        field=field,
+        text=text,
+        labels=labels,
+    )
 
 
 async def merge_documents_results(
@@ -65,51 +199,28 @@ async def merge_documents_results(
 ) -> Resources:
 
     query = None
-    raw_resource_list: List[ResourceResult] = []
+    shard_results: List[List[Tuple[DocumentResult, str]]] = []
     facets: Dict[str, Any] = {}
     for document_response in documents:
         if query is None:
             query = document_response.query
         if document_response.facets:
             for key, value in document_response.facets.items():
-                facets[key] = MessageToDict(value)
+                facets[key] = facet_results_to_dict(value)
 
-        for result in document_response.results:
-            # /f/file
-            text, positions = await get_text_resource(
-                result,
-                kbid,
-                document_response.query,
-                highlight_split=highlight_split,
-                split=split,
-            )
-            labels = await get_labels_resource(result, kbid)
-            _, field_type, field = result.field.split("/")
-            if result.score == 0:
-                score = result.score_bm25
-            else:
-                score = result.score
-            raw_resource_list.append(
-                ResourceResult(
-                    score=score,
-                    rid=result.uuid,
-                    field=field,
-                    field_type=field_type,
-                    text=text,
-                    positions=positions,
-                    labels=labels,
-                )
-            )
+        shard_results.append(
+            [(result, document_response.query) for result in document_response.results]
+        )
 
-    raw_resource_list.sort(key=lambda x: x.score)
-
-    init = count * page
-    last = init + count
-    if last > len(raw_resource_list):
-        last = len(raw_resource_list)
-
-    resource_list = raw_resource_list[init:last]
-    # Filter the resources that are matching the length
+    page_results = merge_shards_page(
+        shard_results, lambda item: document_score(item[0]), count, page
+    )
+    resource_list: List[ResourceResult] = await asyncio.gather(
+        *[
+            hydrate_document(result, kbid, result_query, highlight_split, split)
+            for result, result_query in page_results
+        ]
+    )
 
     for resource in resource_list:
         if resource.rid not in resources:
@@ -125,36 +236,57 @@ async def merge_suggest_paragraph_results(
     split: bool,
 ):
 
-    raw_paragraph_list: List[Paragraph] = []
+    ops = []
     query = None
     for suggest_response in suggest_responses:
         if query is None:
             query = suggest_response.query
         for result in suggest_response.results:
-            _, field_type, field = result.field.split("/")
-            text, positions = await get_text_paragraph(
-                result,
-                kbid,
-                suggest_response.query,
-                highlight_split=highlight_split,
-                split=split,
-            )
-            labels = await get_labels_paragraph(result, kbid)
-            raw_paragraph_list.append(
-                Paragraph(
-                    score=result.score,
-                    rid=result.uuid,
-                    field_type=field_type,
-                    field=field,
-                    text=text,
-                    positions=positions,
-                    labels=labels,
+            ops.append(
+                hydrate_paragraph(
+                    result, kbid, suggest_response.query, highlight_split, split
                 )
             )
 
+    raw_paragraph_list: List[Paragraph] = await asyncio.gather(*ops)
     return Paragraphs(results=raw_paragraph_list, query=query)
 
 
+class VectorResult(NamedTuple):
+    score: float
+    rid: str
+    field_type: str
+    field: str
+    subfield: Optional[str]
+    sentence: int
+    start: int
+    end: int
+
+
+def parse_vector_result(document: DocumentScored) -> Optional[VectorResult]:
+    # {rid}/{field_type}/{field}[/{subfield}]/{index}/{start}-{end}
+    parts = document.doc_id.id.split("/")
+    if len(parts) == 5:
+        rid, field_type, field, index, position = parts
+        subfield = None
+    elif len(parts) == 6:
+        rid, field_type, field, subfield, index, position = parts
+    else:
+        logger.warning(f"Unexpected vector id {document.doc_id.id}")
+        return None
+    start, end = position.split("-")
+    return VectorResult(
+        document.score,
+        rid,
+        field_type,
+        field,
+        subfield,
+        int(index),
+        int(start),
+        int(end),
+    )
+
+
 async def merge_vectors_results(
     vectors: List[VectorSearchResponse],
     resources: List[str],
@@ -163,50 +295,83 @@ async def merge_vectors_results(
     page: int,
     max_score: float = 0.85,
 ):
-    results: List[Sentence] = []
     facets: Dict[str, Any] = {}
 
+    # Replicas and reindexed fields return the same sentence more than once,
+    # only its best score is kept
+    best: Dict[Tuple[str, str, str, Optional[str], int, int], VectorResult] = {}
     for vector in vectors:
         for document in vector.documents:
-            if document.score < max_score:
+            if document.score < max_score or math.isnan(document.score):
                 continue
-            if math.isnan(document.score):
+            result = parse_vector_result(document)
+            if result is None:
                 continue
-            count = document.doc_id.id.count("/")
-            if count == 4:
-                rid, field_type, field, index, position = document.doc_id.id.split("/")
-                subfield = None
-            elif count == 5:
-                (
-                    rid,
-                    field_type,
-                    field,
-                    subfield,
-                    index,
-                    position,
-                ) = document.doc_id.id.split("/")
-            start, end = position.split("-")
-            start_int = int(start)
-            end_int = int(end)
-            index_int = int(index)
-            text = await get_text_sentence(
-                rid, field_type, field, kbid, index_int, start_int, end_int, subfield
-            )
-            labels = await get_labels_sentence(
-                rid, field_type, field, kbid, index_int, start_int, end_int, subfield
+            key = (
+                result.rid,
+                result.field_type,
+                result.field,
+                result.subfield,
+                result.start,
+                result.end,
             )
-            results.append(
-                Sentence(
-                    score=document.score,
-                    rid=rid,
-                    field_type=field_type,
-                    field=field,
-                    text=text,
-                    labels=labels,
+            if key not in best or best[key].score < result.score:
+                best[key] = result
+
+    # A paragraph is returned once, with its best scoring sentence. Sentence ids
+    # do not carry their paragraph, it is looked up on the field metadata of
+    # the best ranked sentences until the requested page is filled
+    wanted = count * (page + 1)
+    ranked = sorted(best.values(), key=lambda result: result.score, reverse=True)
+    kept: Dict[Tuple[str, str, str, Optional[str], int, int], VectorResult] = {}
+    position = 0
+    while len(kept) < wanted and position < len(ranked):
+        candidates = ranked[position : position + wanted - len(kept)]
+        position += len(candidates)
+        paragraphs = await asyncio.gather(
+            *[
+                get_paragraph_sentence(
+                    result.rid,
+                    result.field_type,
+                    result.field,
+                    kbid,
+                    result.start,
+                    result.end,
+                    result.subfield,
                 )
+                for result in candidates
+            ]
+        )
+        for result, paragraph in zip(candidates, paragraphs):
+            start, end = paragraph or (result.start, result.end)
+            key = (
+                result.rid,
+                result.field_type,
+                result.field,
+                result.subfield,
+                start,
+                end,
             )
-
-    results.sort(key=lambda x: x.score)
+            if key not in kept:
+                kept[key] = result
+
+    # Only the sentences of the requested page are hydrated
+    results: List[Sentence] = await asyncio.gather(
+        *[
+            hydrate_sentence(
+                result.score,
+                kbid,
+                result.rid,
+                result.field_type,
+                result.field,
+                result.sentence,
+                result.start,
+                result.end,
+                result.subfield,
+            )
+            for result in list(kept.values())[count * page :]
+        ]
+    )
 
     for paragraph in results:
         if paragraph.rid not in resources:
@@ -225,7 +390,7 @@ async def merge_paragraph_results(
     split: bool,
 ):
 
-    raw_paragraph_list: List[Paragraph] = []
+    shard_results: List[List[Tuple[ParagraphResult, str]]] = []
     facets: Dict[str, Any] = {}
     query = None
     for paragraph_response in paragraphs:
@@ -233,34 +398,23 @@ async def merge_paragraph_results(
             query = paragraph_response.query
         if paragraph_response.facets:
             for key, value in paragraph_response.facets.items():
-                facets[key] = MessageToDict(value)
-        for result in paragraph_response.results:
-            _, field_type, field = result.field.split("/")
-            text, positions = await get_text_paragraph(
-                result, kbid, paragraph_response.query, highlight_split, split
-            )
-            labels = await get_labels_paragraph(result, kbid)
-            raw_paragraph_list.append(
-                Paragraph(
-                    score=result.score,
-                    rid=result.uuid,
-                    field_type=field_type,
-                    field=field,
-                    text=text,
-                    positions=positions,
-                    labels=labels,
-                )
-            )
-
-    raw_paragraph_list.sort(key=lambda x: x.score)
-
-    init = count * page
-    last = init + count
-    if last > len(raw_paragraph_list):
-        last = len(raw_paragraph_list)
-
-    paragraph_list = raw_paragraph_list[init:last]
-    # Filter the resources that are matching the length
+                facets[key] = facet_results_to_dict(value)
+        shard_results.append(
+            [
+                (result, paragraph_response.query)
+                for result in paragraph_response.results
+            ]
+        )
+
+    page_results = merge_shards_page(
+        shard_results, lambda item: item[0].score, count, page
+    )
+    paragraph_list: List[Paragraph] = await asyncio.gather(
+        *[
+            hydrate_paragraph(result, kbid, result_query, highlight_split, split)
+            for result, result_query in page_results
+        ]
+    )
 
     for paragraph in paragraph_list:
         if paragraph.rid not in resources:
@@ -291,20 +445,41 @@ async def merge_results(
 
     api_results = KnowledgeboxSearchResults()
 
-    get_resource_cache(clear=True)
+    await initialize_hydration()
+
+    # Documents, paragraphs and sentences are hydrated at the same time so they
+    # share the fetches of the resources and fields they have in common
+    document_resources: List[str] = list()
+    paragraph_resources: List[str] = list()
+    sentence_resources: List[str] = list()
+    with watch_phase("hydration") as hydration:
+        (
+            api_results.fulltext,
+            api_results.paragraphs,
+            api_results.sentences,
+        ) = await asyncio.gather(
+            merge_documents_results(
+                documents, document_resources, count, page, kbid, highlight, split
+            ),
+            merge_paragraph_results(
+                paragraphs,
+                paragraph_resources,
+                kbid,
+                count,
+                page,
+                highlight_split=highlight,
+                split=split,
+            ),
+            merge_vectors_results(
+                vectors, sentence_resources, kbid, count, page, max_score=max_score
+            ),
+        )
+    logger.debug(f"Search results for {kbid} hydrated in {hydration.elapsed:.3f}s")
 
     resources: List[str] = list()
-    api_results.fulltext = await merge_documents_results(
-        documents, resources, count, page, kbid, highlight, split
-    )
-
-    api_results.paragraphs = await merge_paragraph_results(
-        paragraphs, resources, kbid, count, page, highlight_split=highlight, split=split
-    )
-
-    api_results.sentences = await merge_vectors_results(
-        vectors, resources, kbid, count, page, max_score=max_score
-    )
+    for rid in document_resources + paragraph_resources + sentence_resources:
+        if rid not in resources:
+            resources.append(rid)
 
     api_results.resources = await fetch_resources(
         resources, kbid, show, field_type_filter, extracted
@@ -329,10 +504,14 @@ async def merge_paragraphs_results(
 
     api_results = ResourceSearchResults()
 
+    await initialize_hydration()
+
     resources: List[str] = list()
-    api_results.paragraphs = await merge_paragraph_results(
-        paragraphs, resources, kbid, count, page, highlight_split, split
-    )
+    with watch_phase("hydration") as hydration:
+        api_results.paragraphs = await merge_paragraph_results(
+            paragraphs, resources, kbid, count, page, highlight_split, split
+        )
+    logger.debug(f"Resource search for {kbid} hydrated in {hydration.elapsed:.3f}s")
     return api_results
 
 
@@ -347,7 +526,11 @@ async def merge_suggest_results(
 
     api_results = KnowledgeboxSuggestResults()
 
-    api_results.paragraphs = await merge_suggest_paragraph_results(
-        results, kbid, highlight_split=highlight_split, split=split
-    )
+    await initialize_hydration()
+
+    with watch_phase("hydration") as hydration:
+        api_results.paragraphs = await merge_suggest_paragraph_results(
+            results, kbid, highlight_split=highlight_split, split=split
+        )
+    logger.debug(f"Suggest results for {kbid} hydrated in {hydration.elapsed:.3f}s")
     return api_results
@@ -0,0 +1,113 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from contextvars import ContextVar
+from time import time
+from typing import Dict, Optional
+
+import prometheus_client  # type: ignore
+
+from nucliadb_utils import metrics
+
+SEARCH_PHASE_TIME = prometheus_client.Histogram(
+    "nucliadb_search_phase_time_seconds",
+    "Histogram of the time spent on each phase of a search by type of search (in seconds)",
+    labelnames=["type", "phase"],
+)
+
+SHARD_QUERY_TIME = prometheus_client.Histogram(
+    "nucliadb_search_shard_query_time_seconds",
+    "Histogram of the time spent querying a shard by type of search and node (in seconds)",
+    labelnames=["type", "node"],
+)
+
+UNKNOWN_SEARCH = "unknown"
+
+
+class SearchTimings:
+    """
+    Time spent on every phase of one request. Phases that run concurrently,
+    like the storage and maindb fetches while hydrating, add up their elapsed
+    times so they may be longer than the request itself
+    """
+
+    def __init__(self, search_type: str):
+        self.type = search_type
+        self.phases: Dict[str, float] = {}
+
+    def add(self, phase: str, elapsed: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+
+
+timings: ContextVar[Optional[SearchTimings]] = ContextVar("timings", default=None)
+
+
+def start_timings(search_type: str) -> SearchTimings:
+    # Tasks copy the context when created, so the request timings have to be set
+    # before fanning out for the phases timed from inside tasks to be accounted
+    value = SearchTimings(search_type)
+    timings.set(value)
+    return value
+
+
+def get_timings() -> Dict[str, float]:
+    value: Optional[SearchTimings] = timings.get()
+    if value is None:
+        return {}
+    return value.phases
+
+
+def get_search_type() -> str:
+    value: Optional[SearchTimings] = timings.get()
+    if value is None:
+        return UNKNOWN_SEARCH
+    return value.type
+
+
+class watch_phase(metrics.watch):
+    elapsed: float
+
+    def __init__(self, phase: str):
+        self.phase = phase
+        super().__init__(
+            histogram=SEARCH_PHASE_TIME,
+            labels={"type": get_search_type(), "phase": phase},
+        )
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        super().__exit__(exc_type, exc_value, exc_traceback)
+        self.elapsed = time() - self.start
+        value: Optional[SearchTimings] = timings.get()
+        if value is not None:
+            value.add(self.phase, self.elapsed)
+
+
+class watch_shard(metrics.watch):
+    def __init__(self, node: str):
+        self.node = node
+        super().__init__(
+            histogram=SHARD_QUERY_TIME,
+            labels={"type": get_search_type(), "node": node},
+        )
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        super().__exit__(exc_type, exc_value, exc_traceback)
+        value: Optional[SearchTimings] = timings.get()
+        if value is not None:
+            value.add(f"shard/{self.node}", time() - self.start)
@@ -24,12 +24,33 @@ from nucliadb_protos.nodereader_pb2 import (
     ParagraphSearchRequest,
     SearchRequest,
     SuggestRequest,
+    Timestamps,
 )
 
 from nucliadb_search.api.models import SearchOptions, Sort, SuggestOptions
+from nucliadb_search.search.metrics import watch_phase
 from nucliadb_search.utilities import get_predict
 
 
+def set_timestamps(
+    timestamps: Timestamps,
+    range_creation_start: Optional[datetime] = None,
+    range_creation_end: Optional[datetime] = None,
+    range_modification_start: Optional[datetime] = None,
+    range_modification_end: Optional[datetime] = None,
+):
+    # Nodes filter on the creation and modification dates indexed with the
+    # resource, unset bounds leave the range open
+    if range_creation_start is not None:
+        timestamps.from_created.FromDatetime(range_creation_start)
+    if range_creation_end is not None:
+        timestamps.to_created.FromDatetime(range_creation_end)
+    if range_modification_start is not None:
+        timestamps.from_modified.FromDatetime(range_modification_start)
+    if range_modification_end is not None:
+        timestamps.to_modified.FromDatetime(range_modification_end)
+
+
 async def global_query_to_pb(
     kbid: str,
     features: List[SearchOptions],
@@ -46,6 +67,7 @@ async def global_query_to_pb(
     fields: List[str] = [],
     sort_ord: int = Sort.ASC.value,
     reload: bool = False,
+    vector: Optional[List[float]] = None,
 ) -> SearchRequest:
 
     predict = get_predict()
@@ -59,15 +81,27 @@ async def global_query_to_pb(
         if sort:
             request.order.field = sort
             request.order.type = sort_ord  # type: ignore
-        request.page_number = page_number
-        request.result_per_page = page_size
+        # Results are merged across shards, so every shard has to return all its
+        # results up to the requested page
+        request.page_number = 0
+        request.result_per_page = (page_number + 1) * page_size
         request.fields.extend(fields)
+        set_timestamps(
+            request.timestamps,
+            range_creation_start,
+            range_creation_end,
+            range_modification_start,
+            range_modification_end,
+        )
 
     request.document = SearchOptions.DOCUMENT in features
     request.paragraph = SearchOptions.PARAGRAPH in features
 
     if SearchOptions.VECTOR in features:
-        request.vector.extend(await predict.convert_sentence_to_vector(kbid, query))
+        if vector is None:
+            with watch_phase("predict"):
+                vector = await predict.convert_sentence_to_vector(kbid, query)
+        request.vector.extend(vector)
 
     if SearchOptions.RELATIONS in features:
         pass
@@ -91,6 +125,13 @@ async def suggest_query_to_pb(
     if SuggestOptions.PARAGRAPH in features:
         request.body = query
         request.filter.tags.extend(filters)
+        set_timestamps(
+            request.timestamps,
+            range_creation_start,
+            range_creation_end,
+            range_modification_start,
+            range_modification_end,
+        )
     return request
 
 
@@ -124,9 +165,18 @@ async def paragraph_query_to_pb(
         if sort:
             request.order.field = sort
             request.order.type = sort_ord  # type: ignore
-        request.page_number = page_number
-        request.result_per_page = page_size
+        # Results are merged across shards, so every shard has to return all its
+        # results up to the requested page
+        request.page_number = 0
+        request.result_per_page = (page_number + 1) * page_size
         request.fields.extend(fields)
+        set_timestamps(
+            request.timestamps,
+            range_creation_start,
+            range_creation_end,
+            range_modification_start,
+            range_modification_end,
+        )
 
     # if SearchOptions.VECTOR in features:
     #     request.vector = await predict.convert_sentence_to_vector(query)
@@ -17,6 +17,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
 from nucliadb_protos.nodereader_pb2 import (
     ParagraphSearchRequest,
     ParagraphSearchResponse,
@@ -26,28 +39,169 @@ from nucliadb_protos.nodereader_pb2 import (
     SuggestResponse,
 )
 from nucliadb_protos.noderesources_pb2 import Shard, ShardId
+from nucliadb_protos.writer_pb2 import ShardObject
 
 from nucliadb_ingest.orm.node import Node
+from nucliadb_search.nodes import NodesManager, latency_percentile, track_node
+from nucliadb_search.search.metrics import watch_shard
+from nucliadb_search.settings import settings
 
+_T = TypeVar("_T")
 
-def query_shard(node: Node, shard: str, query: SearchRequest) -> SearchResponse:
-    query.shard = shard
-    return node.reader.Search(query)
 
+async def query_shard(node: Node, shard: str, query: SearchRequest) -> SearchResponse:
+    # The same query is sent to several shards and grpc serializes the request
+    # once the call is scheduled, so every shard needs its own copy
+    request = SearchRequest()
+    request.CopyFrom(query)
+    request.shard = shard
+    with track_node(node), watch_shard(node.address):
+        return await node.reader.Search(request)  # type: ignore
 
-def get_shard(node: Node, shard: str) -> Shard:
+
+async def get_shard(node: Node, shard: str) -> Shard:
     shardid = ShardId()
     shardid.id = shard
-    return node.reader.GetShard(shardid)
+    with track_node(node):
+        return await node.reader.GetShard(shardid)  # type: ignore
 
 
-def query_paragraph_shard(
+async def query_paragraph_shard(
     node: Node, shard: str, query: ParagraphSearchRequest
 ) -> ParagraphSearchResponse:
-    query.id = shard
-    return node.reader.ParagraphSearch(query)
+    request = ParagraphSearchRequest()
+    request.CopyFrom(query)
+    request.id = shard
+    with track_node(node), watch_shard(node.address):
+        return await node.reader.ParagraphSearch(request)  # type: ignore
+
+
+async def suggest_shard(
+    node: Node, shard: str, query: SuggestRequest
+) -> SuggestResponse:
+    request = SuggestRequest()
+    request.CopyFrom(query)
+    request.shard = shard
+    with track_node(node), watch_shard(node.address):
+        return await node.reader.Suggest(request)  # type: ignore
+
+
+def hedging_delay() -> Optional[float]:
+    if not settings.search_hedging:
+        return None
+    delay = latency_percentile(settings.search_hedging_percentile)
+    if delay is None:
+        # Not enough samples yet to know what a slow shard is
+        return None
+    return max(delay, settings.search_hedging_min_delay)
+
+
+async def hedged_query(
+    nodemanager: NodesManager,
+    shard_object: ShardObject,
+    node: Node,
+    shard_id: str,
+    node_id: str,
+    query: Callable[[Node, str], Awaitable[_T]],
+) -> _T:
+    """
+    Query a shard replica and, if it does not answer after the hedging delay
+    or fails, query another replica of the same shard keeping the first answer
+    """
+    delay = hedging_delay()
+    if delay is None:
+        return await query(node, shard_id)
+
+    tasks = [asyncio.ensure_future(query(node, shard_id))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done and tasks[0].exception() is None:
+            return tasks[0].result()
+
+        try:
+            other_node, other_shard_id, _ = nodemanager.choose_node(
+                shard_object, exclude=[node_id]
+            )
+        except KeyError:
+            return await tasks[0]
+        if other_shard_id is None:
+            return await tasks[0]
+        tasks.append(asyncio.ensure_future(query(other_node, other_shard_id)))
+
+        pending = {task for task in tasks if not task.done()}
+        while pending:
+            _, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in tasks:
+                if task.done() and task.exception() is None:
+                    return task.result()
+        # All the replicas failed, report the first error
+        return tasks[0].result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def limit_concurrency(
+    semaphore: asyncio.Semaphore, op: Awaitable[_T], timeout: Optional[float] = None
+) -> _T:
+    """
+    Run op once the semaphore has a free slot. The timeout starts counting
+    from then, so the time spent waiting for the slot is not charged to op
+    """
+    async with semaphore:
+        if timeout is None:
+            return await op
+        return await asyncio.wait_for(op, timeout)
+
+
+async def gather_shards(
+    ops: Sequence[Awaitable[_T]], timeout: Optional[float]
+) -> Tuple[List[Union[_T, BaseException]], bool]:
+    """
+    Run the shard queries until the deadline, returning the answers (or their
+    errors) and whether some shard has been dropped for being too slow. With
+    no timeout every query is waited for
+    """
+    tasks = [asyncio.ensure_future(op) for op in ops]
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    results: List[Union[_T, BaseException]] = []
+    for task in tasks:
+        if task in done:
+            exception = task.exception()
+            results.append(exception if exception is not None else task.result())
+    return results, len(pending) > 0
 
 
-def suggest_shard(node: Node, shard: str, query: SuggestRequest) -> SuggestResponse:
-    query.shard = shard
-    return node.reader.Suggest(query)
+async def iterate_shards(
+    ops: Sequence[Awaitable[_T]], timeout: float
+) -> AsyncIterator[Tuple[int, Union[_T, BaseException]]]:
+    """
+    Like gather_shards, but yielding every answer (or its error) with the index
+    of its query as soon as it arrives. Shards missing the deadline are dropped
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tasks = [asyncio.ensure_future(op) for op in ops]
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=max(deadline - loop.time(), 0),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                break
+            for task in done:
+                exception = task.exception()
+                yield tasks.index(task), (
+                    exception if exception is not None else task.result()
+                )
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,101 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+from nucliadb_protos.nodereader_pb2 import SearchResponse
+from sentry_sdk import capture_exception
+
+from nucliadb_search.api.models import KnowledgeboxSearchResults
+from nucliadb_search.search.fetch import abort_transaction
+from nucliadb_search.search.metrics import get_timings, watch_phase
+from nucliadb_search.search.shards import iterate_shards
+from nucliadb_utils.fastapi.responses import dumps
+
+NDJSON = "application/x-ndjson"
+
+FACETS = {"fulltext", "paragraphs", "sentences"}
+
+
+def frame(data: Dict[str, Any]) -> bytes:
+    return dumps(data) + b"\n"
+
+
+async def stream_results(
+    ops: Sequence[Awaitable[SearchResponse]],
+    shards: List[str],
+    timeout: float,
+    merge: Callable[[List[SearchResponse]], Awaitable[KnowledgeboxSearchResults]],
+    debug: bool = False,
+    finish: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Merges and hydrates the answers of the shards as they arrive. Every shard
+    answering yields a facets frame and a results frame with the requested
+    page over all the shards answered so far, replacing the previous ones, so
+    the last of them are what the JSON response would return. The stream ends
+    with a summary frame
+    """
+    answered = 0
+    errors = 0
+    resources = 0
+    received: List[SearchResponse] = []
+    try:
+        async for index, result in iterate_shards(ops, timeout=timeout):
+            if isinstance(result, BaseException):
+                capture_exception(result)
+                errors += 1
+                continue
+
+            answered += 1
+            received.append(result)
+            with watch_phase("merge"):
+                search_results = await merge(received)
+            resources = len(search_results.resources)
+            results = search_results.dict(exclude_unset=True)
+            facets: Dict[str, Any] = {}
+            for kind in FACETS:
+                if kind in results and "facets" in results[kind]:
+                    facets[kind] = results[kind].pop("facets")
+            yield frame({"type": "facets", "shard": shards[index], **facets})
+            yield frame({"type": "results", "shard": shards[index], **results})
+
+        summary: Dict[str, Any] = {
+            "type": "summary",
+            "shards": len(ops),
+            "answered": answered,
+            "errors": errors,
+            "incomplete_results": answered < len(ops),
+        }
+        if debug:
+            summary["timings"] = get_timings()
+        yield frame(summary)
+    finally:
+        await abort_transaction()
+    if finish is not None:
+        await finish(resources)
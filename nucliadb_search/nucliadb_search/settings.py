@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseSettings
 
@@ -30,6 +30,39 @@ class Settings(BaseSettings):
     nodes_load_ingest: bool = False
 
     search_timeout: float = 10.0
+    # Shards not answering before this deadline are dropped from the results
+    search_shard_timeout: float = 10.0
+    # Send a duplicate query to another replica when a shard is slower than
+    # this percentile of the recent shard latencies
+    search_hedging: bool = False
+    search_hedging_percentile: float = 95.0
+    search_hedging_min_delay: float = 0.01
+    search_hydration_concurrency: int = 20
+    search_shards_cache_ttl: float = 60.0
+    # Searches running at once per kb and client type (times its weight), 0
+    # disables the limit. Searches beyond it wait in a queue or get a 429
+    search_kb_concurrency: int = 0
+    search_kb_queue_size: int = 100
+    search_kb_queue_timeout: float = 5.0
+    search_client_weights: Dict[str, float] = {}
+    search_retry_after: int = 1
+
+    # Batch searches: queries per request and shard queries in flight per node
+    search_batch_max_queries: int = 100
+    search_batch_node_concurrency: int = 10
+
+    # Knowledge boxes whose search and suggest results are cached until ingest
+    # notifies a change on them
+    search_cache_kbids: List[str] = []
+    search_cache_size: int = 1000
+    search_cache_ttl: float = 60.0
+
+    # Query embeddings kept in memory, 0 disables the cache
+    search_predict_cache_size: int = 1000
+    search_predict_cache_ttl: float = 300.0
+    # Sentences to send together to the predict api, 0 disables batching
+    search_predict_batch_size: int = 0
+    search_predict_batch_wait: float = 0.005
 
 
 settings = Settings()
@@ -0,0 +1,74 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from unittest import mock
+
+import pytest
+from fastapi import HTTPException
+
+from nucliadb_search import admission
+from nucliadb_search.admission import AdmissionController, Overloaded, admit
+from nucliadb_search.api.models import SearchClientType
+
+
+@pytest.mark.asyncio
+async def test_admission_queues_and_rejects_per_kb_and_client():
+    controller = AdmissionController(
+        concurrency=1, queue_size=1, timeout=0.05, weights={"widget": 2}
+    )
+    await controller.acquire("kb1", "api")
+    # Other kbs and client types have their own slots
+    await controller.acquire("kb2", "api")
+    await controller.acquire("kb1", "widget")
+    await controller.acquire("kb1", "widget")
+
+    waiting = asyncio.ensure_future(controller.acquire("kb1", "api"))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as exc:
+        await controller.acquire("kb1", "api")
+    assert exc.value.reason == "queue"
+
+    controller.release("kb1", "api")
+    await waiting
+    with pytest.raises(Overloaded) as exc:
+        await controller.acquire("kb1", "api")
+    assert exc.value.reason == "timeout"
+
+    controller.release("kb1", "api")
+    controller.release("kb2", "api")
+    controller.release("kb1", "widget")
+    controller.release("kb1", "widget")
+    assert controller.limiters == {}
+
+
+@pytest.mark.asyncio
+async def test_admit_returns_429_when_overloaded():
+    controller = AdmissionController(concurrency=1, queue_size=0, timeout=0.05)
+    with mock.patch.object(admission, "get_admission", return_value=controller):
+        first = admit("kb1", SearchClientType.API)
+        await first.__anext__()
+        with pytest.raises(HTTPException) as exc:
+            await admit("kb1", SearchClientType.API).__anext__()
+        assert exc.value.status_code == 429
+        assert exc.value.headers == {"Retry-After": "1"}
+
+        with pytest.raises(StopAsyncIteration):
+            await first.__anext__()
+        assert controller.limiters == {}
@@ -157,3 +157,29 @@ async def test_search_resource_all(
                 assert results[2][0].endswith("20-45")
 
     await txn.abort()
+
+
+@pytest.mark.asyncio
+async def test_search_batch(
+    search_api: Callable[..., AsyncClient], test_search_resource: str
+) -> None:
+    kbid = test_search_resource
+
+    async with search_api(roles=[NucliaDBRoles.READER]) as client:
+        resp = await client.post(
+            f"/{KB_PREFIX}/{kbid}/search/batch",
+            json={
+                "queries": [
+                    {"query": "own text", "split": True, "highlight": True},
+                    {"query": "nothing matches", "features": ["document"]},
+                ]
+            },
+        )
+        assert resp.status_code == 200
+        results = resp.json()["results"]
+        assert len(results) == 2
+        assert (
+            results[0]["fulltext"]["results"][0]["text"]
+            == "My <mark>own</mark> <mark>text</mark> Ramon. This is grea…"
+        )
+        assert results[1]["fulltext"]["query"] == "nothing matches"
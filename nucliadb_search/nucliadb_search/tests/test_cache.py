@@ -0,0 +1,159 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+from nucliadb_protos.nodereader_pb2 import SearchRequest
+from starlette.requests import Request
+
+from nucliadb_models.common import FieldTypeName
+from nucliadb_models.serialize import ExtractedDataTypeName, ResourceProperties
+from nucliadb_search.api.models import (
+    KnowledgeboxSearchResults,
+    SearchClientType,
+    SearchOptions,
+    SortOption,
+)
+from nucliadb_search.api.v1 import search
+from nucliadb_search.search.cache import SearchResultsCache
+
+
+class FakePubSub:
+    async_callback = True
+
+    def __init__(self):
+        self.handlers = {}
+
+    async def subscribe(self, handler, key, group=None):
+        self.handlers[key] = handler
+
+    async def unsubscribe(self, key):
+        del self.handlers[key]
+
+    async def publish(self, key, data):
+        await self.handlers[key](data)
+
+
+@pytest.mark.asyncio
+async def test_search_results_cache_invalidated_by_notifications():
+    pubsub = FakePubSub()
+    cache = SearchResultsCache(pubsub, ["kb1", "kb2"])
+    await cache.initialize()
+    assert cache.enabled("kb1")
+    assert not cache.enabled("kb3")
+
+    key1 = cache.key("kb1", "search", query="query", page=0)
+    key2 = cache.key("kb2", "search", query="query", page=0)
+    assert key1 != cache.key("kb1", "suggest", query="query", page=0)
+    assert key1 != cache.key("kb1", "search", query="query", page=1)
+    cache.set(key1, "results1")
+    cache.set(key2, "results2")
+    assert cache.get(key1) == "results1"
+
+    # A key taken before the notification is not stored after it
+    stale = cache.key("kb1", "search", query="other")
+    await pubsub.publish("notify.kb1", b"")
+    cache.set(stale, "stale")
+    assert cache.get(stale) is None
+    assert cache.get(cache.key("kb1", "search", query="query", page=0)) is None
+    assert cache.get(key2) == "results2"
+    assert cache.get_stats()["invalidations"] == 1
+
+    await cache.finalize()
+    assert pubsub.handlers == {}
+
+
+def test_search_results_cache_expires():
+    cache = SearchResultsCache(FakePubSub(), ["kb1"], ttl=0)
+    key = cache.key("kb1", "search", query="query")
+    cache.set(key, "results")
+    assert cache.get(key) is None
+    assert cache.get_stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_search_skips_the_query_build(monkeypatch):
+    cache = SearchResultsCache(FakePubSub(), ["kb1"])
+    queries = []
+
+    async def get_shards_by_kbid(kbid):
+        return ["shard"]
+
+    async def global_query_to_pb(*args):
+        queries.append(args)
+        return SearchRequest()
+
+    async def hedged_query(*args):
+        return "answer"
+
+    async def merge_results(results, **kwargs):
+        return KnowledgeboxSearchResults()
+
+    nodemanager = SimpleNamespace(
+        get_shards_by_kbid=get_shards_by_kbid,
+        choose_node=lambda shard: (SimpleNamespace(label="node"), "shard", "node"),
+    )
+    counter: Counter = Counter()
+    monkeypatch.setattr(search, "get_nodes", lambda: nodemanager)
+    monkeypatch.setattr(search, "get_search_cache", lambda: cache)
+    monkeypatch.setattr(search, "get_audit", lambda: None)
+    monkeypatch.setattr(search, "get_counter", lambda: counter)
+    monkeypatch.setattr(search, "global_query_to_pb", global_query_to_pb)
+    monkeypatch.setattr(search, "hedged_query", hedged_query)
+    monkeypatch.setattr(search, "merge_results", merge_results)
+
+    def run_search(query: str):
+        return search.search_knowledgebox.__wrapped__(  # type: ignore
+            request=Request({"type": "http", "headers": []}),
+            kbid="kb1",
+            query=query,
+            fields=[],
+            filters=[],
+            faceted=[],
+            sort=SortOption.CREATED,
+            page_number=0,
+            page_size=20,
+            max_score=0.73,
+            range_creation_start=None,
+            range_creation_end=None,
+            range_modification_start=None,
+            range_modification_end=None,
+            features=[SearchOptions.PARAGRAPH],
+            reload=True,
+            debug=False,
+            highlight=False,
+            split=False,
+            show=[ResourceProperties.BASIC],
+            field_type_filter=list(FieldTypeName),
+            extracted=list(ExtractedDataTypeName),
+            x_ndb_client=SearchClientType.API,
+            x_nucliadb_user="",
+            x_forwarded_for="",
+        )
+
+    await run_search("query")
+    await run_search("query")
+    assert len(queries) == 1
+    assert cache.hits == 1
+    assert counter["kb1_-_search_client_api"] == 2
+
+    await run_search("other")
+    assert len(queries) == 2
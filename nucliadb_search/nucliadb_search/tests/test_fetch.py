@@ -0,0 +1,193 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from nucliadb_protos.utils_pb2 import ExtractedText
+
+from nucliadb_ingest.fields.base import FIELD_TEXT
+from nucliadb_ingest.fields.text import Text
+from nucliadb_search.search import fetch
+from nucliadb_utils.cache.utility import Cache
+
+
+class FakePubSub:
+    async_callback = True
+
+    def __init__(self):
+        self.published = []
+
+    def parse(self, data):
+        return orjson.loads(data)
+
+    async def publish(self, key, data):
+        self.published.append(data)
+
+
+class FakeMemoryCache(dict):
+    def set(self, key, value, size):
+        self[key] = value
+
+
+def make_cache() -> Cache:
+    cache = Cache(pubsub=FakePubSub())  # type: ignore
+    cache._memory_cache = FakeMemoryCache()  # type: ignore
+    return cache
+
+
+@pytest.fixture
+def search_cache(monkeypatch):
+    cache = make_cache()
+
+    async def get_cache():
+        return cache
+
+    monkeypatch.setattr(fetch, "get_cache", get_cache)
+    return cache
+
+
+def make_resource(cache=None):
+    kb = SimpleNamespace(kbid="kbid", cache=cache)
+    return SimpleNamespace(kb=kb, uuid="rid")
+
+
+@pytest.mark.asyncio
+async def test_fetch_shared_keeps_payloads(search_cache):
+    calls = []
+
+    async def fetcher():
+        calls.append(True)
+        return ExtractedText(text="text")
+
+    resource = make_resource()
+    for _ in range(2):
+        payload = await fetch.fetch_shared(resource, "t", "field", FIELD_TEXT, fetcher)
+        assert payload.text == "text"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_shared_invalidated_by_ingest(search_cache):
+    # Ingest stores a new version of the field and invalidates the payload
+    ingest_cache = make_cache()
+    field = Text(id="field", resource=make_resource(ingest_cache))
+    version = "old"
+
+    async def fetcher():
+        return ExtractedText(text=version)
+
+    resource = make_resource()
+    payload = await fetch.fetch_shared(resource, "t", "field", FIELD_TEXT, fetcher)
+    assert payload.text == "old"
+
+    version = "new"
+    await field.invalidate_cache(FIELD_TEXT)
+    for data in ingest_cache.pubsub.published:
+        await search_cache.async_invalidate(data)
+    payload = await fetch.fetch_shared(resource, "t", "field", FIELD_TEXT, fetcher)
+    assert payload.text == "new"
+
+
+@pytest.mark.asyncio
+async def test_fetch_shared_invalidated_during_fetch(search_cache):
+    ingest_cache = make_cache()
+    field = Text(id="field", resource=make_resource(ingest_cache))
+    started = asyncio.Event()
+    release = asyncio.Event()
+    version = "old"
+
+    async def slow_fetcher():
+        started.set()
+        await release.wait()
+        return ExtractedText(text="old")
+
+    async def fetcher():
+        return ExtractedText(text=version)
+
+    resource = make_resource()
+    task = asyncio.create_task(
+        fetch.fetch_shared(resource, "t", "field", FIELD_TEXT, slow_fetcher)
+    )
+    await started.wait()
+    version = "new"
+    await field.invalidate_cache(FIELD_TEXT)
+    for data in ingest_cache.pubsub.published:
+        await search_cache.async_invalidate(data)
+    release.set()
+    assert (await task).text == "old"
+
+    # The payload read before the invalidation was not kept
+    payload = await fetch.fetch_shared(resource, "t", "field", FIELD_TEXT, fetcher)
+    assert payload.text == "new"
+
+
+@pytest.fixture
+def hydration(monkeypatch):
+    async def get_driver():
+        return SimpleNamespace(begin=begin)
+
+    async def begin():
+        return "txn"
+
+    monkeypatch.setattr(fetch, "get_driver", get_driver)
+    monkeypatch.setattr(fetch.settings, "search_hydration_concurrency", 2)
+
+
+@pytest.mark.asyncio
+async def test_cached_fetch_fetches_a_key_once(hydration):
+    await fetch.initialize_hydration()
+    assert await fetch.get_transaction() == "txn"
+    calls = []
+
+    async def fetcher():
+        calls.append(True)
+        await asyncio.sleep(0.01)
+        return "resource"
+
+    results = await asyncio.gather(
+        *[fetch.cached_fetch(("resource", "rid"), fetcher) for _ in range(3)]
+    )
+    assert results == ["resource"] * 3
+    assert await fetch.cached_fetch(("resource", "rid"), fetcher) == "resource"
+    assert len(calls) == 1
+
+    await fetch.cached_fetch(("resource", "other"), fetcher)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_fetch_bounds_concurrent_fetches(hydration):
+    await fetch.initialize_hydration()
+    running = 0
+    peak = 0
+
+    async def fetcher():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(
+        *[fetch.cached_fetch(("resource", str(index)), fetcher) for index in range(6)]
+    )
+    assert peak == 2
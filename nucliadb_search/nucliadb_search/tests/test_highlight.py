@@ -91,3 +91,12 @@ def test_split_text():
         res[0]
         == " …t, once, and copies <mark>each item over</mark>\n(from its original …"
     )
+
+
+def test_highlight_escapes_query_terms():
+    res = highlight("Costs (in EUR) are 1+1 or more", '"(in eur)" "1+1" ""', True)
+    assert res[0] == "Costs <mark>(in EUR)</mark> are <mark>1+1</mark> or more"
+    assert res[1] == {"(in eur)": [(6, 14)], "1+1": [(19, 22)]}
+
+    res = split_text("nothing to see here", '"(" [', True)
+    assert res == ("", {})
@@ -118,6 +118,36 @@ async def test_kb_counters_cached_nodebug(
         assert "shards" not in data
 
 
+@pytest.mark.asyncio
+async def test_kb_counters_debug_reports_shards(
+    search_api: Callable[..., AsyncClient], test_search_resource: str
+) -> None:
+    from nucliadb_utils.utilities import get_cache
+
+    kbid = test_search_resource
+
+    cache = await get_cache()
+    assert cache is not None
+
+    # Cached by a request without debug, it has no shards
+    await cache.set(
+        KB_COUNTER_CACHE.format(kbid=kbid),
+        json.dumps(
+            {"resources": 100, "paragraphs": 100, "fields": 100, "sentences": 100}
+        ),
+    )
+
+    async with search_api(roles=[NucliaDBRoles.READER]) as client:
+        resp = await client.get(
+            f"/{KB_PREFIX}/{kbid}/counters?debug=true",
+        )
+        assert resp.status_code == 200
+
+        data = resp.json()
+        assert data["resources"] == 1
+        assert len(data["shards"]) > 0
+
+
 @pytest.mark.asyncio
 async def test_kb_accounting(
     search_api: Callable[..., AsyncClient], test_search_resource: str
@@ -0,0 +1,134 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import mock
+
+import pytest
+from nucliadb_protos.nodereader_pb2 import DocumentResult, VectorSearchResponse
+
+from nucliadb_search.api.models import Sentence
+from nucliadb_search.search import merge
+from nucliadb_search.search.merge import document_score, merge_shards_page
+
+
+def test_merge_shards_page():
+    shard_results = [[9, 7, 2], [8, 3], [], [10, 1]]
+
+    assert merge_shards_page(shard_results, lambda x: x, 2, 0) == [10, 9]
+    assert merge_shards_page(shard_results, lambda x: x, 2, 1) == [8, 7]
+    assert merge_shards_page(shard_results, lambda x: x, 3, 2) == [1]
+    assert merge_shards_page(shard_results, lambda x: x, 3, 3) == []
+
+
+def test_merge_shards_page_of_documents():
+    shard_results = [
+        [
+            DocumentResult(uuid="a", score_bm25=2.5),
+            DocumentResult(uuid="b", score_bm25=0.5),
+        ],
+        [DocumentResult(uuid="c", score_bm25=1.5)],
+    ]
+
+    page = merge_shards_page(shard_results, document_score, 2, 0)
+    assert [result.uuid for result in page] == ["a", "c"]
+
+
+async def hydrate_sentence(score, kbid, rid, field_type, field, index, start, end, sub):
+    return Sentence(
+        score=score,
+        rid=rid,
+        field_type=field_type,
+        field=field,
+        text=f"{index}/{start}-{end}",
+    )
+
+
+async def no_paragraph(rid, field_type, field, kbid, start, end, sub):
+    return None
+
+
+@pytest.mark.asyncio
+async def test_merge_vectors_results_ranks_dedups_and_pages():
+    def response(*documents):
+        vectors = VectorSearchResponse()
+        for doc_id, score in documents:
+            document = vectors.documents.add()
+            document.doc_id.id = doc_id
+            document.score = score
+        return vectors
+
+    vectors = [
+        response(("r1/t/body/0/0-10", 0.9), ("r2/t/body/0/0-10", 0.95)),
+        response(
+            ("r1/t/body/0/0-10", 0.92),
+            ("r3/f/file/split/1/5-20", 0.99),
+            ("r4/t/body/0/0-10", 0.5),
+        ),
+    ]
+    resources: list = []
+    with mock.patch.object(
+        merge, "hydrate_sentence", side_effect=hydrate_sentence
+    ), mock.patch.object(merge, "get_paragraph_sentence", side_effect=no_paragraph):
+        first = await merge.merge_vectors_results(
+            vectors, resources, "kbid", 2, 0, max_score=0.7
+        )
+        second = await merge.merge_vectors_results(
+            vectors, [], "kbid", 2, 1, max_score=0.7
+        )
+        hydrated = merge.hydrate_sentence.call_count
+
+    assert [r.rid for r in first.results] == ["r3", "r2"]
+    assert first.results[0].score == pytest.approx(0.99)
+    assert resources == ["r3", "r2"]
+    assert [r.rid for r in second.results] == ["r1"]
+    assert second.results[0].score == pytest.approx(0.92)
+    assert hydrated == 3
+
+
+@pytest.mark.asyncio
+async def test_merge_vectors_results_returns_a_paragraph_once():
+    async def get_paragraph_sentence(rid, field_type, field, kbid, start, end, sub):
+        # r1 body has a single paragraph holding both sentences
+        if rid == "r1":
+            return 0, 100
+        return None
+
+    vectors = VectorSearchResponse()
+    for doc_id, score in (
+        ("r1/t/body/0/0-10", 0.9),
+        ("r1/t/body/1/11-30", 0.95),
+        ("r2/t/body/0/0-10", 0.8),
+    ):
+        document = vectors.documents.add()
+        document.doc_id.id = doc_id
+        document.score = score
+
+    with mock.patch.object(
+        merge, "hydrate_sentence", side_effect=hydrate_sentence
+    ), mock.patch.object(
+        merge, "get_paragraph_sentence", side_effect=get_paragraph_sentence
+    ):
+        sentences = await merge.merge_vectors_results(
+            [vectors], [], "kbid", 2, 0, max_score=0.7
+        )
+
+    assert [(r.rid, r.text) for r in sentences.results] == [
+        ("r1", "1/11-30"),
+        ("r2", "0/0-10"),
+    ]
@@ -0,0 +1,57 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from nucliadb_search.search.metrics import (
+    SEARCH_PHASE_TIME,
+    start_timings,
+    watch_phase,
+    watch_shard,
+)
+
+
+async def timed(phase, delay):
+    with watch_phase(phase):
+        await asyncio.sleep(delay)
+
+
+@pytest.mark.asyncio
+async def test_phases_timed_from_tasks_are_accounted_on_the_request():
+    timings = start_timings("search")
+    with watch_phase("merge") as merge:
+        await asyncio.gather(
+            timed("hydration_storage", 0.01), timed("hydration_storage", 0.01)
+        )
+    with watch_shard("node-1:10000"):
+        pass
+
+    assert timings.phases["merge"] == merge.elapsed
+    # Concurrent fetches add up their elapsed times
+    assert timings.phases["hydration_storage"] >= 0.02
+    assert "shard/node-1:10000" in timings.phases
+    assert SEARCH_PHASE_TIME.labels(type="search", phase="merge")._sum.get() > 0
+
+
+def test_phases_without_request_are_not_accounted():
+    with watch_phase("merge") as merge:
+        pass
+    assert merge.elapsed >= 0
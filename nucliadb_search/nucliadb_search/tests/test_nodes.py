@@ -0,0 +1,124 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import mock
+
+import pytest
+from nucliadb_protos.writer_pb2 import ShardObject, ShardReplica
+from nucliadb_protos.writer_pb2 import Shards as PBShards
+
+from nucliadb_ingest.orm import NODES
+from nucliadb_ingest.orm.utils import invalidate_shards_cache
+from nucliadb_search import nodes
+from nucliadb_search.nodes import NodesManager, NodeStats, get_node_stats, track_node
+
+
+@pytest.fixture
+def replicas():
+    shard = ShardObject(shard="shard")
+    for node_id in ("node-1", "node-2"):
+        replica = ShardReplica(node=node_id)
+        replica.shard.id = f"{node_id}-shard"
+        shard.replicas.append(replica)
+        NODES[node_id] = mock.Mock(address=f"{node_id}:4444")
+    yield shard
+    for node_id in ("node-1", "node-2"):
+        NODES.pop(node_id, None)
+        nodes.NODE_STATS.pop(f"{node_id}:4444", None)
+
+
+def test_node_stats_moving_average():
+    stats = NodeStats()
+    assert stats.cost() == 0.0
+    stats.observe(1.0)
+    assert stats.latency == 1.0
+    stats.observe(2.0)
+    assert stats.latency == pytest.approx(1.3)
+    stats.inflight = 1
+    assert stats.cost() == pytest.approx(2.6)
+
+
+def test_track_node_counts_inflight_and_errors():
+    node = mock.Mock(address="tracked:4444")
+    with track_node(node):
+        assert get_node_stats("tracked:4444").inflight == 1
+    with pytest.raises(ValueError):
+        with track_node(node):
+            raise ValueError()
+    stats = nodes.NODE_STATS.pop("tracked:4444")
+    assert stats.inflight == 0
+    assert stats.requests == 2
+    assert stats.errors == 1
+
+
+def test_choose_node_prefers_less_loaded_replica(replicas):
+    get_node_stats("node-1:4444").observe(1.0)
+    get_node_stats("node-2:4444").observe(0.01)
+    manager = NodesManager(driver=None, cache=None)
+    for _ in range(10):
+        node, shard_id, node_id = manager.choose_node(replicas)
+        assert node_id == "node-2"
+        assert shard_id == "node-2-shard"
+
+    stats = manager.nodes_stats(["node-1", "node-2", "unknown"])
+    assert set(stats.keys()) == {"node-1", "node-2"}
+
+
+def test_choose_node_skips_missing_replicas(replicas):
+    NODES.pop("node-1")
+    manager = NodesManager(driver=None, cache=None)
+    _, _, node_id = manager.choose_node(replicas)
+    assert node_id == "node-2"
+    NODES.pop("node-2")
+    with pytest.raises(KeyError):
+        manager.choose_node(replicas)
+
+
+class FakeCache:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value):
+        self.values[key] = value
+
+    async def delete(self, key, invalidate=False):
+        self.values.pop(key, None)
+
+
+@pytest.mark.asyncio
+async def test_shards_are_cached_until_invalidated():
+    payload = ShardObject(shard="shard")
+    shards = PBShards(kbid="kbid")
+    shards.shards.append(payload)
+    txn = mock.AsyncMock()
+    txn.get.return_value = shards.SerializeToString()
+    driver = mock.Mock(begin=mock.AsyncMock(return_value=txn))
+    cache = FakeCache()
+    manager = NodesManager(driver=driver, cache=cache)
+
+    assert [x.shard for x in await manager.get_shards_by_kbid("kbid")] == ["shard"]
+    assert [x.shard for x in await manager.get_shards_by_kbid("kbid")] == ["shard"]
+    assert txn.get.call_count == 1
+
+    await invalidate_shards_cache(cache, "kbid")
+    await manager.get_shards_by_kbid("kbid")
+    assert txn.get.call_count == 2
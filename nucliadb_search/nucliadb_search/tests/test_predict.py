@@ -0,0 +1,82 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from nucliadb_ingest.tests.vectors import Q
+from nucliadb_search.predict import PredictEngine
+
+
+@pytest.mark.asyncio
+async def test_sentence_vectors_are_cached_and_coalesced():
+    predict = PredictEngine(dummy=True)
+    vectors = await asyncio.gather(
+        *[
+            predict.convert_sentence_to_vector("kbid", sentence)
+            for sentence in ("my  query", " my query", "my query ")
+        ]
+    )
+    assert vectors[0] == vectors[1] == vectors[2]
+    assert predict.calls == ["my query"]
+
+    await predict.convert_sentence_to_vector("kbid", "my query")
+    await predict.convert_sentence_to_vector("other", "my query")
+    assert predict.calls == ["my query", "my query"]
+
+
+@pytest.mark.asyncio
+async def test_sentence_vectors_cache_expires():
+    predict = PredictEngine(dummy=True, cache_ttl=0)
+    await predict.convert_sentence_to_vector("kbid", "my query")
+    await predict.convert_sentence_to_vector("kbid", "my query")
+    assert len(predict.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_sentence_vectors_are_batched():
+    predict = PredictEngine(dummy=True, batch_size=3, batch_wait=0.01)
+    vectors = await asyncio.gather(
+        *[
+            predict.convert_sentence_to_vector("kbid", f"query {index}")
+            for index in range(4)
+        ]
+    )
+    assert len(vectors) == 4
+    assert predict.batch_calls == [
+        ["query 0", "query 1", "query 2"],
+        ["query 3"],
+    ]
+
+    vector = await predict.convert_sentence_to_vector("other", "query 0")
+    assert vector == vectors[0]
+    assert predict.batch_calls[-1] == ["query 0"]
+
+
+@pytest.mark.asyncio
+async def test_many_sentences_are_converted_with_one_call():
+    predict = PredictEngine(dummy=True)
+    await predict.convert_sentence_to_vector("kb", "cached")
+
+    vectors = await predict.convert_sentences_to_vectors(
+        "kb", ["one", "cached", "two", " one "]
+    )
+    assert vectors == [Q, Q, Q, Q]
+    assert predict.batch_calls == [["one", "two"]]
@@ -0,0 +1,49 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, timezone
+
+import pytest
+
+from nucliadb_search.api.models import SearchOptions, SuggestOptions
+from nucliadb_search.search.query import paragraph_query_to_pb, suggest_query_to_pb
+
+
+@pytest.mark.asyncio
+async def test_suggest_query_date_ranges():
+    request = await suggest_query_to_pb(
+        [SuggestOptions.PARAGRAPH],
+        "query",
+        [],
+        [],
+        range_creation_start=datetime(2022, 1, 1, tzinfo=timezone.utc),
+        range_modification_end=datetime(2022, 2, 1),
+    )
+    assert request.timestamps.from_created.ToDatetime() == datetime(2022, 1, 1)
+    assert request.timestamps.to_modified.ToDatetime() == datetime(2022, 2, 1)
+    assert not request.timestamps.HasField("to_created")
+    assert not request.timestamps.HasField("from_modified")
+
+
+@pytest.mark.asyncio
+async def test_paragraph_query_without_date_ranges():
+    request = await paragraph_query_to_pb(
+        [SearchOptions.PARAGRAPH], "rid", "query", [], [], "", 0, 20
+    )
+    assert not request.HasField("timestamps")
@@ -0,0 +1,144 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import timeit
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from google.protobuf.json_format import MessageToDict
+from nucliadb_protos.nodereader_pb2 import FacetResult, FacetResults
+
+from nucliadb_models.metadata import Metadata, ResourceProcessingStatus
+from nucliadb_models.resource import Resource
+from nucliadb_search.api.models import (
+    KnowledgeboxSearchResults,
+    Paragraph,
+    Paragraphs,
+    ResourceResult,
+    Resources,
+)
+from nucliadb_search.search.merge import facet_results_to_dict
+from nucliadb_utils.fastapi.responses import ORJSONResponse
+
+
+def search_results(size: int = 100) -> KnowledgeboxSearchResults:
+    facets = {"/l": {"facetresults": [{"tag": "/l/a", "total": size}]}}
+    text = "Lorem ipsum dolor sit amet, consectetur adipiscing elit " * 4
+    return KnowledgeboxSearchResults(
+        resources={
+            f"rid{i}": Resource(
+                id=f"rid{i}",
+                title=f"Resource {i}",
+                summary=text,
+                icon="text/plain",
+                metadata=Metadata(
+                    language="en", status=ResourceProcessingStatus.PROCESSED
+                ),
+                created=datetime(2022, 5, 1, 10, 30),
+                modified=datetime(2022, 5, 2, 10, 30, 15, 1200),
+            )
+            for i in range(size)
+        },
+        paragraphs=Paragraphs(
+            results=[
+                Paragraph(
+                    score=1.0 / (i + 1),
+                    rid=f"rid{i}",
+                    field_type="t",
+                    field="text",
+                    text=text,
+                    labels=["/l/a"],
+                    positions={"lorem": [(0, 5), (57, 62)]},
+                )
+                for i in range(size)
+            ],
+            facets=facets,
+            query="lorem",
+        ),
+        fulltext=Resources(
+            results=[
+                ResourceResult(
+                    score=size - i,
+                    rid=f"rid{i}",
+                    field_type="t",
+                    field="text",
+                    text=text,
+                )
+                for i in range(size)
+            ],
+            facets=facets,
+            query="lorem",
+        ),
+    )
+
+
+def default_render(content: KnowledgeboxSearchResults) -> bytes:
+    # What FastAPI does for a route with response_model_exclude_unset
+    value = KnowledgeboxSearchResults(**content.dict(exclude_unset=True))
+    return json.dumps(
+        jsonable_encoder(value, exclude_unset=True),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def orjson_render(content: KnowledgeboxSearchResults) -> bytes:
+    return ORJSONResponse(content).body
+
+
+def benchmark(size: int = 100, number: int = 50):
+    content = search_results(size)
+    for name, render in (("default", default_render), ("orjson", orjson_render)):
+        elapsed = timeit.timeit(lambda: render(content), number=number)
+        yield name, number / elapsed
+
+
+def test_orjson_response_matches_default_rendering():
+    content = search_results()
+    assert json.loads(orjson_render(content)) == json.loads(default_render(content))
+
+
+def test_orjson_response_leaves_unset_fields_out():
+    rendered = json.loads(orjson_render(KnowledgeboxSearchResults()))
+    assert rendered == {}
+
+
+def test_facet_results_to_dict():
+    facet = FacetResults(
+        facetresults=[
+            FacetResult(tag="/l/a", total=3),
+            FacetResult(tag="/l/b", total=1),
+        ]
+    )
+    assert facet_results_to_dict(facet) == MessageToDict(facet)
+
+    facet = FacetResults(
+        facetresults=[FacetResult(tag="/l/a", total=0), FacetResult(total=2)]
+    )
+    assert facet_results_to_dict(facet) == MessageToDict(facet)
+    assert facet_results_to_dict(FacetResults()) == MessageToDict(FacetResults())
+
+
+if __name__ == "__main__":
+    # Wall clock numbers are too noisy to assert on in the test suite
+    for name, responses in benchmark():
+        print(f"{name}: {responses:.1f} responses/s")
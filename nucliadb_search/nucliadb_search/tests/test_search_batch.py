@@ -0,0 +1,116 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+from nucliadb_protos.nodereader_pb2 import SearchRequest
+
+from nucliadb_ingest.orm.node import Node
+from nucliadb_search.api.models import KnowledgeboxSearchResults, SearchBatchQuery
+from nucliadb_search.api.v1 import search
+from nucliadb_search.settings import settings
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    async def global_query_to_pb(*args, **kwargs):
+        return SearchRequest()
+
+    async def merge_results(results, **kwargs):
+        return KnowledgeboxSearchResults()
+
+    monkeypatch.setattr(search, "get_nodes", lambda: None)
+    monkeypatch.setattr(search, "global_query_to_pb", global_query_to_pb)
+    monkeypatch.setattr(search, "merge_results", merge_results)
+    monkeypatch.setattr(settings, "search_shard_timeout", 0.1)
+    monkeypatch.setattr(settings, "search_hedging", False)
+
+
+def run_batch_query(semaphores):
+    return search.search_batch_query(
+        "kbid",
+        SearchBatchQuery(query="query"),
+        None,
+        [(None, Node("node:8080", "node"), "shard", "node")],  # type: ignore
+        semaphores,
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_queries_waiting_for_the_node_do_not_time_out(batch, monkeypatch):
+    monkeypatch.setattr(settings, "search_batch_node_concurrency", 1)
+
+    async def query_shard(*args, **kwargs):
+        await asyncio.sleep(0.06)
+        return "answer"
+
+    monkeypatch.setattr(search, "query_shard", query_shard)
+    semaphores: dict = {}
+    searches = await asyncio.gather(*[run_batch_query(semaphores) for _ in range(3)])
+    for pb_query, results, timed_out, error in searches:
+        assert timed_out is False
+        assert error is None
+
+
+@pytest.mark.asyncio
+async def test_batch_query_errors_are_kept_on_the_query(batch, monkeypatch):
+    async def query_shard(*args, **kwargs):
+        raise ValueError()
+
+    monkeypatch.setattr(search, "query_shard", query_shard)
+    pb_query, results, timed_out, error = await run_batch_query({})
+    assert pb_query is not None
+    assert results == KnowledgeboxSearchResults()
+    assert error == "Error while querying shard data"
+
+    async def slow_query(*args, **kwargs):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(search, "query_shard", slow_query)
+    _, _, _, error = await run_batch_query({})
+    assert error == "Data query took too long"
+
+
+@pytest.mark.asyncio
+async def test_hedged_batch_queries_take_a_slot_on_their_node(batch, monkeypatch):
+    monkeypatch.setattr(settings, "search_batch_node_concurrency", 1)
+    running = {"node:8080": 0, "other:8080": 0}
+    most = {"node:8080": 0, "other:8080": 0}
+
+    async def query_shard(node, shard_id, query):
+        running[node.address] += 1
+        most[node.address] = max(most[node.address], running[node.address])
+        await asyncio.sleep(0.02)
+        running[node.address] -= 1
+        return "answer"
+
+    async def hedged_query(nodemanager, shard, node, shard_id, node_id, query):
+        # Every query is duplicated on another replica
+        return (
+            await asyncio.gather(
+                query(node, shard_id), query(Node("other:8080", "other"), shard_id)
+            )
+        )[0]
+
+    monkeypatch.setattr(search, "query_shard", query_shard)
+    monkeypatch.setattr(search, "hedged_query", hedged_query)
+    semaphores: dict = {}
+    await asyncio.gather(*[run_batch_query(semaphores) for _ in range(3)])
+    assert most == {"node:8080": 1, "other:8080": 1}
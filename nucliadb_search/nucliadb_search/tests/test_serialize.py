@@ -0,0 +1,97 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from nucliadb_protos.resources_pb2 import Basic, Origin, Relations
+from nucliadb_protos.utils_pb2 import Relation
+
+from nucliadb_ingest.maindb.local import LocalDriver
+from nucliadb_ingest.orm.resource import KB_RESOURCE_ORIGIN, KB_RESOURCE_RELATIONS
+from nucliadb_ingest.orm.utils import set_basic
+from nucliadb_ingest.settings import settings
+from nucliadb_models import serialize
+from nucliadb_models.serialize import ResourceProperties
+
+
+@pytest.fixture
+async def driver(tmpdir, monkeypatch):
+    monkeypatch.setattr(settings, "driver", "local")
+    driver = LocalDriver(url=str(tmpdir))
+    await driver.initialize()
+    txn = await driver.begin()
+    for rid in ("r1", "r2"):
+        await set_basic(txn, "kbid", rid, Basic(title=f"title {rid}"))
+    await txn.set(
+        KB_RESOURCE_ORIGIN.format(kbid="kbid", uuid="r1"),
+        Origin(source_id="origin r1").SerializeToString(),
+    )
+    await txn.set(
+        KB_RESOURCE_RELATIONS.format(kbid="kbid", uuid="r2"),
+        Relations(
+            relations=[Relation(relation=Relation.CHILD, resource="r1")]
+        ).SerializeToString(),
+    )
+    await txn.commit(resource=False)
+
+    async def get_driver():
+        return driver
+
+    async def get_none(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(serialize, "get_driver", get_driver)
+    monkeypatch.setattr(serialize, "get_storage", get_none)
+    monkeypatch.setattr(serialize, "get_cache", get_none)
+    yield driver
+    await driver.finalize()
+
+
+@pytest.mark.asyncio
+async def test_serialize_many(driver):
+    resources = await serialize.serialize_many(
+        "kbid",
+        ["r2", "missing", "r1", "r2"],
+        [
+            ResourceProperties.BASIC,
+            ResourceProperties.ORIGIN,
+            ResourceProperties.RELATIONS,
+        ],
+        [],
+        [],
+    )
+    assert set(resources) == {"r1", "r2"}
+    assert resources["r1"].title == "title r1"
+    assert resources["r1"].origin.source_id == "origin r1"
+    assert not resources["r1"].relations
+    assert resources["r2"].title == "title r2"
+    assert resources["r2"].origin is None
+    assert resources["r2"].relations[0].resource == "r1"
+
+
+@pytest.mark.asyncio
+async def test_serialize_many_basic_only(driver):
+    resources = await serialize.serialize_many(
+        "kbid", ["r1", "r2"], [ResourceProperties.BASIC], [], []
+    )
+    assert [resource.title for resource in resources.values()] == [
+        "title r1",
+        "title r2",
+    ]
+    assert all(resource.origin is None for resource in resources.values())
+    assert all(resource.relations is None for resource in resources.values())
@@ -0,0 +1,109 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from unittest import mock
+
+import pytest
+from nucliadb_protos.writer_pb2 import ShardObject, ShardReplica
+
+from nucliadb_search.search import shards
+from nucliadb_search.search.shards import (
+    gather_shards,
+    hedged_query,
+    iterate_shards,
+    limit_concurrency,
+)
+
+
+async def answer(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+@pytest.mark.asyncio
+async def test_gather_shards_drops_late_shards():
+    results, timed_out = await gather_shards(
+        [answer(1), answer(2, delay=1)], timeout=0.1
+    )
+    assert results == [1]
+    assert timed_out is True
+
+    results, timed_out = await gather_shards([answer(1), answer(2)], timeout=1)
+    assert results == [1, 2]
+    assert timed_out is False
+
+
+@pytest.mark.asyncio
+async def test_limit_concurrency_timeout_starts_with_the_slot():
+    semaphore = asyncio.Semaphore(1)
+    results, timed_out = await gather_shards(
+        [
+            limit_concurrency(semaphore, answer(value, delay=0.05), timeout=0.08)
+            for value in range(3)
+        ],
+        timeout=None,
+    )
+    assert results == [0, 1, 2]
+    assert timed_out is False
+
+    with pytest.raises(asyncio.TimeoutError):
+        await limit_concurrency(semaphore, answer(1, delay=1), timeout=0.05)
+
+
+@pytest.mark.asyncio
+async def test_iterate_shards_yields_answers_as_they_arrive():
+    error = ValueError()
+
+    async def fail():
+        raise error
+
+    answers = [
+        answer
+        async for answer in iterate_shards(
+            [answer(1, delay=0.05), fail(), answer(3, delay=1)], timeout=0.1
+        )
+    ]
+    assert answers == [(1, error), (0, 1)]
+
+
+@pytest.mark.asyncio
+async def test_hedged_query_keeps_first_answer():
+    shard_object = ShardObject(shard="shard")
+    for node_id in ("node-1", "node-2"):
+        shard_object.replicas.append(ShardReplica(node=node_id))
+    nodemanager = mock.Mock()
+    nodemanager.choose_node.return_value = ("fast", "shard-2", "node-2")
+    delays = {"slow": 1, "fast": 0}
+
+    async def query(node, shard_id):
+        return await answer(shard_id, delay=delays[node])
+
+    with mock.patch.object(shards, "hedging_delay", return_value=0.05):
+        result = await hedged_query(
+            nodemanager, shard_object, "slow", "shard-1", "node-1", query
+        )
+    assert result == "shard-2"
+    nodemanager.choose_node.assert_called_once_with(shard_object, exclude=["node-1"])
+
+    with mock.patch.object(shards, "hedging_delay", return_value=None):
+        result = await hedged_query(
+            nodemanager, shard_object, "fast", "shard-1", "node-1", query
+        )
+    assert result == "shard-1"
@@ -0,0 +1,102 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+
+import pytest
+from nucliadb_protos.nodereader_pb2 import SearchResponse
+
+from nucliadb_search.api.models import (
+    KnowledgeboxSearchResults,
+    ResourceResult,
+    Resources,
+)
+from nucliadb_search.search.stream import stream_results
+
+
+async def shard(total, delay=0.0):
+    await asyncio.sleep(delay)
+    response = SearchResponse()
+    response.document.total = total
+    return response
+
+
+async def merge(results):
+    # The page of the shards answered so far, a result for each one
+    return KnowledgeboxSearchResults(
+        fulltext=Resources(
+            results=[
+                ResourceResult(
+                    score=result.document.total,
+                    rid=f"rid{result.document.total}",
+                    field_type="t",
+                    field="text",
+                    text="text",
+                )
+                for result in sorted(results, key=lambda result: -result.document.total)
+            ],
+            facets={
+                "/l": [
+                    {
+                        "tag": "/l/a",
+                        "total": sum(result.document.total for result in results),
+                    }
+                ]
+            },
+            query="query",
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_results_frames():
+    finished = []
+
+    async def finish(resources):
+        finished.append(resources)
+
+    frames = [
+        json.loads(line)
+        async for line in stream_results(
+            [shard(2, delay=0.05), shard(1), shard(3, delay=1)],
+            ["shard-1", "shard-2", "shard-3"],
+            timeout=0.1,
+            merge=merge,
+            finish=finish,
+        )
+    ]
+    assert [(frame["type"], frame.get("shard")) for frame in frames] == [
+        ("facets", "shard-2"),
+        ("results", "shard-2"),
+        ("facets", "shard-1"),
+        ("results", "shard-1"),
+        ("summary", None),
+    ]
+    assert frames[0]["fulltext"] == {"/l": [{"tag": "/l/a", "total": 1}]}
+    assert "facets" not in frames[1]["fulltext"]
+    assert [result["rid"] for result in frames[1]["fulltext"]["results"]] == ["rid1"]
+    # Later frames hold the page over every shard answered so far
+    assert frames[2]["fulltext"] == {"/l": [{"tag": "/l/a", "total": 3}]}
+    assert [result["rid"] for result in frames[3]["fulltext"]["results"]] == [
+        "rid2",
+        "rid1",
+    ]
+    assert frames[-1]["incomplete_results"] is True
+    assert finished == [0]
@@ -18,10 +18,12 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 from collections import Counter
+from typing import Optional
 
 from nucliadb_ingest.utils import get_driver  # noqa
 from nucliadb_search.nodes import NodesManager
 from nucliadb_search.predict import PredictEngine
+from nucliadb_search.search.cache import SearchResultsCache
 from nucliadb_utils.utilities import Utility, get_utility
 
 
@@ -35,3 +37,7 @@ def get_nodes() -> NodesManager:
 
 def get_counter() -> Counter:
     return get_utility(Utility.COUNTER)  # type: ignore
+
+
+def get_search_cache() -> Optional[SearchResultsCache]:
+    return get_utility(Utility.SEARCH_CACHE)
@@ -21,7 +21,7 @@ import functools
 from collections import OrderedDict
 from concurrent import futures
 from contextlib import contextmanager
-from typing import Any, Awaitable, Callable, MutableMapping, Optional
+from typing import Any, Awaitable, Callable, List, MutableMapping, Optional, Tuple
 
 import grpc
 from grpc import ChannelCredentials, ClientCallDetails, aio  # type: ignore
@@ -351,11 +351,12 @@ class OpenTelemetryGRPC:
         server_addr: str,
         max_receive_message: int = 100,
         credentials: Optional[ChannelCredentials] = None,
+        options: Optional[List[Tuple[str, Any]]] = None,
     ):
         tracer = self.tracer_provider.get_tracer(f"{self.service_name}_grpc_client")
         options = [
             ("grpc.max_receive_message_length", max_receive_message * 1024 * 1024),
-        ]
+        ] + (options or [])
         if credentials is not None:
             channel = aio.secure_channel(
                 server_addr,
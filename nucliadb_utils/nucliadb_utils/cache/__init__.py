@@ -19,3 +19,5 @@
 
 CACHE_PREFIX = "gcache2-"
 KB_COUNTER_CACHE = "kb_{kbid}_counters"
+KB_SHARDS_CACHE = "kb_{kbid}_shards"
+KB_FIELD_EXTRACTED_CACHE = "kb_{kbid}_r_{rid}_{kind}_{field_type}_{field}"
@@ -23,6 +23,7 @@ from sys import getsizeof
 from typing import Any, Dict, List, Optional
 
 import orjson
+from google.protobuf.message import Message
 
 from nucliadb_utils import logger
 from nucliadb_utils.cache import memcache
@@ -36,6 +37,9 @@ except ImportError:
 
 _default_size = 1024
 _basic_types = (bytes, str, int, float)
+# Invalidations are counted on this many slots, keys sharing a slot only
+# make a reader skip storing its value more often
+_generation_slots = 1024
 
 
 class Cache:
@@ -47,6 +51,7 @@ class Cache:
     def __init__(self, pubsub: PubSubDriver = None):
         self.ident = uuid.uuid4().hex
         self.pubsub = pubsub
+        self._generations = [0] * _generation_slots
 
     async def initialize(self):
         if self.initialized:
@@ -89,10 +94,35 @@ class Cache:
             return getsizeof(value[0]) * len(value)
         if isinstance(value, _basic_types):
             return getsizeof(value)
+        if isinstance(value, Message):
+            return value.ByteSize()
         return _default_size
 
+    def generation(self, key: str) -> int:
+        """
+        Changes every time the key is invalidated. Readers take it before
+        fetching a value and pass it to set, so a value fetched before an
+        invalidation is not stored after it
+        """
+        return self._generations[hash(key) % _generation_slots]
+
+    def _bump(self, keys: List[str]):
+        for key in keys:
+            self._generations[hash(key) % _generation_slots] += 1
+
+    def _bump_all(self):
+        self._generations = [generation + 1 for generation in self._generations]
+
     # Set a object from cache
-    async def set(self, key: str, value: Any, invalidate: bool = False):
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        invalidate: bool = False,
+        generation: Optional[int] = None,
+    ):
+        if generation is not None and generation != self.generation(key):
+            return
         size = self.get_size(value)
         self._memory_cache.set(key, value, size)
         if invalidate:
@@ -107,6 +137,7 @@ class Cache:
 
     # Delete a set of objects from cache
     async def mdelete(self, keys: List[str], invalidate: bool = False):
+        self._bump(keys)
         for key in keys:
             if key in self._memory_cache:
                 del self._memory_cache[key]
@@ -115,6 +146,7 @@ class Cache:
 
     # Delete a set of objects from cache
     async def delete(self, key: str, invalidate: bool = False):
+        self._bump([key])
         if key in self._memory_cache:
             del self._memory_cache[key]
         if invalidate:
@@ -122,6 +154,7 @@ class Cache:
 
     # Clean all cache
     async def clear(self, invalidate: bool = False):
+        self._bump_all()
         self._memory_cache.clear()
         if invalidate:
             await self.send_invalidation(purge=True)
@@ -138,8 +171,10 @@ class Cache:
             # Skip my messages
             return
         if "purge" in payload and payload["purge"]:
+            self._bump_all()
             self._memory_cache.clear()
         if "keys" in payload:
+            self._bump(payload["keys"])
             for key in payload["keys"]:
                 if key in self._memory_cache:
                     del self._memory_cache[key]
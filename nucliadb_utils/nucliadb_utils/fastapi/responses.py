@@ -0,0 +1,63 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from enum import Enum
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def default(obj: Any) -> Any:
+    # orjson already handles dataclasses, datetimes, enums and uuids natively
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any, exclude_unset: bool = False) -> bytes:
+    if isinstance(content, BaseModel):
+        content = content.dict(exclude_unset=exclude_unset)
+    return orjson.dumps(content, default=default, option=OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson.
+
+    Used as the default response class of the apps, so content already
+    encoded by FastAPI is dumped with orjson. Endpoints returning large
+    models can return this response with the model itself to also skip the
+    response model validation and `jsonable_encoder` roundtrip, unset fields
+    are left out as with `response_model_exclude_unset`.
+    """
+
+    exclude_unset = True
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content, exclude_unset=self.exclude_unset)
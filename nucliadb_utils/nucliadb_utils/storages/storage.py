@@ -42,6 +42,8 @@ STORAGE_FILE_EXTRACTED = "kbs/{kbid}/r/{uuid}/e/{field_type}/{field}/{key}"
 
 DEADLETTER = "deadletter/{partition}/{seqid}/{seq}"
 INDEXING = "index/{node}/{shard}/{txid}"
+SHARED_INDEXING = "index/{uuid}/{txid}"
+SHARED_INDEXING_APPLIED = "{key}-applied/{shard}"
 
 
 class StorageField:
@@ -145,7 +147,9 @@ class Storage:
     async def get_indexing(self, payload: IndexMessage) -> BrainResource:
         if self.indexing_bucket is None:
             raise AttributeError()
-        if payload.txid == 0:
+        if payload.storage_key != "":
+            key = payload.storage_key
+        elif payload.txid == 0:
             key = INDEXING.format(
                 node=payload.node, shard=payload.shard, txid=payload.reindex_id
             )
@@ -159,13 +163,64 @@ class Storage:
         pb = BrainResource()
         pb.ParseFromString(bytes_buffer.read())
         bytes_buffer.flush()
+        if payload.storage_key != "":
+            # Shared payloads are stored without shard
+            pb.shard_id = pb.resource.shard_id = payload.shard
         return pb
 
+    async def shared_indexing(
+        self, message: BrainResource, txid: int, reindex_id: Optional[str] = None
+    ) -> str:
+        """
+        Upload the indexing payload once for all the replicas of a shard and
+        return its key. Each replica gets its shard id from its IndexMessage
+        """
+        if self.indexing_bucket is None:
+            raise AttributeError()
+        if txid < 0:
+            txid = 0
+        key = SHARED_INDEXING.format(
+            uuid=message.resource.uuid,
+            txid=reindex_id if reindex_id is not None else txid,
+        )
+        await self.uploadbytes(self.indexing_bucket, key, message.SerializeToString())
+        return key
+
     async def delete_indexing(self, payload: IndexMessage):
         if self.indexing_bucket is None:
             raise AttributeError()
-        key = INDEXING.format(node=payload.node, shard=payload.shard, txid=payload.txid)
-        await self.delete_upload(key, self.indexing_bucket)
+        if payload.storage_key == "":
+            key = INDEXING.format(
+                node=payload.node, shard=payload.shard, txid=payload.txid
+            )
+            await self.delete_upload(key, self.indexing_bucket)
+            return
+
+        # Shared payloads are deleted by the last replica applying them, each
+        # replica leaves a mark and checks the marks of the others
+        await self.uploadbytes(
+            self.indexing_bucket,
+            SHARED_INDEXING_APPLIED.format(
+                key=payload.storage_key, shard=payload.shard
+            ),
+            b"1",
+        )
+        for shard in payload.replicas:
+            if shard == payload.shard:
+                continue
+            applied = await self.downloadbytes(
+                self.indexing_bucket,
+                SHARED_INDEXING_APPLIED.format(key=payload.storage_key, shard=shard),
+            )
+            if applied.getbuffer().nbytes == 0:
+                return
+
+        await self.delete_upload(payload.storage_key, self.indexing_bucket)
+        for shard in payload.replicas:
+            await self.delete_upload(
+                SHARED_INDEXING_APPLIED.format(key=payload.storage_key, shard=shard),
+                self.indexing_bucket,
+            )
 
     def needs_move(self, file: CloudFile, kbid: str) -> bool:
         # The cloudfile is valid for our environment
@@ -20,6 +20,7 @@
 import asyncio
 
 import pytest
+from nucliadb_protos.utils_pb2 import ExtractedText
 
 from nucliadb_utils.cache.nats import NatsPubsub
 from nucliadb_utils.cache.pubsub import PubSubDriver
@@ -77,3 +78,8 @@ async def cache_validation(second_pubsub: PubSubDriver):
 
     await util2.finalize()
     await util.finalize()
+
+
+def test_cache_size_of_protobuf_messages():
+    extracted_text = ExtractedText(text="a" * 10000)
+    assert Cache().get_size(extracted_text) == extracted_text.ByteSize()
@@ -18,6 +18,8 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 import pytest
+from nucliadb_protos.noderesources_pb2 import Resource as BrainResource
+from nucliadb_protos.nodewriter_pb2 import IndexMessage
 
 from nucliadb_utils.storages.gcs import GCSStorage
 from nucliadb_utils.storages.local import LocalStorage
@@ -58,3 +60,29 @@ async def storage_test(storage: Storage):
 
     deleted = await storage.schedule_delete_kb(kbid)
     assert deleted
+
+
+@pytest.mark.asyncio
+async def test_local_shared_indexing(local_storage: LocalStorage):
+    local_storage.indexing_bucket = "indexing"
+    brain = BrainResource()
+    brain.resource.uuid = "rid"
+    key = await local_storage.shared_indexing(brain, 10)
+
+    messages = []
+    for node, shard in (("node1", "shard1"), ("node2", "shard2")):
+        indexpb = IndexMessage(node=node, shard=shard, txid=10, storage_key=key)
+        indexpb.replicas.extend(["shard1", "shard2"])
+        messages.append(indexpb)
+
+    pb = await local_storage.get_indexing(messages[1])
+    assert pb.shard_id == pb.resource.shard_id == "shard2"
+
+    # The payload stays until every replica applied it
+    await local_storage.delete_indexing(messages[0])
+    pb = await local_storage.get_indexing(messages[1])
+    assert pb.resource.uuid == "rid"
+
+    await local_storage.delete_indexing(messages[1])
+    with pytest.raises(KeyError):
+        await local_storage.get_indexing(messages[1])
@@ -63,6 +63,7 @@ class Utility(str, Enum):
     INDEXING = "indexing"
     AUDIT = "audit"
     STORAGE = "storage"
+    SEARCH_CACHE = "search_cache"
 
 
 def get_utility(ident: Utility):